@@ -0,0 +1,226 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Benchmark reproductible des étapes du pipeline sur des données synthétiques
+# (pipeline/synthetic_data.py), sans clé d'API. Chaque palier tourne dans
+# un process séparé et dans un dossier temporaire : les pics mémoire d'un
+# palier ne polluent pas le suivant. Les mesures viennent de
+# l'instrumentation (PIPELINE_METRICS).
+#
+#   python benchmarks/bench_pipeline.py --tiers small medium
+#   python benchmarks/bench_pipeline.py --baseline benchmarks/results/<fichier>.json
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIPELINE_DIR = os.path.join(REPO_DIR, "pipeline")
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+# Paliers de taille : années de données horaires x nombre de stations
+TIERS = {
+    "small": {"years": 1, "stations": 3},
+    "medium": {"years": 2, "stations": 34},
+    "large": {"years": 5, "stations": 200},
+    "regions": {"years": 2, "stations": 200, "regions": 64},  # ~ toutes les balancing authorities
+}
+
+# Étapes mesurées, dans l'ordre du pipeline : nom de l'étape instrumentée -> (module, fonction)
+STAGES = {
+    "process_load": ("process_load_data", "process_data"),
+    "process_weather": ("process_weather", "process_weather"),
+    "merge": ("merge_data", "merge_datasets"),
+    "features": ("feature_engineering", "create_features"),
+    "train": ("train_model", "train_forecasting_model"),
+}
+
+# Seuils de régression par rapport à la référence
+WALL_TOLERANCE = 0.20    # +20 % de temps mur
+MEMORY_TOLERANCE = 0.20  # +20 % de pic RSS
+MIN_WALL_S = 0.05        # En dessous, l'écart relève du bruit de mesure
+
+PACKAGES = ["numpy", "pandas", "pyarrow", "xgboost"]
+
+
+def run_tier(workdir, stages):
+    """
+    Exécutée dans le process enfant, dans `workdir` : lance les étapes
+    l'une après l'autre (les mesures sont écrites par l'instrumentation).
+    """
+    sys.path.insert(0, PIPELINE_DIR)
+    os.chdir(workdir)
+    for name in stages:
+        module_name, func_name = STAGES[name]
+        getattr(importlib.import_module(module_name), func_name)()
+
+
+def bench_tier(tier, stages, repeat=1, seed=0, verbose=False):
+    """
+    Génère les données du palier puis exécute `repeat` fois les étapes
+    dans un process neuf. Renvoie les mesures agrégées par étape.
+    """
+    sys.path.insert(0, PIPELINE_DIR)
+    from synthetic_data import write_raw_inputs
+
+    size = TIERS[tier]
+    with tempfile.TemporaryDirectory(prefix=f"bench_{tier}_") as workdir:
+        start = time.perf_counter()
+        write_raw_inputs(workdir, size["years"], size["stations"], seed, n_regions=size.get("regions", 1))
+        generate_s = time.perf_counter() - start
+
+        runs = []
+        for i in range(repeat):
+            metrics_file = os.path.join(workdir, f"metrics_{i}.jsonl")
+            env = dict(os.environ, PIPELINE_METRICS=metrics_file)
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-tier", workdir, "--stages", *stages],
+                env=env, stdout=None if verbose else subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+            )
+            if result.returncode != 0:
+                raise RuntimeError(f"Palier {tier} en échec :\n{result.stderr[-2000:]}")
+            with open(metrics_file) as f:
+                runs.append([json.loads(line) for line in f])
+
+    return {
+        "size": size,
+        "generate_s": round(generate_s, 3),
+        "repeat": repeat,
+        "stages": summarize(runs),
+    }
+
+
+def summarize(runs):
+    """
+    Une entrée par étape et sous-étape : médiane du temps mur et CPU sur
+    les répétitions, pic RSS maximal, débit recalculé sur la médiane.
+    """
+    by_stage = {}
+    for records in runs:
+        for record in records:
+            by_stage.setdefault(record["stage"], []).append(record)
+
+    summary = {}
+    for name, records in by_stage.items():
+        wall = statistics.median(r["wall_s"] for r in records)
+        rows = records[-1]["rows_out"] or records[-1]["rows_in"] or 0
+        peaks = [r["peak_rss_mb"] for r in records if r.get("peak_rss_mb") is not None]
+        summary[name] = {
+            "parent": records[-1]["parent"],
+            "wall_s": round(wall, 4),
+            "cpu_s": round(statistics.median(r["cpu_s"] for r in records), 4),
+            "rows_in": records[-1]["rows_in"],
+            "rows_out": records[-1]["rows_out"],
+            "rows_per_s": round(rows / wall, 1) if wall > 0 else None,
+            "peak_rss_mb": max(peaks) if peaks else None,
+            "bytes_written": records[-1]["bytes_written"],
+        }
+    return summary
+
+
+def environment():
+    versions = {}
+    for name in PACKAGES:
+        try:
+            versions[name] = importlib.import_module(name).__version__
+        except ImportError:
+            versions[name] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+def compare(results, baseline, wall_tolerance=WALL_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Compare les étapes principales aux mêmes paliers de la référence.
+    Renvoie la liste des régressions (temps mur ou pic mémoire).
+    """
+    regressions = []
+    print(f"\n📏 Comparaison avec la référence ({baseline['environment'].get('commit')})")
+    for tier, current in results["tiers"].items():
+        reference = baseline["tiers"].get(tier)
+        if reference is None:
+            print(f"   {tier} : absent de la référence")
+            continue
+        for name, stage in current["stages"].items():
+            ref = reference["stages"].get(name)
+            if ref is None or stage["parent"] is not None:
+                continue
+            wall_ratio = stage["wall_s"] / ref["wall_s"] if ref["wall_s"] else 1.0
+            line = f"   {tier:<7} {name:<16} {ref['wall_s']:>8.3f} s -> {stage['wall_s']:>8.3f} s ({wall_ratio - 1:+.0%})"
+            if wall_ratio > 1 + wall_tolerance and stage["wall_s"] - ref["wall_s"] > MIN_WALL_S:
+                regressions.append((tier, name, "wall_s", ref["wall_s"], stage["wall_s"]))
+                line += "  ⚠️ temps"
+            if stage["peak_rss_mb"] and ref.get("peak_rss_mb"):
+                line += f"  {ref['peak_rss_mb']:.0f} -> {stage['peak_rss_mb']:.0f} Mo"
+                if stage["peak_rss_mb"] > ref["peak_rss_mb"] * (1 + memory_tolerance):
+                    regressions.append((tier, name, "peak_rss_mb", ref["peak_rss_mb"], stage["peak_rss_mb"]))
+                    line += "  ⚠️ mémoire"
+            print(line)
+    return regressions
+
+
+def print_results(results):
+    for tier, result in results["tiers"].items():
+        size = result["size"]
+        print(f"\n📦 {tier} ({size['years']} an(s), {size['stations']} stations)")
+        for name, stage in result["stages"].items():
+            indent = "      " if stage["parent"] else "   "
+            rate = f"{stage['rows_per_s']:>12,.0f} lignes/s" if stage["rows_per_s"] else ""
+            peak = f"{stage['peak_rss_mb']:>7.0f} Mo" if stage["peak_rss_mb"] is not None else ""
+            print(f"{indent}{name:<22} {stage['wall_s']:>8.3f} s {rate} {peak}")
+
+
+def main(tiers, stages, repeat=1, baseline=None, output=None, verbose=False):
+    results = {"environment": environment(), "stages": stages, "tiers": {}}
+    for tier in tiers:
+        print(f"⏱️  Palier {tier}...")
+        results["tiers"][tier] = bench_tier(tier, stages, repeat, verbose=verbose)
+    print_results(results)
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"bench_{stamp}_{results['environment']['commit'] or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"\n💾 Résultats sauvegardés : {output}")
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print(f"❌ {len(regressions)} régression(s) détectée(s).")
+            return 1
+        print("✅ Aucune régression.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark des étapes du pipeline sur données synthétiques.")
+    parser.add_argument("--tiers", nargs="+", default=["small"], choices=list(TIERS))
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=1, help="Répétitions par palier (médiane)")
+    parser.add_argument("--baseline", default=None, help="Résultats de référence (JSON) à comparer")
+    parser.add_argument("--output", default=None, help="Fichier de résultats (défaut : benchmarks/results/)")
+    parser.add_argument("--verbose", action="store_true", help="Affiche la sortie des étapes")
+    parser.add_argument("--run-tier", default=None, help=argparse.SUPPRESS)  # Usage interne (process enfant)
+    args = parser.parse_args()
+
+    if args.run_tier:
+        run_tier(args.run_tier, args.stages)
+    else:
+        sys.exit(main(args.tiers, args.stages, args.repeat, args.baseline, args.output, args.verbose))
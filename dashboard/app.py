@@ -1,124 +1,206 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-
-# --- CONFIGURATION DE LA PAGE ---
-st.set_page_config(page_title="Energy Forecasting Dashboard", layout="wide")
-
-st.title("⚡ US Energy Consumption & Forecasting")
-st.markdown("Ce dashboard visualise la consommation électrique des USA (US48) et compare les prédictions du modèle XGBoost avec la réalité.")
-
-# --- CHARGEMENT DES DONNÉES ---
-@st.cache_data # Garde les données en cache pour que ça aille vite
-def load_data():
-    # Chargement des prédictions (Test set)
-    df_pred = pd.read_csv("data_processed/test_predictions.csv")
-    df_pred['datetime_utc'] = pd.to_datetime(df_pred['datetime_utc'])
-    
-    # Chargement de l'historique complet (pour le contexte)
-    df_master = pd.read_parquet("data_processed/energy_dataset_master.parquet")
-    
-    return df_pred, df_master
-
-try:
-    df_pred, df_master = load_data()
-except FileNotFoundError:
-    st.error("❌ Les fichiers de données sont introuvables. Vérifie que tu es bien à la racine du projet.")
-    st.stop()
-
-# --- SIDEBAR (FILTRES) ---
-st.sidebar.header("Filtres")
-# Sélection de la plage de dates pour le zoom
-min_date = df_pred['datetime_utc'].min()
-max_date = df_pred['datetime_utc'].max()
-
-start_date = st.sidebar.date_input("Date de début", min_date)
-end_date = st.sidebar.date_input("Date de fin", max_date)
-
-# Filtrage du dataframe
-mask = (df_pred['datetime_utc'].dt.date >= start_date) & (df_pred['datetime_utc'].dt.date <= end_date)
-filtered_df = df_pred.loc[mask]
-
-# --- KPIS (CHIFFRES CLÉS) ---
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    avg_demand = filtered_df['demand_mwh'].mean()
-    st.metric("Consommation Moyenne", f"{avg_demand:,.0f} MWh")
-
-with col2:
-    peak_demand = filtered_df['demand_mwh'].max()
-    st.metric("Pic de Consommation", f"{peak_demand:,.0f} MWh")
-
-with col3:
-    # Calcul du MAPE sur la sélection
-    mape = abs((filtered_df['demand_mwh'] - filtered_df['prediction']) / filtered_df['demand_mwh']).mean() * 100
-    st.metric("Précision du Modèle (MAPE)", f"{mape:.2f} %", delta_color="inverse") # Vert si bas
-
-with col4:
-    total_hours = len(filtered_df)
-    st.metric("Heures Analysées", f"{total_hours} h")
-
-# --- GRAPHIQUE PRINCIPAL ---
-st.subheader("📈 Comparaison Réel vs Prédiction")
-
-fig = go.Figure()
-
-# Courbe Réelle
-fig.add_trace(go.Scatter(
-    x=filtered_df['datetime_utc'], 
-    y=filtered_df['demand_mwh'],
-    mode='lines',
-    name='Réel',
-    line=dict(color='black', width=2)
-))
-
-# Courbe Prédiction
-fig.add_trace(go.Scatter(
-    x=filtered_df['datetime_utc'], 
-    y=filtered_df['prediction'],
-    mode='lines',
-    name='Prédiction XGBoost',
-    line=dict(color='#FFA500', width=2, dash='dash') # Orange en pointillés
-))
-
-fig.update_layout(
-    height=500,
-    xaxis_title="Date (UTC)",
-    yaxis_title="Consommation (MWh)",
-    template="plotly_white",
-    hovermode="x unified" # Affiche les deux valeurs quand on passe la souris
-)
-
-st.plotly_chart(fig, use_container_width=True)
-
-# --- ANALYSE DES ERREURS ---
-col_left, col_right = st.columns(2)
-
-with col_left:
-    st.subheader("🌡️ Corrélation Température vs Conso")
-    # Scatter plot interactif
-    fig_scatter = px.scatter(
-        filtered_df, 
-        x="temp_houston", 
-        y="demand_mwh", 
-        color="hour",
-        title="Impact de la Température (Houston)",
-        template="plotly_white"
-    )
-    st.plotly_chart(fig_scatter, use_container_width=True)
-
-with col_right:
-    st.subheader("📉 Distribution des Erreurs")
-    # Histogramme des erreurs
-    filtered_df['error'] = filtered_df['demand_mwh'] - filtered_df['prediction']
-    fig_hist = px.histogram(
-        filtered_df, 
-        x="error", 
-        nbins=50,
-        title="Répartition des erreurs (MWh)",
-        color_discrete_sequence=['indianred'],
-        template="plotly_white"
-    )
-    st.plotly_chart(fig_hist, use_container_width=True)
\ No newline at end of file
+import os
+import sys
+
+import streamlit as st
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Modules du pipeline (registre des modèles, lecture Parquet, sous-échantillonnage)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline"))
+from downsampling import downsample, thin_scatter
+from metrics_cube import CUBE_DIR, build_cube, covers, hourly_rows, hourly_summary, load_cube, range_summary
+from model_registry import latest_version, read_metadata
+from prediction_store import list_versions, prediction_bounds, read_predictions
+from merge_data import read_master
+from storage import dataset_columns
+
+# --- CONFIGURATION ---
+MASTER_FILE = "data_processed/energy_dataset_master.parquet"  # Température pour le nuage de points
+CHART_POINTS = 1500    # ~ largeur du graphique en pixels : pas plus de points par courbe
+SCATTER_BINS = 150     # Grille du nuage de points (un point par case au plus)
+RUNS = ["test", "backtest"]  # Prédictions à une heure (les trajectoires multi-horizons sont exclues)
+
+# --- CONFIGURATION DE LA PAGE ---
+st.set_page_config(page_title="Energy Forecasting Dashboard", layout="wide")
+
+st.title("⚡ US Energy Consumption & Forecasting")
+st.markdown("Ce dashboard visualise la consommation électrique des USA (US48) et compare les prédictions du modèle XGBoost avec la réalité.")
+
+# --- CHARGEMENT DES DONNÉES ---
+# Seules la version, la plage de dates et les colonnes utiles sont lues
+# (partitions model_version=/year=/month= élaguées, colonnes Parquet projetées)
+@st.cache_data # Garde les données en cache pour que ça aille vite
+def load_bounds(version):
+    return prediction_bounds(version, run=RUNS)
+
+@st.cache_data
+def load_data(version, start, end):
+    df_pred = read_predictions([version], start=start, end=end, run=RUNS,
+                               columns=['target_time', 'actual', 'prediction'])
+    df_pred = df_pred.rename(columns={'target_time': 'datetime_utc', 'actual': 'demand_mwh'}).sort_values('datetime_utc')
+    df_pred['hour'] = df_pred['datetime_utc'].dt.hour
+    # Température US48 de la même plage (indice pondéré, sinon la ville témoin de l'ancien mode pivot)
+    available = dataset_columns(MASTER_FILE) if os.path.exists(MASTER_FILE) else []
+    temp_col = next((c for c in ("temp_index", "temp_houston") if c in available), None)
+    if temp_col:
+        temps = read_master(start=start, end=end, columns=['datetime_utc', temp_col], path=MASTER_FILE)
+        temps['datetime_utc'] = temps['datetime_utc'].astype(df_pred['datetime_utc'].dtype)
+        df_pred = df_pred.merge(temps.drop_duplicates('datetime_utc'), on='datetime_utc', how='left')
+    return df_pred
+
+@st.cache_data
+def load_metrics_cube(version):
+    # Agrégats journaliers/mensuels écrits par train_model.py (None si absents)
+    try:
+        return load_cube(os.path.join(CUBE_DIR, version))
+    except FileNotFoundError:
+        return None
+
+versions = list_versions()
+if not versions:
+    st.error("❌ Aucune prédiction trouvée. Lance train_model.py depuis la racine du projet.")
+    st.stop()
+
+# --- SIDEBAR (FILTRES) ---
+st.sidebar.header("Filtres")
+# Version du modèle (ou du backtest) : la dernière version entraînée par défaut
+try:
+    default_version = latest_version()
+except FileNotFoundError:
+    default_version = versions[-1]
+version = st.sidebar.selectbox("Version du modèle", versions[::-1],
+                               index=versions[::-1].index(default_version) if default_version in versions else 0)
+
+# Sélection de la plage de dates pour le zoom
+min_date, max_date = load_bounds(version)
+start_date = st.sidebar.date_input("Date de début", min_date)
+end_date = st.sidebar.date_input("Date de fin", max_date)
+chart_points = st.sidebar.number_input("Points par courbe", 200, 20000, CHART_POINTS, step=100)
+
+# Métriques du modèle : lecture des seules métadonnées (pas de chargement du modèle)
+try:
+    model_info = read_metadata(version)
+    st.sidebar.caption(f"Modèle {model_info['version']} — MAPE test : {model_info['metrics']['mape']:.2f} %")
+except FileNotFoundError:
+    st.sidebar.caption(f"{version} (backtest, hors registre)")
+
+# Plage [début, fin] incluse, en jours entiers
+filtered_df = load_data(version, pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1))
+
+if filtered_df.empty:
+    st.warning("Aucune donnée sur cette période.")
+    st.stop()
+
+# KPIs et histogramme : somme des lignes du cube (mois complets + jours en
+# bordure). Hors de la période couverte par le cube, agrégation des heures lues.
+cube = load_metrics_cube(version)
+if cube is None or not covers(cube, start_date, end_date):
+    cube = build_cube(filtered_df)
+summary = range_summary(cube, start_date, end_date)
+
+# --- KPIS (CHIFFRES CLÉS) ---
+col1, col2, col3, col4 = st.columns(4)
+
+with col1:
+    st.metric("Consommation Moyenne", f"{summary['mean_actual']:,.0f} MWh")
+
+with col2:
+    st.metric("Pic de Consommation", f"{summary['max_actual']:,.0f} MWh")
+
+with col3:
+    # MAPE sur la sélection
+    st.metric("Précision du Modèle (MAPE)", f"{summary['mape']:.2f} %", delta_color="inverse") # Vert si bas
+
+with col4:
+    st.metric("Heures Analysées", f"{summary['n']} h")
+
+# --- GRAPHIQUE PRINCIPAL ---
+st.subheader("📈 Comparaison Réel vs Prédiction")
+
+fig = go.Figure()
+
+# Sous-échantillonnage côté serveur (LTTB) : la forme et les pics sont
+# conservés, le navigateur ne reçoit que ~chart_points points par courbe
+times = filtered_df['datetime_utc'].to_numpy()
+actual_idx = downsample(times, filtered_df['demand_mwh'].to_numpy(), chart_points)
+pred_idx = downsample(times, filtered_df['prediction'].to_numpy(), chart_points)
+
+# Courbe Réelle
+fig.add_trace(go.Scatter(
+    x=filtered_df['datetime_utc'].iloc[actual_idx], 
+    y=filtered_df['demand_mwh'].iloc[actual_idx],
+    mode='lines',
+    name='Réel',
+    line=dict(color='black', width=2)
+))
+
+# Courbe Prédiction
+fig.add_trace(go.Scatter(
+    x=filtered_df['datetime_utc'].iloc[pred_idx], 
+    y=filtered_df['prediction'].iloc[pred_idx],
+    mode='lines',
+    name='Prédiction XGBoost',
+    line=dict(color='#FFA500', width=2, dash='dash') # Orange en pointillés
+))
+
+fig.update_layout(
+    height=500,
+    xaxis_title="Date (UTC)",
+    yaxis_title="Consommation (MWh)",
+    template="plotly_white",
+    hovermode="x unified" # Affiche les deux valeurs quand on passe la souris
+)
+
+st.plotly_chart(fig, use_container_width=True)
+
+# --- ANALYSE DES ERREURS ---
+col_left, col_right = st.columns(2)
+
+with col_left:
+    st.subheader("🌡️ Corrélation Température vs Conso")
+    # Indice pondéré si disponible, sinon la ville témoin (ancien mode pivot)
+    if "temp_index" in filtered_df.columns:
+        temp_col, temp_label = "temp_index", "indice pondéré"
+    else:
+        temp_col, temp_label = "temp_houston", "Houston"
+    # Scatter plot interactif, éclairci sur une grille (un point par case)
+    scatter_df = filtered_df.dropna(subset=[temp_col, "demand_mwh"])
+    scatter_df = scatter_df.iloc[thin_scatter(scatter_df[temp_col].to_numpy(), scatter_df["demand_mwh"].to_numpy(), SCATTER_BINS)]
+    fig_scatter = px.scatter(
+        scatter_df, 
+        x=temp_col, 
+        y="demand_mwh", 
+        color="hour",
+        title=f"Impact de la Température ({temp_label})",
+        template="plotly_white"
+    )
+    st.plotly_chart(fig_scatter, use_container_width=True)
+
+with col_right:
+    st.subheader("📉 Distribution des Erreurs")
+    # Histogramme pré-calculé dans le cube : seules les barres sont envoyées
+    edges = cube['edges']
+    fig_hist = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=summary['hist'], width=np.diff(edges), marker_color='indianred'))
+    fig_hist.update_layout(
+        title="Répartition des erreurs (MWh)",
+        xaxis_title="error",
+        yaxis_title="count",
+        template="plotly_white"
+    )
+    st.plotly_chart(fig_hist, use_container_width=True)
+# --- PROFIL HORAIRE ---
+st.subheader("⏰ Erreur par Heure de la Journée")
+# Table hourly_profile du cube (mois complets) + jours en bordure agrégés depuis les heures lues
+by_hour = hourly_summary(hourly_rows(cube, start_date, end_date, filtered_df))
+fig_hour = go.Figure(go.Bar(x=by_hour.index, y=by_hour['mape'], marker_color='steelblue',
+                            customdata=by_hour[['mae', 'bias']].to_numpy(),
+                            hovertemplate="%{x} h : MAPE %{y:.2f} %, MAE %{customdata[0]:,.0f} MWh, "
+                                          "biais %{customdata[1]:,.0f} MWh<extra></extra>"))
+fig_hour.update_layout(
+    xaxis_title="Heure (UTC)",
+    yaxis_title="MAPE (%)",
+    template="plotly_white"
+)
+st.plotly_chart(fig_hour, use_container_width=True)
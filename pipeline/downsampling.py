@@ -0,0 +1,88 @@
+import numpy as np
+
+# Réduction du nombre de points envoyés aux graphiques, en gardant la
+# forme des courbes : inutile de transmettre plus de points que la
+# largeur du graphique en pixels. Chaque fonction renvoie les indices
+# (triés) des points à garder.
+
+
+def _as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    return x.astype(np.float64)
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets : un point par tranche, celui qui forme
+    le plus grand triangle avec le point retenu dans la tranche précédente
+    et la moyenne de la tranche suivante (les pics sont conservés).
+    """
+    x, y = _as_float(x), np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 tranches entre le premier et le dernier point (toujours gardés)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        # Double de l'aire des triangles (a, candidat, moyenne suivante), vectorisé sur la tranche
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, n_out):
+    """
+    Min et max de chaque tranche (n_out / 2 tranches) : l'enveloppe de la
+    série est exacte, au prix d'un rendu un peu plus "hachuré" que LTTB.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_buckets < 1 or n_out >= n:
+        return np.arange(n)
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    keep = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        chunk = y[start:end]
+        keep += [start + int(np.argmin(chunk)), start + int(np.argmax(chunk))]
+    return np.unique(keep)
+
+
+def thin_scatter(x, y, bins=200):
+    """
+    Nuage de points : un seul point par case d'une grille bins x bins.
+    Les zones denses sont éclaircies, les points isolés restent visibles.
+    """
+    x, y = _as_float(x), np.asarray(y, dtype=np.float64)
+    if len(x) <= bins:
+        return np.arange(len(x))
+    cells = []
+    for values in (x, y):
+        span = np.nanmax(values) - np.nanmin(values)
+        scaled = (values - np.nanmin(values)) / (span if span > 0 else 1.0)
+        cells.append(np.clip(np.nan_to_num(scaled) * (bins - 1), 0, bins - 1).astype(np.int64))
+    _, keep = np.unique(cells[0] * bins + cells[1], return_index=True)
+    return np.sort(keep)
+
+
+def downsample(x, y, n_out, method="lttb"):
+    """
+    Indices à afficher pour une série (valeurs manquantes ignorées).
+    """
+    valid = np.flatnonzero(~np.isnan(np.asarray(y, dtype=np.float64)))
+    x, y = np.asarray(x)[valid], np.asarray(y)[valid]
+    if method == "minmax":
+        return valid[minmax(y, n_out)]
+    return valid[lttb(x, y, n_out)]
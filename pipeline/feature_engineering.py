@@ -1,53 +1,128 @@
-import pandas as pd
-import numpy as np
-
-# --- CONFIGURATION ---
-INPUT_FILE = "data_processed/energy_dataset_master.parquet"
-OUTPUT_FILE = "data_processed/energy_dataset_features.parquet"
-
-def create_features():
-    print("🛠️ Création des Features (Indices pour le ML)...")
-    
-    df = pd.read_parquet(INPUT_FILE)
-    
-    # 1. Features Temporelles (Cycliques)
-    # Le modèle doit savoir si on est lundi ou dimanche, matin ou soir.
-    df['hour'] = df['datetime_utc'].dt.hour
-    df['day_of_week'] = df['datetime_utc'].dt.dayofweek # 0=Lundi, 6=Dimanche
-    df['month'] = df['datetime_utc'].dt.month
-    df['quarter'] = df['datetime_utc'].dt.quarter
-    
-    # Indicateur Week-end (Samedi ou Dimanche)
-    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-    
-    # 2. Features de "Lag" (Décalage temporel)
-    # L'info la plus puissante : la consommation d'il y a 24h (J-1) et 7 jours (J-7)
-    print("   Calcul des lags (J-1, J-7)...")
-    
-    # Lag 24h : La conso à la même heure hier
-    df['lag_24h'] = df['demand_mwh'].shift(24)
-    
-    # Lag 168h : La conso à la même heure la semaine dernière
-    df['lag_168h'] = df['demand_mwh'].shift(168)
-    
-    # 3. Moyennes Mobiles (Rolling Windows)
-    # La tendance des dernières 24h (pour lisser le bruit)
-    # Note: On exclut la valeur actuelle pour éviter la fuite de données (closed='left' n'existe pas partout, donc on shift d'abord)
-    print("   Calcul des moyennes mobiles...")
-    df['rolling_mean_24h'] = df['demand_mwh'].shift(1).rolling(window=24).mean()
-    
-    # 4. Nettoyage des NaNs créés par le décalage
-    # Les 7 premiers jours auront des valeurs vides à cause du lag_168h. On les supprime.
-    original_len = len(df)
-    df = df.dropna()
-    lost_rows = original_len - len(df)
-    print(f"   Lignes supprimées (démarrage) : {lost_rows}")
-    
-    # 5. Sauvegarde
-    df.to_parquet(OUTPUT_FILE, index=False)
-    print(f"✅ Dataset Enrichi sauvegardé : {OUTPUT_FILE}")
-    print(f"   Nouvelles dimensions : {df.shape}")
-    print("   Colonnes :", list(df.columns))
-
-if __name__ == "__main__":
+import pandas as pd
+import numpy as np
+import os
+import glob
+import pyarrow as pa
+
+from feature_kernels import compute_features, feature_names, history_hours
+from hourly_grid import VALID_COLUMN
+from instrumentation import current, instrumented, span
+from process_load_data import OPTIONAL_COLUMNS, respondent_dir
+from storage import PARTITION_COLS, append_partitions, clear_dataset, open_dataset, read_dataset
+
+# --- CONFIGURATION ---
+INPUT_FILE = "data_processed/energy_dataset_master.parquet"
+OUTPUT_DIR = "data_processed/features"  # Partitionné respondent=/year=/month=
+
+# Spec déclarative des features (calculée par feature_kernels.py)
+# - calendar : features calendaires brutes (hour, day_of_week, month, quarter, is_weekend, day_of_year)
+# - cyclic   : encodage sin/cos des mêmes champs (hour_sin, hour_cos...)
+# - lags     : consommation t-k heures (lag_<k>h)
+# - rolling  : fenêtre (h) -> statistiques sur [t-fenêtre, t-1] (mean, std, min, max)
+# - ewm      : moyennes mobiles exponentielles (span en heures, ewm_<span>h)
+FEATURE_SPEC = {
+    "calendar": ["hour", "day_of_week", "month", "quarter", "is_weekend"],
+    "cyclic": [],
+    "lags": [24, 168],
+    "rolling": {24: ["mean"]},
+    "ewm": [],
+}
+
+# Mode incrémental : on garde les dernières heures de la table maître
+# (l'historique dont les lags et moyennes mobiles ont besoin) pour ne
+# calculer les features que des nouvelles heures
+STATE_FILE = "data_processed/state/feature_tail.parquet"
+TAIL_HOURS = history_hours(FEATURE_SPEC) + 24  # Plus grand lag/fenêtre + marge
+
+def add_features(df, spec=None):
+    """
+    Ajoute les features du spec à une table triée par (respondent, date),
+    heures consécutives : toutes les régions sont calculées en un passage.
+    """
+    spec = FEATURE_SPEC if spec is None else spec
+    print(f"   Calcul de {len(feature_names(spec))} features (lags {spec.get('lags')}, "
+          f"fenêtres {list(spec.get('rolling', {}))})...")
+    groups = pd.factorize(df['respondent'])[0] if 'respondent' in df.columns else None
+    with span("features.compute", features=len(feature_names(spec))) as s:
+        features = compute_features(df['datetime_utc'].to_numpy(), df['demand_mwh'].to_numpy(), spec, groups)
+        s.rows(rows_in=len(df), rows_out=len(df))
+    # Une seule insertion de colonnes (pas de DataFrame fragmenté)
+    df = df.drop(columns=[c for c in features if c in df.columns])
+    return pd.concat([df, pd.DataFrame(features, index=df.index)], axis=1)
+
+@instrumented("features")
+def stored_features_are_float32(spec=FEATURE_SPEC):
+    """
+    Le dataset de features existant est-il déjà en float32 ? Des fichiers
+    d'anciens types (ex. calendrier en int64) ne doivent pas côtoyer les
+    nouveaux : sinon, reconstruction complète.
+    """
+    dirs = sorted(glob.glob(os.path.join(OUTPUT_DIR, "respondent=*")))
+    if not dirs:
+        return True
+    schema = open_dataset(dirs[0]).schema
+    # year/month sont aussi les colonnes de partition : relues en int32 dans tous les cas
+    stored = [name for name in feature_names(spec) if name in schema.names and name not in PARTITION_COLS]
+    return all(schema.field(name).type == pa.float32() for name in stored)
+
+def create_features(incremental=False):
+    print("🛠️ Création des Features (Indices pour le ML)...")
+
+    tail = pd.read_parquet(STATE_FILE) if incremental and os.path.exists(STATE_FILE) else None
+    if tail is not None and 'respondent' not in tail.columns:
+        tail = None  # État d'avant le multi-région : reconstruction complète
+    if tail is not None and not stored_features_are_float32():
+        print("   Types des features modifiés : reconstruction complète")
+        tail = None
+    if tail is not None:
+        # Seules les heures postérieures à l'état sauvegardé sont lues
+        # (watermark propre à chaque respondent)
+        watermarks = tail.groupby('respondent')['datetime_utc'].max()
+        watermark = watermarks.min()
+        new_rows = read_dataset(INPUT_FILE, start=watermark + pd.Timedelta(hours=1))
+        new_rows = new_rows[~(new_rows['datetime_utc'] <= new_rows['respondent'].map(watermarks))]
+        if new_rows.empty:
+            print(f"✅ Features déjà à jour (watermark : {watermarks.max()}).")
+            return
+        print(f"   Mode incrémental : {len(new_rows)} nouvelles heures après {watermark}")
+        raw = pd.concat([tail, new_rows], ignore_index=True).sort_values(['respondent', 'datetime_utc'])
+    else:
+        raw = read_dataset(INPUT_FILE).sort_values(['respondent', 'datetime_utc'])
+        current().read(INPUT_FILE)
+
+    current().rows(rows_in=len(raw))
+    df = add_features(raw.reset_index(drop=True))
+    if tail is not None:
+        # Les heures de l'état ne servent que d'historique pour les lags
+        df = df[~(df['datetime_utc'] <= df['respondent'].map(watermarks))]
+    
+    # 4. Nettoyage des NaNs créés par le décalage
+    # Les 7 premiers jours auront des valeurs vides à cause du lag_168h. On les supprime.
+    # (en incrémental, l'état fournit cet historique : rien n'est perdu)
+    # Les séries facultatives (prévision EIA, production) peuvent manquer sans invalider l'heure
+    # Les heures ajoutées par la grille (is_valid = False) ont servi aux
+    # décalages par position mais n'ont pas de cible : on les retire ici
+    original_len = len(df)
+    if VALID_COLUMN in df.columns:
+        df = df[df[VALID_COLUMN].astype(bool)].drop(columns=VALID_COLUMN)
+    df = df.dropna(subset=[c for c in df.columns if c not in OPTIONAL_COLUMNS])
+    lost_rows = original_len - len(df)
+    print(f"   Lignes supprimées (démarrage) : {lost_rows}")
+    
+    # 5. Sauvegarde : partitions respondent=/year=/month=, ajoutées en incrémental
+    if tail is None:
+        clear_dataset(OUTPUT_DIR)
+    for respondent, rows in df.groupby('respondent', sort=True):
+        append_partitions(rows.drop(columns='respondent'), respondent_dir(OUTPUT_DIR, respondent))
+    current().rows(rows_out=len(df))
+    current().wrote(OUTPUT_DIR)
+    print(f"✅ Dataset Enrichi sauvegardé : {OUTPUT_DIR} ({df['respondent'].nunique()} respondents)")
+
+    # 6. État pour le prochain passage : les dernières heures brutes de chaque respondent
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    raw.groupby('respondent', sort=False).tail(TAIL_HOURS).to_parquet(STATE_FILE, index=False)
+    print(f"   Nouvelles dimensions : {df.shape}")
+    print("   Colonnes :", list(df.columns))
+
+if __name__ == "__main__":
     create_features()
\ No newline at end of file
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Moteur de features vectorisé : toutes les features d'une série sont
+# calculées à partir d'un seul tableau contigu, les fenêtres glissantes
+# via des sommes cumulées (mean/std) ou des vues à pas (min/max), sans
+# copie intermédiaire par feature. Sortie en float32.
+# Plusieurs séries (une par région) se traitent en un seul passage :
+# concaténées, triées par (groupe, date), les valeurs qui franchiraient
+# une frontière de groupe sont masquées.
+
+CALENDAR_FEATURES = {
+    'hour': lambda t: t.hour,
+    'day_of_week': lambda t: t.dayofweek,  # 0=Lundi, 6=Dimanche
+    'month': lambda t: t.month,
+    'quarter': lambda t: t.quarter,
+    'is_weekend': lambda t: (t.dayofweek >= 5).astype(int),
+    'day_of_year': lambda t: t.dayofyear,
+}
+
+# Période des encodages cycliques sin/cos
+CYCLE_PERIODS = {'hour': 24, 'day_of_week': 7, 'month': 12, 'day_of_year': 366}
+
+ROLLING_STATS = ('mean', 'std', 'min', 'max')
+
+
+def history_hours(spec):
+    """
+    Nombre d'heures d'historique nécessaires avant la première ligne
+    pour que les lags et fenêtres du spec soient complets.
+    """
+    return max(list(spec.get('lags', [])) + list(spec.get('rolling', {})) + [0])
+
+
+def feature_names(spec):
+    names = list(spec.get('calendar', []))
+    for col in spec.get('cyclic', []):
+        names += [f"{col}_sin", f"{col}_cos"]
+    names += [f"lag_{k}h" for k in spec.get('lags', [])]
+    for window, stats in spec.get('rolling', {}).items():
+        names += [f"rolling_{stat}_{window}h" for stat in stats]
+    names += [f"ewm_{span}h" for span in spec.get('ewm', [])]
+    return names
+
+
+def calendar_features(timestamps, spec):
+    t = pd.DatetimeIndex(timestamps)
+    out = {}
+    for name in spec.get('calendar', []):
+        # float32 comme les autres features (et non int32/int64 selon pandas)
+        out[name] = np.asarray(CALENDAR_FEATURES[name](t), dtype=np.float32)
+    for name in spec.get('cyclic', []):
+        angle = (2 * np.pi / CYCLE_PERIODS[name]) * np.asarray(CALENDAR_FEATURES[name](t), dtype=np.float64)
+        out[f"{name}_sin"] = np.sin(angle).astype(np.float32)
+        out[f"{name}_cos"] = np.cos(angle).astype(np.float32)
+    return out
+
+
+def _window_sums(values, window):
+    """
+    Somme de values[t-window .. t-1] pour chaque t (NaN si t < window),
+    en O(n) grâce à la somme cumulée.
+    """
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    sums = np.full(len(values), np.nan)
+    sums[window:] = csum[window:-1] - csum[:-window - 1]
+    return sums
+
+
+def group_positions(groups):
+    """
+    Position de chaque ligne dans son groupe (0 pour la première), les
+    groupes étant contigus.
+    """
+    groups = np.asarray(groups)
+    n = len(groups)
+    starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1]))) if n else np.array([], np.int64)
+    return np.arange(n) - np.repeat(starts, np.diff(np.append(starts, n)))
+
+
+def series_features(values, spec, groups=None):
+    """
+    Lags, fenêtres glissantes et EWMA d'une série horaire contiguë (ou de
+    plusieurs, concaténées : `groups` donne le groupe de chaque ligne).
+    La valeur de l'heure t n'entre jamais dans ses propres features :
+    les fenêtres couvrent [t-window, t-1] (pas de fuite de données).
+    """
+    y = np.ascontiguousarray(values, dtype=np.float64)
+    n = len(y)
+    out = {}
+    # Nombre de lignes du même groupe avant chaque ligne
+    position = group_positions(groups) if groups is not None else np.arange(n)
+
+    for k in spec.get('lags', []):
+        lagged = np.full(n, np.nan, dtype=np.float32)
+        if k < n:  # Série plus courte que le lag (petit lot, respondent récent) : tout NaN
+            lagged[k:] = y[:n - k]
+        lagged[position < k] = np.nan
+        out[f"lag_{k}h"] = lagged
+
+    rolling = spec.get('rolling', {})
+    if rolling:
+        # Calculs partagés par toutes les fenêtres : masque des NaN, série
+        # centrée (sommes de carrés stables) et leurs sommes cumulées
+        missing = np.isnan(y)
+        offset = np.nanmean(y) if not missing.all() else 0.0
+        centered = np.where(missing, 0.0, y - offset)
+
+        for window, stats in rolling.items():
+            # Comme pandas : une fenêtre avec une valeur manquante donne NaN
+            incomplete = (_window_sums(missing.astype(np.float64), window) != 0) | (position < window)
+            sums = _window_sums(centered, window) if {'mean', 'std'} & set(stats) else None
+            views = sliding_window_view(y[:n - 1], window) if {'min', 'max'} & set(stats) and n > window else None
+
+            for stat in stats:
+                if stat == 'mean':
+                    result = sums / window + offset
+                elif stat == 'std':
+                    squares = _window_sums(centered ** 2, window)
+                    result = np.sqrt(np.maximum(squares - sums ** 2 / window, 0) / (window - 1))
+                elif stat in ('min', 'max'):
+                    result = np.full(n, np.nan)
+                    if views is not None:
+                        result[window:] = views.min(axis=1) if stat == 'min' else views.max(axis=1)
+                else:
+                    raise ValueError(f"Statistique inconnue : {stat} (attendu : {ROLLING_STATS})")
+                result[incomplete] = np.nan
+                out[f"rolling_{stat}_{window}h"] = result.astype(np.float32)
+
+    for span in spec.get('ewm', []):
+        # Récursion EWMA : déléguée à l'implémentation compilée de pandas
+        # (groupby().ewm() : une récursion par groupe, sans boucle Python)
+        shifted = np.concatenate(([np.nan], y[:-1]))[:n]
+        shifted[position == 0] = np.nan
+        if groups is None:
+            ewm = pd.Series(shifted).ewm(span=span, adjust=False).mean()
+        else:
+            ewm = pd.Series(shifted).groupby(np.asarray(groups), sort=False).ewm(span=span, adjust=False).mean()
+            ewm = ewm.droplevel(0).sort_index()
+        out[f"ewm_{span}h"] = ewm.to_numpy(np.float32)
+
+    return out
+
+
+def compute_features(timestamps, values, spec, groups=None):
+    """
+    Toutes les features du spec en un passage : {nom: tableau}.
+    """
+    out = calendar_features(timestamps, spec)
+    out.update(series_features(values, spec, groups))
+    return out
@@ -0,0 +1,168 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from feature_engineering import FEATURE_SPEC, INPUT_FILE
+from feature_kernels import calendar_features, feature_names, history_hours
+from hourly_grid import VALID_COLUMN, grid_positions, to_hourly_grid
+from instrumentation import current, instrumented, span
+from model_registry import latest_version, load_model, validate_schema
+from prediction_store import write_predictions
+from merge_data import LOAD_REGION, read_master
+
+# Prévisions multi-horizons (J+1 à J+7) à partir d'une heure d'émission.
+# Au-delà de 24 h, lag_24h porte sur des heures futures : la récursion se
+# fait par blocs de 24 h, chaque bloc utilisant les prédictions du bloc
+# précédent. Toutes les heures d'un bloc, pour toutes les heures
+# d'émission, sont prédites en un seul appel (7 appels pour une année de
+# prévisions à 7 jours).
+
+# --- CONFIGURATION ---
+OUTPUT_FILE = "data_processed/horizon_forecasts.parquet"
+HORIZON_HOURS = 24     # 24 (day-ahead) à 168 (week-ahead)
+BLOCK_HOURS = 24       # Plus petit lag : les heures d'un bloc ne dépendent que des blocs précédents
+ISSUE_HOUR = 0         # Heure (UTC) d'émission des prévisions quotidiennes
+
+
+def load_history(path=INPUT_FILE, columns=None, respondent=LOAD_REGION):
+    """
+    Table maître d'un respondent sur une grille horaire dense (NaN là où
+    une heure manque) : les décalages se font par position.
+    """
+    df = read_master(respondent, columns=columns, path=path)
+    df = df.drop(columns=[c for c in ['respondent', VALID_COLUMN] if c in df.columns])
+    return to_hourly_grid(df, value_columns=['demand_mwh'], group_col=None)[0].drop(columns=VALID_COLUMN)
+
+
+def block_features(Y, positions, spec):
+    """
+    Lags et fenêtres des heures `positions` (colonnes de Y) pour toutes
+    les trajectoires à la fois. Y : (émissions x heures), demande connue
+    ou déjà prédite. Fenêtres sur [t-fenêtre, t-1], comme feature_kernels.
+    """
+    out = {}
+    for k in spec.get('lags', []):
+        out[f"lag_{k}h"] = Y[:, positions - k]
+    for window, stats in spec.get('rolling', {}).items():
+        # (émissions x heures du bloc x fenêtre), vue sans copie
+        windows = sliding_window_view(Y, window, axis=1)[:, positions - window]
+        for stat in stats:
+            if stat == 'std':
+                out[f"rolling_std_{window}h"] = windows.std(axis=2, ddof=1)
+            else:
+                out[f"rolling_{stat}_{window}h"] = getattr(windows, stat)(axis=2)
+    return out
+
+
+@instrumented("horizon")
+def forecast_horizons(issue_times, horizon=HORIZON_HOURS, version=None,
+                      history=None, spec=FEATURE_SPEC):
+    """
+    Trajectoires de `horizon` heures pour chaque heure d'émission : la
+    demande est connue jusqu'à l'heure d'émission exclue, la météo est
+    supposée connue (valeurs observées, comme à l'entraînement).
+    Renvoie un DataFrame long (issue_time, target_time, horizon_h,
+    prediction, actual).
+    """
+    if spec.get('ewm'):
+        raise ValueError("Les features ewm ne sont pas supportées en récursion par blocs.")
+    lags = spec.get('lags', [])
+    if lags and min(lags) < BLOCK_HOURS:
+        raise ValueError(f"Le plus petit lag ({min(lags)} h) doit couvrir un bloc de {BLOCK_HOURS} h.")
+
+    booster, metadata = load_model(version)
+    features = metadata['features']
+    derived = set(feature_names(spec)) | {'year'}
+    exogenous = [f for f in features if f not in derived]
+
+    history = load_history(respondent=metadata.get('respondent', LOAD_REGION)) if history is None else history
+    validate_schema(metadata, derived | set(history.columns))
+    start = history['datetime_utc'].iloc[0]
+    demand = history['demand_mwh'].to_numpy(dtype=np.float64)
+    issues = pd.DatetimeIndex(pd.to_datetime(issue_times)).floor('h')
+    issue_pos = grid_positions(issues, start)
+
+    # Trajectoires : [historique nécessaire aux features | horizon], une ligne par émission
+    past = history_hours(spec)
+    offsets = np.arange(-past, horizon)
+    positions = issue_pos[:, None] + offsets[None, :]
+    inside = (positions >= 0) & (positions < len(demand))
+    Y = np.where(inside, demand[np.clip(positions, 0, len(demand) - 1)], np.nan)
+    actual = Y[:, past:].copy()
+    Y[:, past:] = np.nan  # Le futur est inconnu à l'heure d'émission
+
+    exo = {c: history[c].to_numpy(dtype=np.float64) for c in exogenous}
+    current().rows(rows_in=len(issues))
+
+    for block_start in range(0, horizon, BLOCK_HOURS):
+        block = np.arange(past + block_start, past + min(block_start + BLOCK_HOURS, horizon))
+        with span("horizon.block", block_start_h=block_start) as s:
+            # Heures du bloc encore inconnues dans les fenêtres : naïf saisonnier (J-1)
+            Y[:, block] = Y[:, block - BLOCK_HOURS]
+            columns = block_features(Y, block, spec)
+
+            target_pos = positions[:, block]
+            timestamps = start + pd.to_timedelta(target_pos.ravel(), unit='h')
+            columns.update({k: v.reshape(target_pos.shape) for k, v in calendar_features(timestamps, spec).items()})
+            columns['year'] = timestamps.year.to_numpy().reshape(target_pos.shape)
+            target_inside = inside[:, block]
+            for c in exogenous:
+                columns[c] = np.where(target_inside, exo[c][np.clip(target_pos, 0, len(demand) - 1)], np.nan)
+
+            X = np.empty((target_pos.size, len(features)), dtype=np.float32)
+            for j, name in enumerate(features):
+                X[:, j] = np.asarray(columns[name]).ravel()
+            Y[:, block] = booster.inplace_predict(X, validate_features=False).reshape(target_pos.shape)
+            s.rows(rows_out=target_pos.size)
+
+    predictions = Y[:, past:]
+    result = pd.DataFrame({
+        'issue_time': np.repeat(issues.to_numpy(), horizon),
+        'target_time': (start + pd.to_timedelta(positions[:, past:].ravel(), unit='h')).to_numpy(),
+        'horizon_h': np.tile(np.arange(1, horizon + 1), len(issues)),
+        'prediction': predictions.ravel().astype(np.float32),
+        'actual': actual.ravel().astype(np.float32),
+    })
+    current().rows(rows_out=len(result))
+    return result
+
+
+def daily_issue_times(start, end, hour=ISSUE_HOUR):
+    return pd.date_range(pd.Timestamp(start) + pd.Timedelta(hours=hour), end, freq='D', inclusive='left')
+
+
+def horizon_report(result):
+    """
+    MAPE par jour d'horizon (J+1, J+2...).
+    """
+    scored = result.dropna(subset=['actual'])
+    ape = (scored['actual'] - scored['prediction']).abs() / scored['actual'] * 100
+    return ape.groupby((scored['horizon_h'] - 1) // 24 + 1).mean().rename('mape').rename_axis('day_ahead')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prévisions multi-horizons (récursion par blocs de 24 h).")
+    parser.add_argument("--start", required=True, help="Première heure d'émission (ex : 2023-01-01)")
+    parser.add_argument("--end", required=True, help="Fin (exclue) des heures d'émission")
+    parser.add_argument("--horizon", type=int, default=HORIZON_HOURS, help="Heures prédites par émission")
+    parser.add_argument("--version", default=None, help="Version du registre (défaut : la dernière)")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--store", action="store_true",
+                        help="Ajoute aussi les trajectoires au store de prédictions (run=horizon)")
+    args = parser.parse_args()
+
+    issues = daily_issue_times(args.start, args.end)
+    print(f"🔭 Prévisions à {args.horizon} h pour {len(issues)} émissions...")
+    started = time.perf_counter()
+    result = forecast_horizons(issues, args.horizon, args.version)
+    print(f"   {len(result)} heures prédites en {time.perf_counter() - started:.2f} s")
+    print(horizon_report(result).round(2).to_string())
+    result.to_parquet(args.output, index=False)
+    print(f"✅ Prévisions sauvegardées : {args.output}")
+    if args.store:
+        version = args.version or latest_version()
+        write_predictions(result, version, run="horizon")
+        print(f"✅ Trajectoires ajoutées au store de prédictions (version {version})")
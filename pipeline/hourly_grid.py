@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+
+# Grille horaire UTC contiguë : chaque série (une par respondent) a une
+# ligne par heure entre sa première et sa dernière heure valide, même
+# quand l'heure manque (valeurs NaN, is_valid = False). La ligne d'une
+# heure t est donc start + (t - start) / 1 h : les lags et fenêtres sont
+# de l'arithmétique d'indices, jamais un décalage de lignes qui glisse
+# sur un trou. Les anomalies (trous, doublons, heures hors grille,
+# artefacts de changement d'heure) sont listées dans un rapport.
+
+# --- CONFIGURATION ---
+VALID_COLUMN = "is_valid"
+DST_WINDOW = pd.Timedelta(days=1)  # Autour d'un changement d'heure US, une anomalie est classée "dst"
+REPORT_COLUMNS = ['respondent', 'kind', 'start', 'end', 'hours']
+
+
+def hour_numbers(timestamps):
+    """
+    Heures depuis l'epoch (entiers) : la coordonnée d'une heure sur la grille.
+    """
+    values = pd.DatetimeIndex(pd.to_datetime(timestamps)).as_unit('s').asi8
+    return values // 3600
+
+
+def grid_positions(timestamps, start):
+    """
+    Position sur une grille qui commence à `start` (accès direct, O(1) par heure).
+    """
+    return hour_numbers(timestamps) - int(hour_numbers([start])[0])
+
+
+def dst_transitions(years):
+    """
+    Changements d'heure US : 2e dimanche de mars et 1er dimanche de novembre.
+    """
+    days = []
+    for year in years:
+        march = pd.date_range(f"{year}-03-01", periods=14, freq='D')
+        november = pd.date_range(f"{year}-11-01", periods=7, freq='D')
+        days += [march[march.dayofweek == 6][1], november[november.dayofweek == 6][0]]
+    return pd.DatetimeIndex(days)
+
+
+def _runs(mask, groups=None):
+    """
+    Débuts (inclus) et fins (exclues) des séquences de True, coupées aux
+    changements de groupe (une séquence ne déborde jamais sur le groupe suivant).
+    """
+    mask = np.asarray(mask, dtype=bool)
+    n = len(mask)
+    if n == 0:
+        return np.array([], np.int64), np.array([], np.int64)
+    boundary = np.zeros(n, dtype=bool)
+    if groups is not None:
+        boundary[1:] = groups[1:] != groups[:-1]
+    previous = np.concatenate(([False], mask[:-1])) & ~boundary
+    following = np.concatenate((mask[1:], [False])) & ~np.concatenate((boundary[1:], [False]))
+    return np.flatnonzero(mask & ~previous), np.flatnonzero(mask & ~following) + 1
+
+
+def point_report(kind, df, time_col='datetime_utc', group_col='respondent'):
+    """
+    Une ligne de rapport par heure isolée (ex. doublons repérés en amont).
+    """
+    times = pd.to_datetime(df[time_col]).dt.floor('h').to_numpy()
+    return pd.DataFrame({
+        'respondent': df[group_col].to_numpy() if group_col in df.columns else None,
+        'kind': kind, 'start': times, 'end': times, 'hours': 1,
+    }, columns=REPORT_COLUMNS)
+
+
+def classify_dst(report):
+    """
+    Un trou d'une heure ou un doublon près d'un changement d'heure vient
+    presque toujours d'une conversion heure locale -> UTC : "dst".
+    """
+    report = report.reset_index(drop=True)
+    if report.empty:
+        return report
+    transitions = dst_transitions(range(report['start'].dt.year.min(), report['end'].dt.year.max() + 1))
+    nearest = np.abs(report['start'].to_numpy()[:, None] - transitions.to_numpy()[None, :]).min(axis=1)
+    dst = (report['hours'] == 1) & (report['kind'].isin(['gap', 'duplicate'])) & (nearest <= DST_WINDOW)
+    report.loc[dst.to_numpy(), 'kind'] = 'dst'
+    return report
+
+
+def to_hourly_grid(df, value_columns, time_col='datetime_utc', group_col='respondent'):
+    """
+    Réindexe df (une ou plusieurs séries) sur une grille horaire contiguë
+    par groupe, triée par (groupe, heure), toutes les séries en un passage.
+    - heures hors grille (ex. 10:30) : écartées
+    - doublons : la dernière ligne gagne
+    - is_valid : l'heure existe et aucune des value_columns n'est NaN
+    - la grille va de la première à la dernière heure valide du groupe :
+      les lignes au-delà (ex. prévision DF seule, sans demande observée)
+      sont écartées et signalées "forecast_only" (ou "no_demand" avant)
+    Les autres colonnes sont recopiées telles quelles (NaN sur les heures
+    ajoutées, sauf group_col). Renvoie (grille, rapport des anomalies).
+    """
+    grouped = group_col is not None and group_col in df.columns
+    t = pd.DatetimeIndex(df[time_col])
+    hours = hour_numbers(t)
+    keys = df[group_col].to_numpy() if grouped else np.zeros(len(df), dtype=np.int8)
+    codes, groups = pd.factorize(keys, sort=True)
+    report = []
+
+    def add_report(kind, group_idx, start_h, end_h, n_hours):
+        report.append(pd.DataFrame({
+            'respondent': np.asarray(groups)[group_idx] if grouped else None,
+            'kind': kind,
+            'start': pd.to_datetime(np.asarray(start_h, dtype=np.int64) * 3600, unit='s'),
+            'end': pd.to_datetime(np.asarray(end_h, dtype=np.int64) * 3600, unit='s'),
+            'hours': np.asarray(n_hours, dtype=np.int64),
+        }))
+
+    # 1. Heures hors grille (minutes/secondes non nulles)
+    on_grid = (t.as_unit('s').asi8 % 3600) == 0
+    if not on_grid.all():
+        off = ~on_grid
+        add_report('off_grid', codes[off], hours[off], hours[off], np.ones(off.sum()))
+        df, hours, codes = df[on_grid], hours[on_grid], codes[on_grid]
+
+    # 2. Doublons (groupe, heure) : tri stable, la dernière occurrence gagne
+    order = np.lexsort((hours, codes))
+    df, hours, codes = df.iloc[order], hours[order], codes[order]
+    last = np.concatenate(((codes[1:] != codes[:-1]) | (hours[1:] != hours[:-1]), [True]))
+    if not last.all():
+        dup = ~last
+        add_report('duplicate', codes[dup], hours[dup], hours[dup], np.ones(dup.sum()))
+        df, hours, codes = df[last], hours[last], codes[last]
+
+    # 3. Grille : [première heure valide, dernière heure valide] de chaque groupe, bout à bout
+    n_groups = len(groups)
+    observed = ~df[list(value_columns)].isna().any(axis=1).to_numpy()
+    first = np.full(n_groups, np.iinfo(np.int64).max)
+    final = np.full(n_groups, np.iinfo(np.int64).min)
+    np.minimum.at(first, codes[observed], hours[observed])
+    np.maximum.at(final, codes[observed], hours[observed])
+    present = first <= final
+    before = ~present[codes] | (hours < first[codes])
+    after = present[codes] & (hours > final[codes])
+    for kind, outside in (('no_demand', before), ('forecast_only', after)):
+        if outside.any():
+            starts, ends = _runs(outside, codes)  # Lignes consécutives (triées) d'un même groupe
+            add_report(kind, codes[starts], hours[starts], hours[ends - 1], ends - starts)
+    inside = ~(before | after)
+    df, hours, codes, observed = df[inside], hours[inside], codes[inside], observed[inside]
+    lengths = np.where(present, final - first + 1, 0)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    size = int(lengths.sum())
+
+    grid_codes = np.repeat(np.arange(n_groups), lengths)
+    grid_hours = np.repeat(first, lengths) + (np.arange(size) - np.repeat(offsets, lengths))
+    rows = offsets[codes] + (hours - first[codes])  # Ligne de chaque observation : pure arithmétique
+
+    out = {}
+    for column in df.columns:
+        if column in (time_col, group_col):
+            continue
+        values = df[column].to_numpy()
+        kind = values.dtype.kind
+        if kind in 'fc':
+            filled = np.full(size, np.nan, dtype=values.dtype)
+        elif kind in 'iub':
+            filled = np.full(size, np.nan)  # Entiers/booléens : flottants pour porter les NaN
+        else:
+            filled = np.full(size, None, dtype=object)
+        filled[rows] = values
+        out[column] = filled
+
+    valid = np.zeros(size, dtype=bool)
+    valid[rows] = observed
+
+    grid = pd.DataFrame(out)
+    grid.insert(0, time_col, pd.to_datetime(grid_hours * 3600, unit='s').astype(df[time_col].dtype))
+    if grouped:
+        grid.insert(0, group_col, np.asarray(groups)[grid_codes])
+    grid[VALID_COLUMN] = valid
+
+    # 4. Trous : séquences d'heures absentes ou sans valeur
+    starts, ends = _runs(~valid, grid_codes)
+    if len(starts):
+        add_report('gap', grid_codes[starts], grid_hours[starts], grid_hours[ends - 1], ends - starts)
+
+    report = pd.concat(report, ignore_index=True) if report else pd.DataFrame(columns=REPORT_COLUMNS)
+    report = classify_dst(report.sort_values(['start', 'kind'], ignore_index=True))
+    return grid, report
+
+
+def summarize_report(report):
+    if report.empty:
+        return "aucune anomalie"
+    counts = report.groupby('kind')['hours'].agg(['count', 'sum'])
+    return ", ".join(f"{kind} : {row['count']} ({row['sum']} h)" for kind, row in counts.iterrows())
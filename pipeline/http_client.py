@@ -0,0 +1,296 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- CONFIGURATION ---
+DEFAULT_POOL_SIZE = 8       # Connexions HTTP gardées ouvertes (keep-alive)
+DEFAULT_RETRIES = 4         # Nombre de nouvelles tentatives par requête
+DEFAULT_BACKOFF = 1.0       # Attente initiale (s), doublée à chaque échec
+DEFAULT_TIMEOUT = 60        # Timeout (s) d'une requête
+
+# Codes HTTP pour lesquels on retente (limite de débit, erreurs serveur)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Cache disque des réponses JSON, partagé par toutes les ingestions.
+# Clé = URL + paramètres normalisés (sans la clé d'API), corps compressé.
+# Une requête qui s'arrête avant le mois en cours ne change plus : elle
+# n'expire jamais ; sinon elle est refaite après OPEN_PERIOD_TTL_S.
+# PIPELINE_HTTP_CACHE=off désactive le cache, =offline rejoue les réponses
+# enregistrées sans aucun accès réseau (erreur si une réponse manque).
+CACHE_ENV = "PIPELINE_HTTP_CACHE"
+CACHE_DIR = "data_raw/http_cache"
+CACHE_MAX_BYTES = 2 * 1024 ** 3        # Au-delà, les entrées les moins récemment lues sont supprimées
+OPEN_PERIOD_TTL_S = 3600
+SETTLE_DAYS = 7                        # Retard de publication/révision : un mois n'est clos qu'après ce délai
+KEY_EXCLUDED_PARAMS = {"api_key", "apikey"}
+END_PARAMS = ("end", "end_date")       # Fin de la période demandée (EIA, Open-Meteo)
+
+
+class RateLimiter:
+    """
+    Token bucket partagé entre threads : `rate` requêtes/s en régime
+    permanent, avec des rafales de `burst` requêtes au maximum.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def make_session(pool_size=DEFAULT_POOL_SIZE):
+    """
+    Session HTTP réutilisable : les connexions TCP/TLS sont gardées
+    ouvertes entre les pages au lieu d'être recréées à chaque appel.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_json(session, url, params, limiter=None, retries=DEFAULT_RETRIES,
+             backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT, cache=None):
+    """
+    GET + décodage JSON avec retry et backoff exponentiel.
+    Lève la dernière erreur si toutes les tentatives échouent.
+    cache : ResponseCache (défaut : celui du process, False pour l'ignorer).
+    Une réponse en cache ne consomme pas de jeton du rate limiter.
+    """
+    return fetch_json(url, params, lambda: _get_content(session, url, params, limiter, retries, backoff, timeout),
+                      cache)
+
+
+def _get_content(session, url, params, limiter, retries, backoff, timeout):
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+            if response.status_code in RETRY_STATUS:
+                raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+            response.raise_for_status()
+            return response.content
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            status = getattr(e.response, "status_code", None)
+            # Une erreur client (400, 403...) ne se corrige pas en réessayant
+            if status is not None and status not in RETRY_STATUS:
+                raise
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+
+class OfflineCacheMiss(RuntimeError):
+    """
+    Mode hors-ligne : aucune réponse enregistrée pour cette requête.
+    """
+
+
+class ResponseCache:
+    """
+    Réponses JSON sur disque, une entrée par requête normalisée :
+    <cache_dir>/<2 premiers caractères>/<sha256>.bin = une ligne d'en-tête
+    JSON (url, paramètres, expiration) puis le corps compressé (zlib).
+    La date de modification du fichier sert d'horodatage LRU.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, offline=False,
+                 open_ttl=OPEN_PERIOD_TTL_S):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.open_ttl = open_ttl
+        self.lock = threading.Lock()  # Taille totale et compteurs (cache partagé entre threads)
+        self.hits = self.misses = 0
+        self._size = None  # Taille totale, calculée au premier ajout
+
+    @staticmethod
+    def normalize(url, params):
+        """
+        Paramètres triés, valeurs en texte (listes = paramètres répétés),
+        sans la clé d'API : la même requête donne toujours la même clé.
+        """
+        items = []
+        for name, value in (params or {}).items():
+            if name in KEY_EXCLUDED_PARAMS:
+                continue
+            values = value if isinstance(value, (list, tuple)) else [value]
+            items += [(str(name), str(v)) for v in values]
+        return {"url": url, "params": sorted(items)}
+
+    def key(self, url, params):
+        request = json.dumps(self.normalize(url, params), separators=(",", ":"))
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.bin")
+
+    def expires_at(self, params, now=None):
+        """
+        None (jamais) si la période demandée se termine avant le dernier
+        mois clos (UTC, avec SETTLE_DAYS de marge), sinon maintenant + open_ttl.
+        """
+        now = time.time() if now is None else now
+        end = next((params[p] for p in END_PARAMS if p in (params or {})), None)
+        try:
+            # "2024-01-01T00" (EIA, heure incluse) ou "2024-01-01" (Open-Meteo, jour inclus)
+            end = pd.Timestamp(str(end).replace("T", " ")) if end is not None else None
+        except ValueError:
+            end = None
+        settled = pd.Timestamp(now - SETTLE_DAYS * 86400, unit="s").to_period("M").to_timestamp()
+        if end is not None and end < settled:
+            return None
+        return now + self.open_ttl
+
+    def get(self, url, params):
+        """
+        Corps de la réponse enregistrée (bytes), ou None si absente ou
+        expirée. En mode hors-ligne, une entrée expirée est rejouée.
+        """
+        path = self.path(self.key(url, params))
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+        expires = header.get("expires_at")
+        if expires is not None and expires < time.time() and not self.offline:
+            return None
+        try:
+            os.utime(path)  # Lu récemment : dernier à être évincé
+        except FileNotFoundError:
+            pass
+        return zlib.decompress(body)
+
+    def put(self, url, params, content):
+        path = self.path(self.key(url, params))
+        header = dict(self.normalize(url, params), fetched_at=time.time(),
+                      expires_at=self.expires_at(params))
+        data = json.dumps(header).encode() + b"\n" + zlib.compress(content, 6)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Écriture dans un fichier temporaire puis renommage : pas d'entrée tronquée
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        with self.lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp, path)
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".bin"):
+                    full = os.path.join(root, name)
+                    stat = os.stat(full)
+                    entries.append((stat.st_mtime, stat.st_size, full))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """
+        Supprime les entrées les moins récemment utilisées jusqu'à 90 % de la limite.
+        """
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, full in entries:
+            if self._size <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(full)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def fetch_json(self, url, params, fetch):
+        """
+        Réponse JSON depuis le cache, sinon via fetch() -> corps (bytes),
+        enregistrée ensuite.
+        """
+        content = self.get(url, params)
+        if content is not None:
+            with self.lock:
+                self.hits += 1
+            return json.loads(content)
+        if self.offline:
+            raise OfflineCacheMiss(f"Hors-ligne : pas de réponse enregistrée pour {url} {self.normalize(url, params)['params']}")
+        with self.lock:
+            self.misses += 1
+        content = fetch()
+        data = json.loads(content)
+        self.put(url, params, content)
+        return data
+
+
+_default_cache = {}
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """
+    Cache partagé du process, configuré par PIPELINE_HTTP_CACHE
+    (None si désactivé).
+    """
+    mode = os.environ.get(CACHE_ENV, "on").lower()
+    if mode == "off":
+        return None
+    with _default_lock:
+        if mode not in _default_cache:
+            _default_cache[mode] = ResponseCache(offline=(mode == "offline"))
+        return _default_cache[mode]
+
+
+def cache_report():
+    cache = default_cache()
+    if cache is None:
+        return "cache HTTP désactivé"
+    return f"cache HTTP : {cache.hits} réponses relues, {cache.misses} téléchargées"
+
+
+def fetch_json(url, params, fetch=None, cache=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Réponse JSON à travers le cache (défaut : celui du process, False pour
+    l'ignorer). fetch() -> corps (bytes) ; sans fetch, un simple
+    requests.get (appels directs, sans session ni retry).
+    """
+    if fetch is None:
+        def fetch():
+            response = requests.get(url, params=params, timeout=timeout)
+            response.raise_for_status()
+            return response.content
+    cache = default_cache() if cache is None else cache
+    if not cache:
+        return json.loads(fetch())
+    return cache.fetch_json(url, params, fetch)
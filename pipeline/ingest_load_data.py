@@ -1,85 +1,328 @@
-import requests
-import pandas as pd
-import time
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-API_KEY = os.getenv("API_KEY")
-START_DATE = "2022-01-01T00" # On prend 2 ans pour commencer
-END_DATE = "2024-01-01T00"
-OUTPUT_DIR = "data_raw"
-OUTPUT_FILE = "us_load_2022_2023.csv"
-BASE_URL = "https://api.eia.gov/v2/electricity/rto/region-data/data/"
-
-def get_eia_data(api_key, start, end):
-    """
-    Récupère les données de consommation US48 page par page.
-    """
-    all_data = []
-    offset = 0
-    length = 5000 # Max autorisé par appel
-    
-    print(f"🚀 Démarrage de l'extraction de {start} à {end}...")
-
-    while True:
-        params = {
-            "api_key": api_key,
-            "frequency": "hourly",
-            "data[0]": "value",
-            "facets[respondent][]": "US48",
-            "facets[type][]": "D",
-            "start": start,
-            "end": end,
-            "sort[0][column]": "period",
-            "sort[0][direction]": "asc",
-            "offset": offset,
-            "length": length
-        }
-
-        try:
-            response = requests.get(BASE_URL, params=params)
-            response.raise_for_status() # Lève une erreur si le code n'est pas 200
-            
-            data = response.json()
-            records = data['response']['data']
-            
-            if not records:
-                print("🏁 Fin des données reçues.")
-                break
-            
-            all_data.extend(records)
-            print(f"📦 Récupéré {len(records)} lignes (Total: {len(all_data)})...")
-            
-            # Préparation pour la page suivante
-            offset += length
-            
-            # Pause courte pour être gentil avec l'API (éviter le blocage)
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"❌ Erreur lors de la requête : {e}")
-            break
-
-    return pd.DataFrame(all_data)
-
-# --- MAIN ---
-if __name__ == "__main__":
-    # 1. Création du dossier si inexistant
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-        
-    # 2. Extraction
-    df = get_eia_data(API_KEY, START_DATE, END_DATE)
-    
-    if not df.empty:
-        # 3. Sauvegarde CSV Brut
-        full_path = os.path.join(OUTPUT_DIR, OUTPUT_FILE)
-        df.to_csv(full_path, index=False)
-        print(f"\n✅ Succès ! Données sauvegardées dans : {full_path}")
-        print(f"📊 Dimension du dataset : {df.shape}")
-        print("Aperçu :")
-        print(df[['period', 'value']].head())
-        print(df[['period', 'value']].tail())
-    else:
-        print("⚠️ Aucune donnée récupérée.")
\ No newline at end of file
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import os
+
+from hourly_grid import VALID_COLUMN
+from http_client import RateLimiter, cache_report, fetch_json, get_json, make_session
+from instrumentation import current, instrumented, span
+from process_load_data import LOAD_SCHEMA, TYPE_COLUMNS, respondent_dir
+from storage import PartitionedWriter, clear_dataset, latest_timestamp
+
+load_dotenv()
+API_KEY = os.getenv("API_KEY")
+START_DATE = "2022-01-01T00" # On prend 2 ans pour commencer
+END_DATE = "2024-01-01T00"
+OUTPUT_DIR = "data_raw"
+OUTPUT_FILE = "us_load_2022_2023.csv"
+BASE_URL = "https://api.eia.gov/v2/electricity/rto/region-data/data/"
+PAGE_LENGTH = 5000 # Max autorisé par appel
+
+# Séries à extraire : une requête par couple (respondent, type)
+# - RESPONDENTS : codes EIA des balancing authorities (US48, CISO, ERCO, PJM, MISO...)
+# - TYPES       : D = demande, DF = prévision de demande, NG = production nette
+RESPONDENTS = ["US48"]
+TYPES = ["D"]
+
+# Mode concurrent : pages téléchargées en parallèle sur une session partagée
+CONCURRENT = True
+MAX_WORKERS = 4     # Nombre de pages en vol simultanément (par série)
+SERIES_WORKERS = 4  # Nombre de séries extraites en parallèle
+RATE_LIMIT = 5      # Requêtes par seconde (token bucket partagé par toutes les séries)
+
+# Mode incrémental : on ne récupère que les heures après le watermark
+# (dernière datetime_utc déjà présente dans data_processed/load)
+INCREMENTAL = False
+PROCESSED_DIR = "data_processed/load"
+INCREMENTAL_FILE = "us_load_incremental.csv"
+
+# Mode streaming : chaque page devient un record batch Arrow typé, écrit
+# directement dans le dataset Parquet partitionné (pas de CSV intermédiaire).
+# Le CSV brut peut être conservé en plus comme archive.
+STREAM_TO_PARQUET = False
+ARCHIVE_CSV = False
+
+def build_params(api_key, start, end, offset, length=PAGE_LENGTH, respondent="US48", type_="D"):
+    return {
+        "api_key": api_key,
+        "frequency": "hourly",
+        "data[0]": "value",
+        "facets[respondent][]": respondent,
+        "facets[type][]": type_,
+        "start": start,
+        "end": end,
+        "sort[0][column]": "period",
+        "sort[0][direction]": "asc",
+        "offset": offset,
+        "length": length
+    }
+
+def iter_eia_pages(api_key, start, end, workers=MAX_WORKERS, rate=RATE_LIMIT,
+                   base_url=BASE_URL, length=PAGE_LENGTH, respondent="US48", type_="D",
+                   session=None, limiter=None):
+    """
+    Génère les pages (listes de lignes) d'une série dans l'ordre, téléchargées
+    en parallèle. La première page donne le total, d'où on déduit les
+    offsets restants. Au plus 2 x workers pages sont en mémoire à la fois.
+    Une page en échec (après retries) fait échouer l'extraction entière.
+    session/limiter : partagés entre séries (sinon créés pour cet appel).
+    """
+    limiter = limiter or RateLimiter(rate)
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_size=workers)
+    series = f"{respondent}/{type_}"
+
+    def fetch(offset):
+        with span("ingest_load.page", memory=False, offset=offset, series=series) as s:
+            params = build_params(api_key, start, end, offset, length, respondent, type_)
+            data = get_json(session, base_url, params, limiter)
+            s.rows(rows_out=len(data['response']['data']))
+        return data['response']
+
+    try:
+        first = fetch(0)
+        total = int(first.get('total', 0))
+        offsets = iter(range(length, total, length))
+        n_pages = max(1, -(-total // length))
+        print(f"📄 {series} : {total} lignes annoncées, {n_pages} pages à récupérer ({workers} workers)...")
+        yield first['data']
+
+        # File FIFO de futures : les pages sont rendues dans l'ordre des offsets
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque(executor.submit(fetch, o) for _, o in zip(range(2 * workers), offsets))
+            page = 1
+            while pending:
+                records = pending.popleft().result()['data']
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    pending.append(executor.submit(fetch, next_offset))
+                page += 1
+                print(f"📦 {series} : page {page}/{n_pages} ({len(records)} lignes)")
+                yield records
+    finally:
+        if own_session:
+            session.close()
+
+def fetch_pages_concurrent(api_key, start, end, workers=MAX_WORKERS, rate=RATE_LIMIT,
+                           base_url=BASE_URL, length=PAGE_LENGTH, respondent="US48", type_="D",
+                           session=None, limiter=None):
+    """
+    Télécharge toutes les pages d'une série en parallèle et renvoie les lignes dans l'ordre.
+    """
+    pages = iter_eia_pages(api_key, start, end, workers, rate, base_url, length,
+                           respondent, type_, session, limiter)
+    return [record for page in pages for record in page]
+
+def series_list(respondents=None, types=None):
+    return [(r, t) for r in (respondents or RESPONDENTS) for t in (types or TYPES)]
+
+def map_series(fn, series, series_workers=SERIES_WORKERS, workers=MAX_WORKERS, rate=RATE_LIMIT):
+    """
+    Applique fn(respondent, type_, session, limiter) à chaque série, en
+    parallèle : une seule session (pool dimensionné pour toutes les pages en
+    vol) et un seul token bucket, la limite de débit de l'API reste globale.
+    Renvoie les résultats dans l'ordre des séries.
+    """
+    limiter = RateLimiter(rate)
+    with make_session(pool_size=series_workers * workers) as session:
+        with ThreadPoolExecutor(max_workers=series_workers) as executor:
+            futures = [executor.submit(fn, r, t, session, limiter) for r, t in series]
+            return [f.result() for f in futures]
+
+def records_to_batch(records, type_="D"):
+    """
+    Page EIA d'une série -> record batch Arrow typé (LOAD_SCHEMA) : seule la
+    colonne du type de la série est remplie, les autres restent nulles.
+    La date "2022-01-01T00" est parsée par Arrow, sans passer par pandas.
+    Les heures sans valeur sont écartées (le watermark incrémental ne doit
+    pas dépasser une heure que l'EIA n'a pas encore publiée). Le lot n'est
+    pas mis sur la grille horaire : les types arrivent séparément, c'est
+    merge_data qui les réunit et refait la grille (is_valid compris) ;
+    is_valid indique ici seulement si la ligne porte une demande.
+    """
+    periods = pa.array([r['period'] for r in records], pa.string())
+    values = pa.array([r.get('value') for r in records]).cast(pa.float64())
+    columns = {
+        'datetime_utc': pc.strptime(periods, format="%Y-%m-%dT%H", unit="us"),
+        TYPE_COLUMNS[type_]: values,
+    }
+    demand = columns.get('demand_mwh', pa.nulls(len(records), pa.float64()))
+    columns[VALID_COLUMN] = pc.is_valid(demand)
+    batch = pa.RecordBatch.from_arrays(
+        [columns.get(f.name, pa.nulls(len(records), f.type)) for f in LOAD_SCHEMA], schema=LOAD_SCHEMA)
+    return batch.filter(pc.is_valid(values))
+
+@instrumented("ingest_load.stream")
+def stream_eia_to_parquet(api_key, start, end, output_dir=PROCESSED_DIR, append=False,
+                          archive_csv=None, workers=MAX_WORKERS, rate=RATE_LIMIT, base_url=BASE_URL,
+                          respondents=None, types=None, series_workers=SERIES_WORKERS):
+    """
+    Écrit les pages dans le dataset partitionné au fur et à mesure qu'elles
+    arrivent : la mémoire est bornée par quelques pages, pas par l'historique.
+    Chaque série a son writer, sous respondent=<code>/year=/month=.
+    append=False remplace le dataset (backfill complet) : tout est écrit
+    dans un dossier temporaire, qui ne remplace l'ancien dataset qu'une
+    fois toutes les séries extraites (une erreur laisse l'ancien intact).
+    append=True ajoute un nouveau fichier par partition (mise à jour incrémentale).
+    """
+    print(f"🚀 Extraction en streaming de {start} à {end} -> {output_dir}")
+    target_dir = output_dir if append else output_dir + ".tmp"
+    if not append:
+        clear_dataset(target_dir)
+    if archive_csv and os.path.exists(archive_csv):
+        os.remove(archive_csv)
+    archive_lock = threading.Lock()
+
+    def stream_series(respondent, type_, session, limiter):
+        with PartitionedWriter(respondent_dir(target_dir, respondent), LOAD_SCHEMA) as writer:
+            for records in iter_eia_pages(api_key, start, end, workers, rate, base_url, PAGE_LENGTH,
+                                          respondent, type_, session, limiter):
+                if not records:
+                    continue
+                writer.write_batch(records_to_batch(records, type_))
+                if archive_csv:
+                    with archive_lock:
+                        pd.DataFrame(records).to_csv(archive_csv, mode='a', index=False,
+                                                     header=not os.path.exists(archive_csv))
+        return writer.rows_written
+
+    rows_written = sum(map_series(stream_series, series_list(respondents, types), series_workers, workers, rate))
+    if not append:
+        clear_dataset(output_dir)
+        if os.path.isdir(target_dir):
+            os.replace(target_dir, output_dir)
+    print(f"✅ {rows_written} lignes écrites dans {output_dir} ({cache_report()})")
+    current().rows(rows_out=rows_written)
+    current().wrote(output_dir)
+    return rows_written
+
+def fetch_series_sequential(api_key, start, end, base_url=BASE_URL, respondent="US48", type_="D"):
+    """
+    Mode historique : une page après l'autre, avec une pause entre les appels.
+    """
+    all_data = []
+    offset = 0
+    length = PAGE_LENGTH
+
+    while True:
+        params = build_params(api_key, start, end, offset, length, respondent, type_)
+
+        try:
+            # Lève une erreur si le code n'est pas 200 ; réponse rejouée depuis le cache si présente
+            data = fetch_json(base_url, params)
+            records = data['response']['data']
+            
+            if not records:
+                print(f"🏁 Fin des données reçues ({respondent}/{type_}).")
+                break
+            
+            all_data.extend(records)
+            print(f"📦 Récupéré {len(records)} lignes (Total: {len(all_data)})...")
+            
+            # Préparation pour la page suivante
+            offset += length
+            
+            # Pause courte pour être gentil avec l'API (éviter le blocage)
+            time.sleep(0.5)
+            
+        except Exception as e:
+            print(f"❌ Erreur lors de la requête : {e}")
+            break
+
+    return all_data
+
+@instrumented("ingest_load.fetch")
+def get_eia_data(api_key, start, end, concurrent=CONCURRENT, workers=MAX_WORKERS,
+                 rate=RATE_LIMIT, base_url=BASE_URL, respondents=None, types=None,
+                 series_workers=SERIES_WORKERS):
+    """
+    Récupère les séries (respondent x type) configurées, page par page.
+    En mode concurrent, les séries et leurs pages sont extraites en parallèle.
+    """
+    series = series_list(respondents, types)
+    print(f"🚀 Démarrage de l'extraction de {start} à {end} ({len(series)} séries)...")
+
+    if concurrent:
+        def fetch(respondent, type_, session, limiter):
+            return fetch_pages_concurrent(api_key, start, end, workers, rate, base_url, PAGE_LENGTH,
+                                          respondent, type_, session, limiter)
+        pages = map_series(fetch, series, series_workers, workers, rate)
+    else:
+        pages = [fetch_series_sequential(api_key, start, end, base_url, r, t) for r, t in series]
+
+    df = pd.DataFrame([record for records in pages for record in records])
+    print(f"💾 {cache_report()}")
+    current().rows(rows_out=len(df))
+    return df
+
+def incremental_window(processed_dir=PROCESSED_DIR, respondents=None):
+    """
+    Fenêtre (start, end) au format EIA pour une mise à jour incrémentale :
+    de l'heure qui suit le watermark jusqu'à l'heure courante (UTC).
+    Le watermark est celui du respondent le plus en retard (les autres
+    re-téléchargent quelques heures, dédoublonnées au traitement).
+    Seules les heures avec une demande réelle comptent : les prévisions
+    (DF) vont au-delà de la dernière heure observée.
+    Renvoie None si un respondent n'a encore aucune donnée traitée.
+    """
+    watermarks = [latest_timestamp(respondent_dir(processed_dir, r), value_column='demand_mwh')
+                  for r in (respondents or RESPONDENTS)]
+    if any(last is None for last in watermarks):
+        return None
+    start = pd.Timestamp(min(watermarks)) + pd.Timedelta(hours=1)
+    end = pd.Timestamp.now(tz="UTC").tz_localize(None).floor("h")
+    return start.strftime("%Y-%m-%dT%H"), end.strftime("%Y-%m-%dT%H")
+
+@instrumented("ingest_load")
+def main(incremental=INCREMENTAL, stream=STREAM_TO_PARQUET):
+    # 1. Création du dossier si inexistant
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+
+    start, end, output_file, append = START_DATE, END_DATE, OUTPUT_FILE, False
+    if incremental:
+        window = incremental_window()
+        if window is None:
+            print("ℹ️ Aucun historique traité : extraction complète.")
+        else:
+            start, end = window
+            output_file = INCREMENTAL_FILE
+            append = True
+            # On ne laisse pas traîner le lot précédent (il serait retraité)
+            stale = os.path.join(OUTPUT_DIR, INCREMENTAL_FILE)
+            if os.path.exists(stale):
+                os.remove(stale)
+            if start > end:
+                print(f"✅ Déjà à jour (watermark : {start}).")
+                return
+
+    # 2. Extraction
+    if stream:
+        archive = os.path.join(OUTPUT_DIR, output_file) if ARCHIVE_CSV else None
+        stream_eia_to_parquet(API_KEY, start, end, append=append, archive_csv=archive)
+        return
+
+    df = get_eia_data(API_KEY, start, end)
+    
+    if not df.empty:
+        # 3. Sauvegarde CSV Brut
+        full_path = os.path.join(OUTPUT_DIR, output_file)
+        df.to_csv(full_path, index=False)
+        current().wrote(full_path)
+        print(f"\n✅ Succès ! Données sauvegardées dans : {full_path}")
+        print(f"📊 Dimension du dataset : {df.shape}")
+        print("Aperçu :")
+        print(df[['period', 'respondent', 'type', 'value']].head())
+        print(df.groupby(['respondent', 'type']).size().rename('lignes').to_string())
+    else:
+        print("⚠️ Aucune donnée récupérée.")
+
+# --- MAIN ---
+if __name__ == "__main__":
+    main()
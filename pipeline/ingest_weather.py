@@ -1,69 +1,216 @@
-import requests
-import pandas as pd
-import os
-import time
-
-# --- CONFIGURATION ---
-OUTPUT_DIR = "data_raw/weather"
-START_DATE = "2022-01-01"
-END_DATE = "2024-01-01"
-
-# Coordonnées GPS des villes stratégiques
-LOCATIONS = {
-    "new_york": {"lat": 40.71, "lon": -74.01},
-    "houston":  {"lat": 29.76, "lon": -95.36},
-    "los_angeles": {"lat": 34.05, "lon": -118.24}
-}
-
-BASE_URL = "https://archive-api.open-meteo.com/v1/archive"
-
-def get_weather_data():
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-        
-    print(f"🌤️ Démarrage de l'extraction météo ({START_DATE} au {END_DATE})...")
-
-    for city, coords in LOCATIONS.items():
-        print(f"   📍 Traitement de {city}...")
-        
-        # Paramètres de l'API Open-Meteo
-        params = {
-            "latitude": coords["lat"],
-            "longitude": coords["lon"],
-            "start_date": START_DATE,
-            "end_date": END_DATE,
-            "hourly": "temperature_2m", # On veut la température à 2m du sol
-            "timezone": "UTC"           # TRES IMPORTANT : On reste en UTC comme l'EIA
-        }
-        
-        try:
-            response = requests.get(BASE_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            # L'API renvoie une structure un peu complexe, on simplifie :
-            hourly_data = {
-                "time": data["hourly"]["time"],
-                "temperature_c": data["hourly"]["temperature_2m"]
-            }
-            
-            df = pd.DataFrame(hourly_data)
-            
-            # On ajoute une colonne pour se rappeler de quelle ville il s'agit
-            df['city'] = city
-            
-            # Sauvegarde CSV Brut
-            filename = f"{OUTPUT_DIR}/weather_{city}.csv"
-            df.to_csv(filename, index=False)
-            print(f"      ✅ Sauvegardé : {filename} ({len(df)} lignes)")
-            
-            # Petite pause
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"      ❌ Erreur pour {city}: {e}")
-
-    print("\n🏁 Extraction météo terminée.")
-
-if __name__ == "__main__":
-    get_weather_data()
\ No newline at end of file
+import numpy as np
+import pandas as pd
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from http_client import RateLimiter, cache_report, fetch_json, get_json, make_session
+from instrumentation import current, instrumented, span
+from storage import append_partitions, clear_dataset, latest_timestamp
+
+# --- CONFIGURATION ---
+OUTPUT_DIR = "data_raw/weather"
+START_DATE = "2022-01-01"
+END_DATE = "2024-01-01"
+
+# Mode incrémental : on repart du watermark de data_processed/weather
+PROCESSED_DIR = "data_processed/weather"
+INCREMENTAL_DIR = "data_raw/weather/incremental"
+ARCHIVE_LAG_DAYS = 5  # L'archive Open-Meteo est publiée avec quelques jours de retard
+
+# Coordonnées GPS des villes stratégiques
+LOCATIONS = {
+    "new_york": {"lat": 40.71, "lon": -74.01},
+    "houston":  {"lat": 29.76, "lon": -95.36},
+    "los_angeles": {"lat": 34.05, "lon": -118.24}
+}
+
+BASE_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+# Mode stations : la liste des stations vient d'un fichier de config
+# (name, lat, lon, weight[, region]), plusieurs coordonnées sont envoyées
+# dans une seule requête Open-Meteo, et les lots partent en parallèle.
+USE_STATIONS = True
+STATIONS_FILE = "config/stations.csv"
+BATCH_SIZE = 50       # Coordonnées par requête
+MAX_WORKERS = 4       # Requêtes en vol simultanément
+RATE_LIMIT = 2        # Requêtes par seconde (token bucket)
+
+# Variables horaires demandées -> nom de colonne dans le dataset traité
+HOURLY_VARIABLES = {
+    "temperature_2m": "temperature_c",
+    "relative_humidity_2m": "humidity_pct",
+    "dew_point_2m": "dew_point_c",
+    "wind_speed_10m": "wind_speed_kmh",
+    "cloud_cover": "cloud_cover_pct",
+    "shortwave_radiation": "radiation_wm2",
+}
+
+def get_weather_data(incremental=False):
+    output_dir, start_date, end_date, watermark = OUTPUT_DIR, START_DATE, END_DATE, None
+
+    if incremental:
+        watermark = latest_timestamp(PROCESSED_DIR)
+        if watermark is None:
+            print("ℹ️ Aucun historique météo traité : extraction complète.")
+        else:
+            # L'API travaille au jour : on repart du jour du watermark et on filtre ensuite
+            output_dir = INCREMENTAL_DIR
+            start_date = pd.Timestamp(watermark).strftime("%Y-%m-%d")
+            end_date = (pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=ARCHIVE_LAG_DAYS)).strftime("%Y-%m-%d")
+            # Le lot précédent ne doit pas être retraité
+            for old in os.listdir(output_dir) if os.path.exists(output_dir) else []:
+                os.remove(os.path.join(output_dir, old))
+            if start_date > end_date:
+                print(f"✅ Météo déjà à jour (watermark : {watermark}).")
+                return
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        
+    print(f"🌤️ Démarrage de l'extraction météo ({start_date} au {end_date})...")
+
+    for city, coords in LOCATIONS.items():
+        print(f"   📍 Traitement de {city}...")
+        
+        # Paramètres de l'API Open-Meteo
+        params = {
+            "latitude": coords["lat"],
+            "longitude": coords["lon"],
+            "start_date": start_date,
+            "end_date": end_date,
+            "hourly": "temperature_2m", # On veut la température à 2m du sol
+            "timezone": "UTC"           # TRES IMPORTANT : On reste en UTC comme l'EIA
+        }
+        
+        try:
+            data = fetch_json(BASE_URL, params)  # Depuis le cache disque si déjà téléchargé
+            
+            # L'API renvoie une structure un peu complexe, on simplifie :
+            hourly_data = {
+                "time": data["hourly"]["time"],
+                "temperature_c": data["hourly"]["temperature_2m"]
+            }
+            
+            df = pd.DataFrame(hourly_data)
+            
+            # On ajoute une colonne pour se rappeler de quelle ville il s'agit
+            df['city'] = city
+
+            # En incrémental, on ne garde que les heures postérieures au watermark
+            if watermark is not None:
+                df = df[pd.to_datetime(df['time']) > watermark]
+            
+            # Sauvegarde CSV Brut
+            filename = f"{output_dir}/weather_{city}.csv"
+            df.to_csv(filename, index=False)
+            print(f"      ✅ Sauvegardé : {filename} ({len(df)} lignes)")
+            
+            # Petite pause
+            time.sleep(1)
+            
+        except Exception as e:
+            print(f"      ❌ Erreur pour {city}: {e}")
+
+    print(f"\n🏁 Extraction météo terminée ({cache_report()}).")
+
+def load_stations(stations_file=STATIONS_FILE):
+    stations = pd.read_csv(stations_file)
+    if 'region' not in stations.columns:
+        stations['region'] = "US48"
+    return stations
+
+def station_frames(payload, batch):
+    """
+    Réponse Open-Meteo (une entrée par coordonnée, dans l'ordre demandé)
+    -> un DataFrame par station, déjà au format du dataset traité.
+    """
+    # Une seule coordonnée : l'API renvoie un objet au lieu d'une liste
+    if isinstance(payload, dict):
+        payload = [payload]
+
+    frames = []
+    for station, location in zip(batch.itertuples(index=False), payload):
+        hourly = location["hourly"]
+        df = pd.DataFrame({"datetime_utc": pd.to_datetime(hourly["time"])})
+        df["city"] = station.name
+        for variable, column in HOURLY_VARIABLES.items():
+            df[column] = np.asarray(hourly[variable], dtype=np.float32)
+        frames.append(df)
+    return frames
+
+def get_weather_stations(stations_file=STATIONS_FILE, incremental=False, batch_size=BATCH_SIZE,
+                         workers=MAX_WORKERS, rate=RATE_LIMIT, base_url=BASE_URL):
+    """
+    Récupère la météo de toutes les stations du fichier de config par lots
+    de coordonnées, et écrit chaque lot directement dans le dataset
+    Parquet partitionné (pas de CSV brut intermédiaire).
+    Extraction complète : les lots sont écrits dans un dossier temporaire
+    qui ne remplace l'ancien dataset qu'une fois tous les lots reçus
+    (une erreur laisse l'ancien intact).
+    """
+    stations = load_stations(stations_file)
+    start_date, end_date, watermark = START_DATE, END_DATE, None
+
+    if incremental:
+        watermark = latest_timestamp(PROCESSED_DIR)
+    target_dir = PROCESSED_DIR if watermark is not None else PROCESSED_DIR + ".tmp"
+    if watermark is None:
+        clear_dataset(target_dir)
+    else:
+        start_date = pd.Timestamp(watermark).strftime("%Y-%m-%d")
+        end_date = (pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=ARCHIVE_LAG_DAYS)).strftime("%Y-%m-%d")
+        if start_date > end_date:
+            print(f"✅ Météo déjà à jour (watermark : {watermark}).")
+            return
+
+    batches = [stations.iloc[i:i + batch_size] for i in range(0, len(stations), batch_size)]
+    print(f"🌤️ Extraction météo de {len(stations)} stations en {len(batches)} requêtes "
+          f"({start_date} au {end_date})...")
+
+    limiter = RateLimiter(rate)
+    total_rows = 0
+    with make_session(pool_size=workers) as session:
+
+        def fetch(batch):
+            params = {
+                "latitude": ",".join(f"{lat:.4f}" for lat in batch["lat"]),
+                "longitude": ",".join(f"{lon:.4f}" for lon in batch["lon"]),
+                "start_date": start_date,
+                "end_date": end_date,
+                "hourly": ",".join(HOURLY_VARIABLES),
+                "timezone": "UTC"
+            }
+            with span("ingest_weather.batch", memory=False, stations=len(batch)):
+                return get_json(session, base_url, params, limiter)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(fetch, batch): batch for batch in batches}
+            # Les écritures restent dans le thread principal, au fil des réponses
+            for future in as_completed(futures):
+                df = pd.concat(station_frames(future.result(), futures[future]), ignore_index=True)
+                if watermark is not None:
+                    df = df[df['datetime_utc'] > watermark]
+                df['year'] = df['datetime_utc'].dt.year
+                df['month'] = df['datetime_utc'].dt.month
+                append_partitions(df, target_dir)
+                total_rows += len(df)
+                current().rows(rows_out=len(df))
+                print(f"   ✅ Lot de {len(futures[future])} stations écrit ({len(df)} lignes)")
+
+    if watermark is None:
+        clear_dataset(PROCESSED_DIR)
+        if os.path.isdir(target_dir):
+            os.replace(target_dir, PROCESSED_DIR)
+    current().wrote(PROCESSED_DIR)
+    print(f"\n🏁 Extraction météo terminée : {total_rows} lignes dans {PROCESSED_DIR} ({cache_report()}).")
+
+@instrumented("ingest_weather")
+def main(incremental=False):
+    if USE_STATIONS:
+        get_weather_stations(incremental=incremental)
+    else:
+        get_weather_data(incremental=incremental)
+
+if __name__ == "__main__":
+    main()
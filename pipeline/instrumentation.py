@@ -0,0 +1,226 @@
+import functools
+import json
+import os
+import socket
+import threading
+import time
+
+try:
+    import resource  # Absent sous Windows
+except ImportError:
+    resource = None
+
+# Instrumentation des étapes : temps mur/CPU, pic mémoire, lignes et octets.
+# Activée si la variable d'environnement PIPELINE_METRICS donne le chemin
+# d'un fichier JSON lines (une ligne par étape ou sous-étape terminée).
+# Désactivée, chaque appel se réduit à un test de booléen.
+METRICS_ENV = "PIPELINE_METRICS"
+
+_config = {"path": os.environ.get(METRICS_ENV) or None}
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def enable(path):
+    """
+    Active l'instrumentation (et la transmet aux process enfants).
+    """
+    os.environ[METRICS_ENV] = path
+    _config["path"] = path
+
+
+def enabled():
+    return _config["path"] is not None
+
+
+def path_size(path):
+    """
+    Taille en octets d'un fichier ou d'un dossier (récursif), 0 si absent.
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def _read_status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _current_rss_kb():
+    return _read_status_kb("VmRSS:") or 0
+
+
+def _peak_rss_kb():
+    peak = _read_status_kb("VmHWM:")
+    if peak is not None:
+        return peak
+    # Hors Linux : pic depuis le démarrage du process (ru_maxrss)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0
+
+
+def _reset_peak():
+    """
+    Remet le pic RSS du process à la valeur courante (Linux >= 4.0) pour
+    mesurer le pic propre à une étape. Sans effet ailleurs.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+class Span:
+    """
+    Mesure d'une étape ou sous-étape (context manager). Les compteurs de
+    lignes et d'octets sont renseignés par le code mesuré.
+    """
+
+    def __init__(self, name, memory=True, **fields):
+        self.name = name
+        self.memory = memory
+        self.fields = fields
+        self.rows_in = self.rows_out = None
+        self.bytes_read = self.bytes_written = 0
+        self.peak_kb = 0
+
+    def rows(self, rows_in=None, rows_out=None):
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + int(rows_in)
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + int(rows_out)
+
+    def read(self, path=None, nbytes=0):
+        self.bytes_read += path_size(path) if path else nbytes
+
+    def wrote(self, path=None, nbytes=0):
+        self.bytes_written += path_size(path) if path else nbytes
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1].name if stack else None
+        if self.memory:
+            # Le pic atteint jusqu'ici appartient aux étapes englobantes
+            peak = _peak_rss_kb()
+            for span in stack:
+                span.peak_kb = max(span.peak_kb, peak)
+            _reset_peak()
+            self.rss_start_kb = _current_rss_kb()
+        stack.append(self)
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        _stack().pop()
+
+        record = {
+            "stage": self.name,
+            "parent": self.parent,
+            "status": "error" if exc_type else "ok",
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_per_s": round((self.rows_out or self.rows_in or 0) / wall, 1) if wall > 0 else None,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+        if self.memory:
+            self.peak_kb = max(self.peak_kb, _peak_rss_kb())
+            record["peak_rss_mb"] = round(self.peak_kb / 1024, 1)
+            record["rss_delta_mb"] = round((_current_rss_kb() - self.rss_start_kb) / 1024, 1)
+        record.update(self.fields)
+        record.update({"ts": time.time(), "pid": os.getpid(), "host": socket.gethostname()})
+        _emit(record)
+        return False
+
+
+class _NullSpan:
+    """
+    Span désactivé : toutes les opérations sont sans effet.
+    """
+
+    def rows(self, rows_in=None, rows_out=None):
+        pass
+
+    def read(self, path=None, nbytes=0):
+        pass
+
+    def wrote(self, path=None, nbytes=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(name, memory=True, **fields):
+    """
+    `with span("merge.pivot") as s: ...` ; memory=False pour les sous-étapes
+    exécutées dans des threads (le pic RSS est propre au process).
+    """
+    if _config["path"] is None:
+        return NULL_SPAN
+    return Span(name, memory=memory, **fields)
+
+
+def current():
+    """
+    Span ouvert le plus interne du thread courant (pour y ajouter lignes
+    et octets sans le passer en paramètre).
+    """
+    if _config["path"] is None:
+        return NULL_SPAN
+    stack = _stack()
+    return stack[-1] if stack else NULL_SPAN
+
+
+def instrumented(name):
+    """
+    Décorateur : mesure chaque appel de la fonction comme une étape.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _config["path"] is None:
+                return func(*args, **kwargs)
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _emit(record):
+    line = json.dumps(record, default=str) + "\n"
+    path = _config["path"]
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Ajout en une seule écriture : sûr entre threads et entre process
+    with _write_lock:
+        with open(path, "a") as f:
+            f.write(line)
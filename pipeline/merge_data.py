@@ -1,64 +1,213 @@
-import pandas as pd
-
-
-# --- CONFIGURATION ---
-LOAD_DIR = "data_processed/load"
-WEATHER_DIR = "data_processed/weather"
-OUTPUT_FILE = "data_processed/energy_dataset_master.parquet"
-
-def merge_datasets():
-    print("🔗 Démarrage de la fusion (Merge)...")
-    
-    # 1. Chargement des données Load (Parquet lit tous les dossiers d'un coup !)
-    print("   Chargement Consommation...")
-    df_load = pd.read_parquet(LOAD_DIR)
-    # On s'assure qu'on n'a pas de doublons temporels
-    df_load = df_load.drop_duplicates(subset=['datetime_utc'])
-    
-    # 2. Chargement des données Météo
-    print("   Chargement Météo...")
-    df_weather = pd.read_parquet(WEATHER_DIR)
-    
-    # 3. PIVOT de la météo (Transformation cruciale)
-    # On passe de lignes (City) à des colonnes (temp_new_york, temp_houston...)
-    print("   Pivot de la météo...")
-    df_weather_pivot = df_weather.pivot(
-        index='datetime_utc', 
-        columns='city', 
-        values='temperature_c'
-    )
-    
-    # Renommer les colonnes pour faire propre (ex: new_york -> temp_new_york)
-    df_weather_pivot.columns = [f"temp_{col}" for col in df_weather_pivot.columns]
-    df_weather_pivot = df_weather_pivot.reset_index()
-    
-    # 4. MERGE (Jointure Gauche)
-    # On garde toutes les dates de conso (Left), et on ajoute la météo en face
-    print("   Assemblage Load + Météo...")
-    df_master = pd.merge(
-        df_load, 
-        df_weather_pivot, 
-        on='datetime_utc', 
-        how='left'
-    )
-    
-    # 5. Nettoyage final
-    # Tri par date
-    df_master = df_master.sort_values('datetime_utc')
-    
-    # Vérification des trous (Nulls)
-    missing_weather = df_master['temp_new_york'].isnull().sum()
-    if missing_weather > 0:
-        print(f"⚠️ Attention : Il manque la météo pour {missing_weather} heures.")
-        # Interpolation linéaire (bouche les petits trous par la moyenne des voisins)
-        df_master = df_master.interpolate(method='linear')
-        
-    print(f"📊 Dataset Final : {df_master.shape} (Lignes, Colonnes)")
-    print(df_master.head())
-    
-    # 6. Sauvegarde Finale (Fichier unique pour le ML)
-    df_master.to_parquet(OUTPUT_FILE, index=False)
-    print(f"✅ Fichier MAÎTRE sauvegardé : {OUTPUT_FILE}")
-
-if __name__ == "__main__":
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import os
+
+from hourly_grid import VALID_COLUMN, summarize_report, to_hourly_grid
+from instrumentation import current, instrumented, span
+from process_load_data import LOAD_PARTITION_SCHEMA
+from storage import dataset_columns, read_dataset
+from weather_index import compute_weather_indices, station_columns
+
+
+# --- CONFIGURATION ---
+LOAD_DIR = "data_processed/load"
+WEATHER_DIR = "data_processed/weather"
+OUTPUT_FILE = "data_processed/energy_dataset_master.parquet"
+
+# "index" : indices météo pondérés (quelques colonnes float32, quel que soit
+#           le nombre de stations)
+# "pivot" : une colonne temp_<ville> par station (ancien comportement)
+WEATHER_MODE = "index"
+# Chaque respondent reçoit les indices de la région de même nom dans
+# config/stations.csv, à défaut ceux de LOAD_REGION
+LOAD_REGION = "US48"
+
+# Jointure as-of : une mesure météo est rattachée à l'heure de conso la plus
+# proche si l'écart est inférieur à la tolérance
+MERGE_TOLERANCE = pd.Timedelta(minutes=30)
+# Seuls les trous météo d'au plus MAX_GAP_HOURS lignes sont interpolés ;
+# les trous plus longs restent vides (pas de météo inventée sur des jours)
+MAX_GAP_HOURS = 6
+GAP_REPORT_FILE = "data_processed/weather_gap_report.csv"
+
+# Mode incrémental : on reconstruit les derniers jours du fichier maître
+# (la météo récente a pu arriver après la conso) et tout ce qui suit
+REBUILD_DAYS = 7
+
+def fill_short_gaps(df, columns, max_gap=MAX_GAP_HOURS, time_col='datetime_utc', group_col=None):
+    """
+    Interpolation linéaire (dans le temps) des seules colonnes `columns`,
+    uniquement sur les trous intérieurs d'au plus `max_gap` lignes.
+    Avec group_col, df est trié par (groupe, temps) et un trou ne s'étend
+    jamais au-delà de son groupe : toutes les séries en un seul passage.
+    Renvoie le DataFrame et le rapport des trous bouchés.
+    """
+    t = df[time_col].to_numpy().astype('datetime64[us]').astype(np.int64)
+    groups = np.zeros(len(df), dtype=np.int64)
+    if group_col is not None:
+        groups = pd.factorize(df[group_col], sort=True)[0].astype(np.int64)
+        # Axe du temps décalé par groupe : croissant sur toute la table,
+        # l'interpolation ne mélange jamais deux groupes
+        t = t + groups * (int(t.max() - t.min()) + 1) if len(t) else t
+    report = []
+    for col in columns:
+        y = df[col].to_numpy(dtype=np.float64, copy=True)
+        missing = np.isnan(y)
+        if not missing.any() or missing.all():
+            continue
+
+        # Repérage des séquences de NaN : début (inclus) et fin (exclue)
+        edges = np.diff(np.concatenate(([0], missing.astype(np.int8), [0])))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        ok = (ends - starts <= max_gap) & (starts > 0) & (ends < len(y))
+        # Bordés des deux côtés par une valeur du même groupe
+        ok[ok] = (groups[starts[ok] - 1] == groups[ends[ok]]) & (groups[starts[ok]] == groups[ends[ok] - 1])
+        if not ok.any():
+            continue
+
+        # Masque des positions à remplir, sans boucle sur les trous
+        delta = np.zeros(len(y) + 1, dtype=np.int64)
+        np.add.at(delta, starts[ok], 1)
+        np.add.at(delta, ends[ok], -1)
+        fill = np.cumsum(delta[:-1]) > 0
+
+        y[fill] = np.interp(t[fill], t[~missing], y[~missing])
+        df[col] = y.astype(df[col].dtype)
+        report.append(pd.DataFrame({
+            **({group_col: df[group_col].to_numpy()[starts[ok]]} if group_col else {}),
+            'column': col,
+            'gap_start': df[time_col].to_numpy()[starts[ok]],
+            'gap_end': df[time_col].to_numpy()[ends[ok] - 1],
+            'hours': ends[ok] - starts[ok],
+        }))
+
+    report = pd.concat(report, ignore_index=True) if report else pd.DataFrame(
+        columns=([group_col] if group_col else []) + ['column', 'gap_start', 'gap_end', 'hours'])
+    return df, report
+
+def read_master(respondent=LOAD_REGION, start=None, end=None, columns=None, path=OUTPUT_FILE):
+    """
+    Table maître d'un seul respondent (None : tous), triée par date.
+    Le filtre est poussé au scan Parquet.
+    """
+    filter = ds.field('respondent') == respondent if respondent is not None else None
+    df = read_dataset(path, start, end, columns=columns, filter=filter)
+    return df.sort_values(['respondent', 'datetime_utc'] if 'respondent' in df.columns else 'datetime_utc',
+                          ignore_index=True)
+
+@instrumented("merge")
+def merge_datasets(start=None, end=None, incremental=False):
+    """
+    Construit la table maître. Avec start/end, seule la plage [start, end)
+    est relue (partitions hors plage ignorées) et remplacée dans le fichier
+    maître existant.
+    """
+    print("🔗 Démarrage de la fusion (Merge)...")
+    if incremental and start is None and os.path.exists(OUTPUT_FILE):
+        last = read_dataset(OUTPUT_FILE, columns=['datetime_utc'])['datetime_utc'].max()
+        start = (last - pd.Timedelta(days=REBUILD_DAYS)).floor('D')
+        print(f"   Mode incrémental : reconstruction à partir de {start}")
+    
+    # 1. Chargement des données Load (seulement les partitions de la plage)
+    print("   Chargement Consommation...")
+    with span("merge.read_load") as s:
+        df_load = read_dataset(LOAD_DIR, start, end, partition_schema=LOAD_PARTITION_SCHEMA)
+        s.rows(rows_out=len(df_load))
+    # On s'assure qu'on n'a pas de doublons temporels : une ligne par
+    # (respondent, heure), les types écrits séparément (streaming) sont réunis
+    df_load = df_load.groupby(['respondent', 'datetime_utc'], sort=True).first().reset_index()
+    # Grille horaire contiguë par respondent (is_valid = False sur les heures
+    # sans demande) : la table maître a exactement une ligne par heure
+    df_load = df_load.drop(columns=[c for c in ['year', 'month', VALID_COLUMN] if c in df_load.columns])
+    df_load, grid_report = to_hourly_grid(df_load, value_columns=['demand_mwh'])
+    df_load['year'] = df_load['datetime_utc'].dt.year.astype('int32')
+    df_load['month'] = df_load['datetime_utc'].dt.month.astype('int32')
+    if not grid_report.empty:
+        print(f"⚠️ Grille horaire : {summarize_report(grid_report)}")
+    print(f"   {df_load['respondent'].nunique()} respondents : {sorted(df_load['respondent'].unique())[:10]}")
+    
+    # 2. Chargement des données Météo (seulement les colonnes utiles)
+    print("   Chargement Météo...")
+    weather_cols = ['datetime_utc', 'city', 'temperature_c']
+    if WEATHER_MODE == "index" and 'humidity_pct' in dataset_columns(WEATHER_DIR):
+        weather_cols.append('humidity_pct')
+    with span("merge.read_weather") as s:
+        df_weather = read_dataset(WEATHER_DIR, start, end, columns=weather_cols)
+        s.rows(rows_out=len(df_weather))
+    current().rows(rows_in=len(df_load) + len(df_weather))
+    
+    by = None
+    with span("merge.weather", mode=WEATHER_MODE) as s:
+        if WEATHER_MODE == "index":
+            # 3. AGRÉGATION de la météo : indices pondérés par la population
+            # Un produit matrice (heures x stations) . poids (stations x régions)
+            print("   Calcul des indices météo pondérés...")
+            df_weather_pivot = compute_weather_indices(df_weather)
+            # Région météo de chaque respondent (la sienne si configurée, sinon LOAD_REGION)
+            regions = set(df_weather_pivot['region'])
+            df_load['region'] = df_load['respondent'].where(df_load['respondent'].isin(regions), LOAD_REGION)
+            df_weather_pivot = df_weather_pivot[df_weather_pivot['region'].isin(set(df_load['region']))]
+            by = 'region'
+        else:
+            # 3. Une colonne par ville (temp_new_york, temp_houston...)
+            # construite directement depuis la matrice dense, sans pivot pandas
+            print("   Colonnes météo par ville...")
+            df_weather_pivot = station_columns(df_weather)
+        s.rows(rows_in=len(df_weather), rows_out=len(df_weather_pivot))
+    weather_cols = [c for c in df_weather_pivot.columns if c not in ('datetime_utc', 'region')]
+    # merge_asof exige des clés de même résolution (ns/us selon l'écrivain Parquet)
+    df_weather_pivot['datetime_utc'] = df_weather_pivot['datetime_utc'].astype(df_load['datetime_utc'].dtype)
+    
+    # 4. MERGE as-of (Jointure Gauche triée)
+    # On garde toutes les dates de conso (Left), et on ajoute la météo la plus
+    # proche dans la tolérance ; tous les respondents en une seule jointure
+    # (by=region), les deux côtés sont triés une seule fois
+    print("   Assemblage Load + Météo...")
+    with span("merge.join") as s:
+        df_master = pd.merge_asof(
+            df_load.sort_values('datetime_utc'),
+            df_weather_pivot.sort_values('datetime_utc'),
+            on='datetime_utc',
+            by=by,
+            direction='nearest',
+            tolerance=MERGE_TOLERANCE
+        )
+        df_master = df_master.drop(columns=[c for c in ['region'] if c in df_master.columns])
+        df_master = df_master.sort_values(['respondent', 'datetime_utc'], ignore_index=True)
+        s.rows(rows_in=len(df_load), rows_out=len(df_master))
+    
+    # 5. Nettoyage final : trous météo
+    missing_weather = df_master[weather_cols].isnull().any(axis=1).sum()
+    if missing_weather > 0:
+        print(f"⚠️ Attention : Il manque la météo pour {missing_weather} heures.")
+        # Interpolation des colonnes météo seulement, et seulement sur les petits trous
+        with span("merge.fill_gaps") as s:
+            df_master, gaps = fill_short_gaps(df_master, weather_cols, group_col='respondent')
+            s.rows(rows_in=len(df_master), rows_out=int(gaps['hours'].sum()))
+        gaps.to_csv(GAP_REPORT_FILE, index=False)
+        print(f"   {len(gaps)} trous bouchés ({gaps['hours'].sum()} valeurs), rapport : {GAP_REPORT_FILE}")
+        remaining = df_master[weather_cols].isnull().any(axis=1).sum()
+        if remaining > 0:
+            print(f"⚠️ {remaining} heures restent sans météo (trous > {MAX_GAP_HOURS} h).")
+        
+    # Reconstruction partielle : on garde le reste du fichier maître
+    if (start is not None or end is not None) and os.path.exists(OUTPUT_FILE):
+        kept = [df_master]
+        if start is not None:
+            kept.insert(0, read_dataset(OUTPUT_FILE, end=start))
+        if end is not None:
+            kept.append(read_dataset(OUTPUT_FILE, start=end))
+        df_master = pd.concat(kept, ignore_index=True).sort_values(['respondent', 'datetime_utc'])
+
+    print(f"📊 Dataset Final : {df_master.shape} (Lignes, Colonnes)")
+    print(df_master.head())
+    
+    # 6. Sauvegarde Finale (Fichier unique pour le ML)
+    df_master.to_parquet(OUTPUT_FILE, index=False)
+    current().rows(rows_out=len(df_master))
+    current().wrote(OUTPUT_FILE)
+    print(f"✅ Fichier MAÎTRE sauvegardé : {OUTPUT_FILE}")
+
+if __name__ == "__main__":
     merge_datasets()
\ No newline at end of file
@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# Cube de métriques pré-agrégées des prédictions : par jour et par mois,
+# les sommes nécessaires à MAE/MAPE/biais/RMSE, min/max, effectifs et un
+# histogramme des erreurs sur des classes fixes. Une plage de dates se
+# résume en additionnant des lignes (mois complets + jours en bordure)
+# au lieu de relire toutes les heures.
+
+# --- CONFIGURATION ---
+CUBE_DIR = "data_processed/metrics_cube"
+META_FILE = "cube.json"
+ERROR_BINS = 50
+ERROR_QUANTILE = 0.999  # Bornes de l'histogramme ; les erreurs au-delà vont dans les classes extrêmes
+
+SUM_COLUMNS = ['n', 'sum_actual', 'sum_abs_error', 'sum_ape', 'sum_error', 'sum_sq_error']
+
+
+def error_edges(errors, bins=ERROR_BINS, quantile=ERROR_QUANTILE):
+    """
+    Classes symétriques autour de 0, fixées une fois pour tout le cube
+    (les histogrammes de jours différents s'additionnent).
+    """
+    errors = np.asarray(errors, dtype=np.float64)
+    errors = errors[~np.isnan(errors)]
+    bound = np.quantile(np.abs(errors), quantile) if len(errors) else 1.0
+    return np.linspace(-bound, bound, bins + 1) if bound > 0 else np.linspace(-1.0, 1.0, bins + 1)
+
+
+def _aggregate(df, keys, edges):
+    error = df['demand_mwh'] - df['prediction']
+    frame = pd.DataFrame({
+        **{k: v for k, v in keys.items()},
+        'n': 1,
+        'sum_actual': df['demand_mwh'],
+        'max_actual': df['demand_mwh'],
+        'min_actual': df['demand_mwh'],
+        'sum_abs_error': error.abs(),
+        'sum_ape': (error / df['demand_mwh']).abs(),
+        'sum_error': error,
+        'sum_sq_error': error ** 2,
+        'bin': np.clip(np.searchsorted(edges, error.to_numpy(), side='right') - 1, 0, len(edges) - 2),
+    })
+    names = list(keys)
+    grouped = frame.groupby(names, sort=True)
+    stats = grouped.agg(n=('n', 'sum'), sum_actual=('sum_actual', 'sum'), max_actual=('max_actual', 'max'),
+                        min_actual=('min_actual', 'min'), sum_abs_error=('sum_abs_error', 'sum'),
+                        sum_ape=('sum_ape', 'sum'), sum_error=('sum_error', 'sum'),
+                        sum_sq_error=('sum_sq_error', 'sum'))
+    # Histogramme en colonnes larges : une colonne d'effectifs par classe
+    hist = frame.groupby(names + ['bin']).size().unstack('bin', fill_value=0)
+    hist = hist.reindex(columns=range(len(edges) - 1), fill_value=0).astype(np.int32)
+    hist.columns = [f"bin_{b}" for b in hist.columns]
+    return stats.join(hist).reset_index()
+
+
+def build_cube(df, edges=None):
+    """
+    df : prédictions horaires (datetime_utc, demand_mwh, prediction).
+    Renvoie les tables daily, monthly, hourly_profile (mois x heure) et
+    les bornes des classes d'erreur.
+    """
+    df = df.dropna(subset=['demand_mwh', 'prediction'])
+    edges = error_edges(df['demand_mwh'] - df['prediction']) if edges is None else np.asarray(edges)
+    times = df['datetime_utc'].dt
+    return {
+        'daily': _aggregate(df, {'date': times.floor('D')}, edges),
+        'monthly': _aggregate(df, {'month': times.to_period('M').dt.to_timestamp()}, edges),
+        'hourly_profile': _aggregate(df, {'month': times.to_period('M').dt.to_timestamp(),
+                                          'hour': times.hour}, edges),
+        'edges': edges,
+        'start': df['datetime_utc'].min(),
+        'end': df['datetime_utc'].max(),
+    }
+
+
+def save_cube(cube, cube_dir=CUBE_DIR):
+    tmp_dir = cube_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name in ('daily', 'monthly', 'hourly_profile'):
+        cube[name].to_parquet(os.path.join(tmp_dir, f"{name}.parquet"), index=False)
+    with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+        json.dump({'edges': list(map(float, cube['edges'])), 'start': str(cube['start']),
+                   'end': str(cube['end'])}, f, indent=1)
+    shutil.rmtree(cube_dir, ignore_errors=True)
+    os.replace(tmp_dir, cube_dir)
+
+
+def load_cube(cube_dir=CUBE_DIR):
+    with open(os.path.join(cube_dir, META_FILE)) as f:
+        meta = json.load(f)
+    cube = {name: pd.read_parquet(os.path.join(cube_dir, f"{name}.parquet"))
+            for name in ('daily', 'monthly', 'hourly_profile')}
+    cube.update(edges=np.array(meta['edges']), start=pd.Timestamp(meta['start']), end=pd.Timestamp(meta['end']))
+    return cube
+
+
+def covers(cube, start, end):
+    """
+    Le cube couvre-t-il les jours [start, end] ? Sinon, passer par les données brutes.
+    """
+    return cube['start'].floor('D') <= pd.Timestamp(start) and pd.Timestamp(end) <= cube['end'].floor('D')
+
+
+def _full_months(start, end):
+    """
+    Jours [start, end] -> (start, end, premier mois complet, fin exclue du
+    dernier mois complet) ; pas de mois complet si first_full >= last_full.
+    """
+    start, end = pd.Timestamp(start).floor('D'), pd.Timestamp(end).floor('D')
+    first_full = start if start.day == 1 else (start + pd.offsets.MonthBegin(1))
+    last_full = (end + pd.Timedelta(days=1)) - pd.offsets.MonthBegin(1) if (end + pd.Timedelta(days=1)).day != 1 \
+        else end + pd.Timedelta(days=1)
+    return start, end, first_full, last_full
+
+
+def range_rows(cube, start, end):
+    """
+    Lignes à additionner pour les jours [start, end] : les mois entièrement
+    inclus depuis la table mensuelle, les jours en bordure depuis la
+    table journalière.
+    """
+    start, end, first_full, last_full = _full_months(start, end)
+    daily, monthly = cube['daily'], cube['monthly']
+    if first_full >= last_full:
+        return daily[(daily['date'] >= start) & (daily['date'] <= end)]
+    months = monthly[(monthly['month'] >= first_full) & (monthly['month'] < last_full)]
+    edges = daily[((daily['date'] >= start) & (daily['date'] < first_full))
+                  | ((daily['date'] >= last_full) & (daily['date'] <= end))]
+    return pd.concat([months, edges], ignore_index=True)
+
+
+def summarize(rows, bins):
+    """
+    Métriques d'un ensemble de lignes du cube (sommes -> moyennes).
+    """
+    n = rows['n'].sum()
+    if n == 0:
+        return {'n': 0, 'mean_actual': np.nan, 'max_actual': np.nan, 'min_actual': np.nan,
+                'mae': np.nan, 'mape': np.nan, 'bias': np.nan, 'rmse': np.nan, 'hist': np.zeros(bins, int)}
+    return {
+        'n': int(n),
+        'mean_actual': rows['sum_actual'].sum() / n,
+        'max_actual': rows['max_actual'].max(),
+        'min_actual': rows['min_actual'].min(),
+        'mae': rows['sum_abs_error'].sum() / n,
+        'mape': rows['sum_ape'].sum() / n * 100,
+        'bias': rows['sum_error'].sum() / n,
+        'rmse': np.sqrt(rows['sum_sq_error'].sum() / n),
+        'hist': rows[[f"bin_{b}" for b in range(bins)]].sum().to_numpy(),
+    }
+
+
+def range_summary(cube, start, end):
+    return summarize(range_rows(cube, start, end), len(cube['edges']) - 1)
+
+
+def hourly_rows(cube, start, end, hours):
+    """
+    Lignes du profil horaire (mois x heure) pour les jours [start, end] :
+    mois entièrement inclus depuis la table hourly_profile, jours en
+    bordure agrégés depuis `hours` (prédictions horaires déjà lues).
+    """
+    start, end, first_full, last_full = _full_months(start, end)
+    profile = cube['hourly_profile']
+    if first_full >= last_full:
+        months, border = profile.iloc[:0], (start, end + pd.Timedelta(days=1), None, None)
+    else:
+        months = profile[(profile['month'] >= first_full) & (profile['month'] < last_full)]
+        border = (start, first_full, last_full, end + pd.Timedelta(days=1))
+    t = hours['datetime_utc']
+    in_border = (t >= border[0]) & (t < border[1])
+    if border[2] is not None:
+        in_border |= (t >= border[2]) & (t < border[3])
+    edges = build_cube(hours[in_border], cube['edges'])['hourly_profile'] if in_border.any() else profile.iloc[:0]
+    return pd.concat([months, edges], ignore_index=True)
+
+
+def hourly_summary(rows):
+    """
+    MAE, MAPE et biais par heure de la journée (0-23).
+    """
+    sums = rows.groupby('hour')[SUM_COLUMNS].sum().reindex(range(24), fill_value=0)
+    n = sums['n'].replace(0, np.nan)
+    return pd.DataFrame({
+        'n': sums['n'].astype(int),
+        'mae': sums['sum_abs_error'] / n,
+        'mape': sums['sum_ape'] / n * 100,
+        'bias': sums['sum_error'] / n,
+    }).rename_axis('hour')
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+# Registre des modèles : un dossier par version, avec le modèle au format
+# binaire natif d'XGBoost (model.ubj, indépendant de la version de Python
+# et de sklearn) et ses métadonnées (ordre et types des features, période
+# d'entraînement, métriques, empreinte des données).
+#
+#   models/registry/<version>/model.ubj
+#   models/registry/<version>/metadata.json
+#   models/registry/LATEST          <- nom de la dernière version
+
+# --- CONFIGURATION ---
+REGISTRY_DIR = "models/registry"
+LATEST_FILE = "LATEST"
+MODEL_FILE = "model.ubj"
+METADATA_FILE = "metadata.json"
+
+
+def data_fingerprint(df):
+    """
+    Empreinte SHA-256 du contenu d'un DataFrame (valeurs et noms de colonnes).
+    """
+    return update_fingerprint(None, df).hexdigest()
+
+
+def update_fingerprint(digest, df):
+    """
+    Empreinte incrémentale, lot par lot (lecture hors mémoire) : les noms
+    de colonnes du premier lot, puis les valeurs de chaque lot.
+    """
+    if digest is None:
+        digest = hashlib.sha256(",".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest
+
+
+def register_model(booster, X_train, registry_dir=REGISTRY_DIR, **info):
+    """
+    Enregistre une nouvelle version : le booster (déjà tronqué à la
+    meilleure itération) et les métadonnées. Le schéma des features est
+    pris sur X_train ; `info` (période, métriques, paramètres...) est
+    ajouté tel quel. Renvoie le nom de la version.
+    """
+    import xgboost as xgb
+
+    created = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    fingerprint = info.get('data_fingerprint') or data_fingerprint(X_train)
+    version = f"{created}-{fingerprint[:8]}"
+    metadata = {
+        'version': version,
+        'created_at': created,
+        'xgboost_version': xgb.__version__,
+        'features': list(X_train.columns),
+        'dtypes': {c: str(t) for c, t in X_train.dtypes.items()},
+        'data_fingerprint': fingerprint,
+        **info,
+    }
+
+    # Écriture dans un dossier temporaire puis renommage : une version
+    # visible est toujours complète
+    final_dir = os.path.join(registry_dir, version)
+    tmp_dir = final_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    booster.save_model(os.path.join(tmp_dir, MODEL_FILE))
+    with open(os.path.join(tmp_dir, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=1, default=str)
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(tmp_dir, final_dir)
+
+    latest_tmp = os.path.join(registry_dir, LATEST_FILE + ".tmp")
+    with open(latest_tmp, "w") as f:
+        f.write(version)
+    os.replace(latest_tmp, os.path.join(registry_dir, LATEST_FILE))
+    return version
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(d for d in os.listdir(registry_dir)
+                  if os.path.isfile(os.path.join(registry_dir, d, METADATA_FILE)))
+
+
+def latest_version(registry_dir=REGISTRY_DIR):
+    try:
+        with open(os.path.join(registry_dir, LATEST_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Aucun modèle enregistré dans {registry_dir} (lancer train_model.py)") from None
+
+
+def read_metadata(version=None, registry_dir=REGISTRY_DIR):
+    """
+    Métadonnées seules, sans charger XGBoost (pour le dashboard).
+    """
+    version = version or latest_version(registry_dir)
+    with open(os.path.join(registry_dir, version, METADATA_FILE)) as f:
+        return json.load(f)
+
+
+def load_model(version=None, registry_dir=REGISTRY_DIR, nthread=None):
+    """
+    Charge un Booster (dernière version par défaut) et ses métadonnées.
+    Pas de désérialisation pickle ni d'estimateur sklearn : seul le
+    modèle natif est lu.
+    """
+    import xgboost as xgb
+
+    metadata = read_metadata(version, registry_dir)
+    booster = xgb.Booster(model_file=os.path.join(registry_dir, metadata['version'], MODEL_FILE))
+    if nthread is not None:
+        booster.set_param({'nthread': nthread})
+    if booster.feature_names and list(booster.feature_names) != metadata['features']:
+        raise ValueError(f"Modèle {metadata['version']} : ordre des features différent des métadonnées")
+    return booster, metadata
+
+
+def validate_schema(metadata, columns, dtypes=None):
+    """
+    Vérifie qu'une table fournit toutes les features du modèle, avec des
+    types numériques. Lève ValueError en listant les écarts.
+    """
+    missing = [c for c in metadata['features'] if c not in set(columns)]
+    if missing:
+        raise ValueError(f"Modèle {metadata['version']} : features manquantes {missing}")
+    if dtypes is not None:
+        invalid = [c for c in metadata['features'] if not np.issubdtype(np.dtype(dtypes[c]), np.number)]
+        if invalid:
+            raise ValueError(f"Modèle {metadata['version']} : features non numériques {invalid}")
+
+
+def feature_matrix(metadata, df):
+    """
+    Matrice float32 dans l'ordre des features du modèle, quel que soit
+    l'ordre des colonnes de `df`.
+    """
+    validate_schema(metadata, df.columns, df.dtypes)
+    return df[metadata['features']].to_numpy(dtype=np.float32)
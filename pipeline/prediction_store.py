@@ -0,0 +1,91 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from storage import append_partitions, read_dataset, time_bounds
+
+# Stockage des prédictions : un dataset Parquet partitionné
+# model_version=/year=/month= (mois de l'heure prédite), en ajout seul.
+# Chaque ligne ne garde que les clés et les valeurs :
+#   issue_time, target_time, horizon_h, run, actual, prediction
+# Comparer des versions ou des backtests = un scan filtré sur les
+# partitions, sans relire les autres versions. Une prédiction déjà
+# stockée (même version, run, issue_time, target_time) n'est pas réécrite.
+
+# --- CONFIGURATION ---
+STORE_DIR = "data_processed/prediction_store"
+STORE_PARTITION_SCHEMA = pa.schema([("model_version", pa.string()), ("year", pa.int32()), ("month", pa.int32())])
+VERSION_RE = re.compile(r"^model_version=(.+)$")
+KEY_COLUMNS = ['run', 'issue_time', 'target_time']  # Unicité d'une prédiction dans une version
+
+
+def write_predictions(df, model_version, run, store_dir=STORE_DIR):
+    """
+    Ajoute des prédictions (target_time, prediction, actual, et
+    optionnellement issue_time/horizon_h) sous la version donnée.
+    Sans issue_time, la prévision est supposée émise une heure avant.
+    Les lignes déjà présentes dans le store sont ignorées (la première
+    écriture gagne) : seules les clés des mois touchés sont relues.
+    Renvoie le nombre de lignes ajoutées.
+    """
+    target = pd.to_datetime(df['target_time'])
+    issue = pd.to_datetime(df['issue_time']) if 'issue_time' in df else target - pd.Timedelta(hours=1)
+    rows = pd.DataFrame({
+        'issue_time': issue.astype('datetime64[us]').to_numpy(),
+        'target_time': target.astype('datetime64[us]').to_numpy(),
+        'horizon_h': ((target - issue) // pd.Timedelta(hours=1)).astype(np.int16).to_numpy(),
+        'run': run,
+        'actual': df['actual'].to_numpy(dtype=np.float32),
+        'prediction': df['prediction'].to_numpy(dtype=np.float32),
+        'year': target.dt.year.to_numpy(),
+        'month': target.dt.month.to_numpy(),
+    }).sort_values(['target_time', 'issue_time'])
+    rows = rows.drop_duplicates(subset=KEY_COLUMNS, keep='last')
+
+    version_dir = os.path.join(store_dir, f"model_version={model_version}")
+    if os.path.isdir(version_dir) and len(rows):
+        stored = read_dataset(version_dir, start=target.min(), end=target.max() + pd.Timedelta(hours=1),
+                              columns=KEY_COLUMNS, time_column='target_time')
+        known = rows[KEY_COLUMNS].merge(stored, how='left', indicator=True)['_merge'].to_numpy() == 'both'
+        rows = rows[~known]
+    if len(rows):
+        append_partitions(rows, version_dir)
+    return len(rows)
+
+
+def list_versions(store_dir=STORE_DIR):
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(m.group(1) for m in map(VERSION_RE.match, os.listdir(store_dir)) if m)
+
+
+def _filter(versions=None, run=None):
+    expr = None
+    if versions is not None:
+        expr = ds.field('model_version').isin(list(versions))
+    if run is not None:
+        cond = ds.field('run').isin([run] if isinstance(run, str) else list(run))
+        expr = cond if expr is None else expr & cond
+    return expr
+
+
+def read_predictions(versions=None, start=None, end=None, columns=None, run=None, store_dir=STORE_DIR):
+    """
+    Prédictions des versions demandées sur [start, end) (heure prédite).
+    Les versions, années et mois non demandés ne sont jamais ouverts.
+    run : "test", "backtest", "horizon" (ou une liste) ; None = tous.
+    """
+    return read_dataset(store_dir, start=start, end=end, columns=columns, time_column='target_time',
+                        filter=_filter(versions, run), partition_schema=STORE_PARTITION_SCHEMA)
+
+
+def prediction_bounds(version, run=None, store_dir=STORE_DIR):
+    """
+    Première et dernière heure prédite d'une version (seule target_time est décodée).
+    """
+    return time_bounds(store_dir, time_column='target_time', filter=_filter([version], run),
+                       partition_schema=STORE_PARTITION_SCHEMA)
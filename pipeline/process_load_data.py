@@ -1,67 +1,152 @@
-import pandas as pd
-import os
-
-# --- CONFIGURATION ---
-INPUT_FILE = "data_raw/us_load_2022_2023.csv"
-OUTPUT_DIR = "data_processed/load"  # On sépare par "sujet" (ici load)
-
-def process_data():
-    print("⚙️ Début du nettoyage...")
-    
-    # 1. Lecture du CSV Brut
-    # dtype={'value': float} force la colonne value à être numérique dès la lecture
-    try:
-        df = pd.read_csv(INPUT_FILE)
-    except FileNotFoundError:
-        print(f"❌ Erreur : Le fichier {INPUT_FILE} n'existe pas.")
-        return
-
-    print(f"   Lecture de {len(df)} lignes.")
-
-    # 2. Conversion des Types (Typing)
-    # On transforme la string "2022-01-01T00" en vrai objet datetime
-    df['period'] = pd.to_datetime(df['period'])
-    
-    # 3. Renommage et Sélection
-    # On garde uniquement ce qui nous intéresse et on donne des noms clairs
-    df = df.rename(columns={
-        'period': 'datetime_utc',
-        'value': 'demand_mwh'
-    })
-    
-    # On sélectionne juste les colonnes utiles (on vire respondent-name, etc.)
-    keep_cols = ['datetime_utc', 'demand_mwh']
-    df = df[keep_cols]
-
-    # 4. Gestion des valeurs manquantes
-    # Si l'API a envoyé des trous, on peut décider de les supprimer ou de les remplir
-    missing = df['demand_mwh'].isnull().sum()
-    if missing > 0:
-        print(f"⚠️ Attention : {missing} valeurs manquantes détectées.")
-        # Pour l'instant, on supprime les lignes vides (on verra l'imputation plus tard)
-        df = df.dropna(subset=['demand_mwh'])
-
-    # 5. Création des colonnes de Partitionnement
-    # Pour ranger les fichiers comme dans une bibliothèque
-    df['year'] = df['datetime_utc'].dt.year
-    df['month'] = df['datetime_utc'].dt.month
-
-    # 6. Sauvegarde en Parquet Partitionné
-    # Cela va créer une structure de dossiers : data_processed/load/year=2022/month=1/
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-
-    print(f"💾 Sauvegarde en Parquet dans {OUTPUT_DIR}...")
-    
-    df.to_parquet(
-        OUTPUT_DIR,
-        engine='pyarrow',
-        compression='snappy',  # Compresse le fichier pour gagner de la place
-        partition_cols=['year', 'month'], # La magie opère ici
-        index=False
-    )
-    
-    print("✅ Terminé ! Structure de fichiers créée.")
-
-if __name__ == "__main__":
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import os
+
+from hourly_grid import VALID_COLUMN, classify_dst, point_report, summarize_report, to_hourly_grid
+from instrumentation import current, instrumented
+from storage import PARTITION_SCHEMA, clear_dataset, upsert_partitions
+
+# --- CONFIGURATION ---
+INPUT_FILE = "data_raw/us_load_2022_2023.csv"
+INCREMENTAL_INPUT_FILE = "data_raw/us_load_incremental.csv"
+OUTPUT_DIR = "data_processed/load"  # On sépare par "sujet" (ici load), puis respondent=/year=/month=
+GRID_REPORT_FILE = "data_processed/load_grid_report.csv"  # Trous, doublons, anomalies de changement d'heure
+
+# Une colonne par type de série EIA (les lignes brutes sont "longues" :
+# une ligne par heure, respondent et type)
+TYPE_COLUMNS = {
+    "D": "demand_mwh",
+    "DF": "demand_forecast_mwh",
+    "NG": "net_generation_mwh",
+}
+# Colonnes facultatives : un trou n'y invalide pas l'heure
+OPTIONAL_COLUMNS = [c for t, c in TYPE_COLUMNS.items() if t != "D"]
+
+LOAD_SCHEMA = pa.schema(
+    [("datetime_utc", pa.timestamp("us"))]  # UTC, sans fuseau comme le reste du pipeline
+    + [(c, pa.float64()) for c in TYPE_COLUMNS.values()]
+    + [(VALID_COLUMN, pa.bool_())]  # Demande présente (grille horaire, hourly_grid.py)
+)
+LOAD_PARTITION_SCHEMA = pa.schema([("respondent", pa.string())] + list(PARTITION_SCHEMA))
+
+# Lecteur rapide : parseur CSV multi-threadé d'Arrow, on ne lit que les
+# colonnes utiles avec leur type (pas d'inférence, date parsée nativement)
+FAST_READER = True
+CSV_SCHEMA = {
+    "period": pa.timestamp("us"),
+    "respondent": pa.string(),
+    "type": pa.string(),
+    "value": pa.float64(),
+}
+
+def respondent_dir(dataset_dir, respondent):
+    """
+    Sous-dataset year=/month= d'un respondent.
+    """
+    return os.path.join(dataset_dir, f"respondent={respondent}")
+
+def pivot_types(df):
+    """
+    Lignes longues (datetime_utc, respondent, type, value) -> une ligne par
+    heure et par respondent, une colonne par type (TYPE_COLUMNS).
+    Renvoie aussi les lignes en doublon écartées (la dernière gagne).
+    """
+    df = df[df['type'].isin(list(TYPE_COLUMNS))]
+    duplicated = df.duplicated(['respondent', 'datetime_utc', 'type'], keep='last')
+    wide = df[~duplicated].set_index(['respondent', 'datetime_utc', 'type'])['value'].unstack('type')
+    wide = wide.rename(columns=TYPE_COLUMNS).reindex(columns=list(TYPE_COLUMNS.values()))
+    return wide.astype('float64').reset_index().rename_axis(columns=None), df[duplicated]
+
+def read_load_fast(input_file):
+    table = pacsv.read_csv(
+        input_file,
+        read_options=pacsv.ReadOptions(use_threads=True),
+        convert_options=pacsv.ConvertOptions(column_types=CSV_SCHEMA, include_columns=list(CSV_SCHEMA)),
+    )
+    return table.to_pandas()
+
+@instrumented("process_load")
+def process_data(incremental=False):
+    print("⚙️ Début du nettoyage...")
+
+    # En incrémental, on ne traite que le dernier lot téléchargé
+    input_file = INCREMENTAL_INPUT_FILE if incremental else INPUT_FILE
+    
+    # 1. Lecture du CSV Brut
+    # dtype={'value': float} force la colonne value à être numérique dès la lecture
+    try:
+        df = read_load_fast(input_file) if FAST_READER else pd.read_csv(input_file)
+    except FileNotFoundError:
+        print(f"❌ Erreur : Le fichier {input_file} n'existe pas.")
+        return
+
+    print(f"   Lecture de {len(df)} lignes.")
+    current().rows(rows_in=len(df))
+    current().read(input_file)
+
+    # 2. Conversion des Types (Typing)
+    # On transforme la string "2022-01-01T00" en vrai objet datetime
+    # (déjà fait par Arrow avec le lecteur rapide)
+    if not FAST_READER:
+        df['period'] = pd.to_datetime(df['period'])
+    
+    # 3. Renommage et Sélection
+    # On garde uniquement ce qui nous intéresse et on donne des noms clairs
+    # (on vire respondent-name, etc.), puis une colonne par type de série
+    df = df.rename(columns={'period': 'datetime_utc'})
+    df, duplicates = pivot_types(df[['datetime_utc', 'respondent', 'type', 'value']])
+    print(f"   {df['respondent'].nunique()} respondents, {len(df)} heures x respondent.")
+
+    # 4. Gestion des valeurs manquantes : grille horaire contiguë par respondent
+    # Les heures absentes ou sans demande restent sur la grille (is_valid = False)
+    # au lieu d'être supprimées : une ligne = une heure, les lags restent justes
+    df, report = to_hourly_grid(df, value_columns=['demand_mwh'])
+    report = pd.concat([report, point_report('duplicate', duplicates)], ignore_index=True)
+    report = classify_dst(report.sort_values(['start', 'kind'], ignore_index=True))
+    os.makedirs(os.path.dirname(GRID_REPORT_FILE), exist_ok=True)
+    report.to_csv(GRID_REPORT_FILE, index=False)
+    missing = int((~df[VALID_COLUMN]).sum())
+    if missing > 0 or not report.empty:
+        print(f"⚠️ Attention : {missing} heures sans demande sur la grille ({summarize_report(report)}).")
+        print(f"   Rapport : {GRID_REPORT_FILE}")
+
+    # 5. Création des colonnes de Partitionnement
+    # Pour ranger les fichiers comme dans une bibliothèque
+    df['year'] = df['datetime_utc'].dt.year
+    df['month'] = df['datetime_utc'].dt.month
+
+    current().rows(rows_out=len(df))
+
+    # 6. Sauvegarde en Parquet Partitionné
+    # Cela va créer une structure de dossiers : data_processed/load/respondent=US48/year=2022/month=1/
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+
+    if incremental:
+        # Seules les partitions touchées par le lot sont réécrites
+        touched = {}
+        for respondent, rows in df.groupby('respondent', sort=True):
+            touched[respondent] = upsert_partitions(rows.drop(columns='respondent'),
+                                                    respondent_dir(OUTPUT_DIR, respondent), keys=['datetime_utc'])
+        print(f"✅ Terminé ! Partitions mises à jour : {touched}")
+        return
+
+    print(f"💾 Sauvegarde en Parquet dans {OUTPUT_DIR}...")
+    
+    # Réécriture complète : on vide le dossier, sinon to_parquet ajoute des
+    # fichiers à côté des anciens (lignes en double)
+    clear_dataset(OUTPUT_DIR)
+    df.to_parquet(
+        OUTPUT_DIR,
+        engine='pyarrow',
+        compression='snappy',  # Compresse le fichier pour gagner de la place
+        partition_cols=['respondent', 'year', 'month'], # La magie opère ici
+        index=False
+    )
+    
+    current().wrote(OUTPUT_DIR)
+    print("✅ Terminé ! Structure de fichiers créée.")
+
+if __name__ == "__main__":
     process_data()
\ No newline at end of file
@@ -1,54 +1,104 @@
-import pandas as pd
-import os
-import glob # Permet de lister des fichiers avec des wildcards (*)
-
-# --- CONFIGURATION ---
-INPUT_PATTERN = "data_raw/weather/weather_*.csv" # Prend tous les fichiers weather
-OUTPUT_DIR = "data_processed/weather"
-
-def process_weather():
-    print("⚙️ Début du nettoyage Météo...")
-    
-    # 1. Lister tous les fichiers CSV météo
-    files = glob.glob(INPUT_PATTERN)
-    print(f"   Fichiers trouvés : {files}")
-    
-    all_data = []
-    
-    # 2. Boucle sur chaque ville
-    for file in files:
-        df_city = pd.read_csv(file)
-        
-        # Conversion Date (Crucial !)
-        df_city['time'] = pd.to_datetime(df_city['time'])
-        
-        # Renommage pour uniformiser
-        df_city = df_city.rename(columns={'time': 'datetime_utc'})
-        
-        all_data.append(df_city)
-    
-    # 3. Fusion verticale (On empile New York, Houston, LA l'un sous l'autre)
-    df_final = pd.concat(all_data, ignore_index=True)
-    
-    print(f"   Total lignes fusionnées : {len(df_final)}")
-    
-    # 4. Partitionnement
-    df_final['year'] = df_final['datetime_utc'].dt.year
-    df_final['month'] = df_final['datetime_utc'].dt.month
-    
-    # 5. Sauvegarde Parquet
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-        
-    print(f"💾 Sauvegarde dans {OUTPUT_DIR}...")
-    df_final.to_parquet(
-        OUTPUT_DIR,
-        engine='pyarrow',
-        compression='snappy',
-        partition_cols=['year', 'month'],
-        index=False
-    )
-    print("✅ Météo nettoyée et sauvegardée.")
-
-if __name__ == "__main__":
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import os
+import glob # Permet de lister des fichiers avec des wildcards (*)
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import current, instrumented
+from storage import clear_dataset, upsert_partitions
+
+# --- CONFIGURATION ---
+INPUT_PATTERN = "data_raw/weather/weather_*.csv" # Prend tous les fichiers weather
+INCREMENTAL_PATTERN = "data_raw/weather/incremental/weather_*.csv"
+OUTPUT_DIR = "data_processed/weather"
+
+# Lecteur rapide : parseur CSV multi-threadé d'Arrow avec un schéma explicite
+# (dates parsées nativement, ville en dictionnaire, températures en float32)
+FAST_READER = True
+READ_WORKERS = os.cpu_count() or 4
+CSV_SCHEMA = {
+    "time": pa.timestamp("us"),
+    "temperature_c": pa.float32(),
+    "city": pa.dictionary(pa.int32(), pa.string()),
+}
+
+def read_weather_file(file):
+    return pacsv.read_csv(file, convert_options=pacsv.ConvertOptions(column_types=CSV_SCHEMA))
+
+def read_weather_fast(files, workers=READ_WORKERS):
+    """
+    Lit les fichiers en parallèle puis les empile sans copie : la table
+    finale référence simplement les blocs de chaque fichier.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        tables = list(executor.map(read_weather_file, files))
+    table = pa.concat_tables(tables)
+    return table.rename_columns(['datetime_utc' if c == 'time' else c for c in table.column_names]).to_pandas()
+
+@instrumented("process_weather")
+def process_weather(incremental=False):
+    print("⚙️ Début du nettoyage Météo...")
+    
+    # 1. Lister tous les fichiers CSV météo (seulement le dernier lot en incrémental)
+    files = glob.glob(INCREMENTAL_PATTERN if incremental else INPUT_PATTERN)
+    print(f"   Fichiers trouvés : {files}")
+    if not files:
+        print("⚠️ Aucun fichier météo à traiter.")
+        return
+    
+    if FAST_READER:
+        # 2-3. Lecture parallèle typée + empilement zéro-copie
+        df_final = read_weather_fast(files)
+    else:
+        all_data = []
+        
+        # 2. Boucle sur chaque ville
+        for file in files:
+            df_city = pd.read_csv(file)
+            
+            # Conversion Date (Crucial !)
+            df_city['time'] = pd.to_datetime(df_city['time'])
+            
+            # Renommage pour uniformiser
+            df_city = df_city.rename(columns={'time': 'datetime_utc'})
+            
+            all_data.append(df_city)
+        
+        # 3. Fusion verticale (On empile New York, Houston, LA l'un sous l'autre)
+        df_final = pd.concat(all_data, ignore_index=True)
+    
+    print(f"   Total lignes fusionnées : {len(df_final)}")
+    current().rows(rows_in=len(df_final), rows_out=len(df_final))
+    current().read(nbytes=sum(os.path.getsize(f) for f in files))
+    
+    # 4. Partitionnement
+    df_final['year'] = df_final['datetime_utc'].dt.year
+    df_final['month'] = df_final['datetime_utc'].dt.month
+    
+    # 5. Sauvegarde Parquet
+    if incremental:
+        # Seules les partitions touchées par le lot sont réécrites
+        touched = upsert_partitions(df_final, OUTPUT_DIR, keys=['datetime_utc', 'city'])
+        print(f"✅ Météo mise à jour, partitions : {touched}")
+        return
+
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+        
+    print(f"💾 Sauvegarde dans {OUTPUT_DIR}...")
+    # Réécriture complète : on vide le dossier, sinon to_parquet ajoute des
+    # fichiers à côté des anciens (lignes en double)
+    clear_dataset(OUTPUT_DIR)
+    df_final.to_parquet(
+        OUTPUT_DIR,
+        engine='pyarrow',
+        compression='snappy',
+        partition_cols=['year', 'month'],
+        index=False
+    )
+    current().wrote(OUTPUT_DIR)
+    print("✅ Météo nettoyée et sauvegardée.")
+
+if __name__ == "__main__":
     process_weather()
\ No newline at end of file
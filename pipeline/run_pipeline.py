@@ -0,0 +1,269 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Les étapes sont importées par nom : on s'assure que pipeline/ est dans le path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import instrumentation
+
+# --- CONFIGURATION ---
+STATE_FILE = "data_processed/.pipeline_state.json"
+PIPELINE_DIR = "pipeline"
+
+# Le DAG du pipeline. Pour chaque étape :
+# - call    : (module, fonction) exécutée dans un process du pool
+# - deps    : étapes qui doivent être terminées avant
+# - inputs  : fichiers/dossiers dont le contenu entre dans l'empreinte
+# - code    : modules dont le code source entre dans l'empreinte
+# - outputs : l'étape est relancée si l'un d'eux a disparu
+STAGES = {
+    "ingest_load": {
+        "call": ("ingest_load_data", "main"),
+        "deps": [],
+        "inputs": [],
+        "code": ["ingest_load_data", "process_load_data", "hourly_grid", "http_client", "storage"],
+        "outputs": ["data_raw/us_load_2022_2023.csv"],
+    },
+    "process_load": {
+        "call": ("process_load_data", "process_data"),
+        "deps": ["ingest_load"],
+        "inputs": ["data_raw/us_load_2022_2023.csv"],
+        "code": ["process_load_data", "hourly_grid", "storage"],
+        "outputs": ["data_processed/load"],
+    },
+    "ingest_weather": {
+        "call": ("ingest_weather", "main"),
+        "deps": [],
+        "inputs": ["config/stations.csv"],
+        "code": ["ingest_weather", "http_client", "storage"],
+        "outputs": ["data_processed/weather"],
+    },
+    "process_weather": {
+        "call": ("process_weather", "process_weather"),
+        "deps": ["ingest_weather"],
+        "inputs": ["data_raw/weather"],
+        "code": ["process_weather", "storage"],
+        "outputs": ["data_processed/weather"],
+    },
+    "merge": {
+        "call": ("merge_data", "merge_datasets"),
+        "deps": ["process_load", "process_weather"],
+        "inputs": ["data_processed/load", "data_processed/weather", "config/stations.csv"],
+        "code": ["merge_data", "process_load_data", "hourly_grid", "weather_index", "storage"],
+        "outputs": ["data_processed/energy_dataset_master.parquet"],
+    },
+    "features": {
+        "call": ("feature_engineering", "create_features"),
+        "deps": ["merge"],
+        "inputs": ["data_processed/energy_dataset_master.parquet"],
+        "code": ["feature_engineering", "feature_kernels", "hourly_grid", "process_load_data", "storage"],
+        "outputs": ["data_processed/features"],
+    },
+    "train": {
+        "call": ("train_model", "train_forecasting_model"),
+        "deps": ["features"],
+        # best_params.json : écrit par tune_model.py, lu par train_model (USE_TUNED_PARAMS)
+        "inputs": ["data_processed/features", "data_processed/best_params.json"],
+        "code": ["train_model", "model_registry", "prediction_store", "metrics_cube", "process_load_data", "storage"],
+        "outputs": ["models/registry/LATEST"],
+    },
+}
+
+# Étapes acceptant un paramètre incremental=True
+INCREMENTAL_STAGES = {"ingest_load", "process_load", "ingest_weather", "process_weather", "merge", "features"}
+
+
+def build_stages(incremental=False):
+    """
+    Adapte le DAG aux modes configurés dans les scripts : en streaming
+    (ingest_load_data.STREAM_TO_PARQUET) ou en mode stations
+    (ingest_weather.USE_STATIONS), l'ingestion écrit directement le
+    dataset traité et l'étape de traitement disparaît.
+    """
+    import ingest_load_data
+    import ingest_weather
+
+    stages = {name: dict(stage) for name, stage in STAGES.items()}
+    if ingest_load_data.STREAM_TO_PARQUET:
+        stages["ingest_load"]["outputs"] = ["data_processed/load"]
+        _drop_stage(stages, "process_load")
+    if ingest_weather.USE_STATIONS:
+        _drop_stage(stages, "process_weather")
+    else:
+        stages["ingest_weather"]["inputs"] = []
+        stages["ingest_weather"]["outputs"] = ["data_raw/weather"]
+
+    if incremental and "process_load" in stages:
+        # En incrémental, l'ingestion écrit le lot du jour dans un fichier à part
+        import process_load_data
+        batch = process_load_data.INCREMENTAL_INPUT_FILE
+        stages["ingest_load"]["outputs"] = stages["ingest_load"]["outputs"] + [batch]
+        stages["process_load"]["inputs"] = stages["process_load"]["inputs"] + [batch]
+
+    for name, stage in stages.items():
+        stage["kwargs"] = {"incremental": True} if incremental and name in INCREMENTAL_STAGES else {}
+        # Une ingestion incrémentale dépend de la source externe : toujours relancée
+        stage["always_run"] = incremental and name.startswith("ingest")
+    return stages
+
+
+def _drop_stage(stages, name):
+    removed = stages.pop(name)
+    for stage in stages.values():
+        if name in stage["deps"]:
+            stage["deps"] = [d for d in stage["deps"] if d != name] + removed["deps"]
+
+
+class Fingerprinter:
+    """
+    Empreinte SHA-256 du contenu des entrées d'une étape. Le hash de chaque
+    fichier est mis en cache avec sa taille et sa date de modification :
+    un fichier inchangé n'est jamais relu.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        cached = self.cache.get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        self.cache[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def path_hash(self, path):
+        if os.path.isfile(path):
+            return self.file_hash(path)
+        if not os.path.isdir(path):
+            return "absent"
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                digest.update(os.path.relpath(full, path).encode())
+                digest.update(self.file_hash(full).encode())
+        return digest.hexdigest()
+
+    def stage(self, name, stage):
+        digest = hashlib.sha256(name.encode())
+        digest.update(json.dumps(stage["kwargs"], sort_keys=True).encode())
+        for module in stage["code"]:
+            digest.update(self.file_hash(os.path.join(PIPELINE_DIR, f"{module}.py")).encode())
+        for path in stage["inputs"]:
+            digest.update(path.encode())
+            digest.update(self.path_hash(path).encode())
+        return digest.hexdigest()
+
+
+def load_state():
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    return {"stages": {}, "files": {}}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, STATE_FILE)
+
+
+def execute_stage(module_name, func_name, kwargs):
+    """
+    Exécutée dans un process du pool : importe l'étape et l'appelle.
+    """
+    start = time.perf_counter()
+    getattr(importlib.import_module(module_name), func_name)(**kwargs)
+    return time.perf_counter() - start
+
+
+def run_pipeline(incremental=False, force=(), workers=None, dry_run=False):
+    """
+    Exécute le DAG : une étape démarre dès que ses dépendances sont
+    terminées (les branches load et météo tournent en parallèle), et est
+    sautée si son empreinte est identique à celle du dernier succès.
+    dry_run : rien n'est exécuté ; une étape dont une dépendance serait
+    exécutée est annoncée à exécuter (ses entrées ne sont pas encore écrites).
+    """
+    stages = build_stages(incremental)
+    state = load_state()
+    fingerprinter = Fingerprinter(state["files"])
+    force = set(force)
+
+    done, changed, submitted = set(), set(), {}
+    print(f"🚦 Pipeline : {len(stages)} étapes{' (incrémental)' if incremental else ''}")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while len(done) < len(stages):
+            for name, stage in stages.items():
+                if name in done or name in submitted.values() or not all(d in done for d in stage["deps"]):
+                    continue
+                fingerprint = fingerprinter.stage(name, stage)
+                outputs_ok = all(os.path.exists(p) for p in stage["outputs"])
+                # Pas de propagation automatique : si une étape amont a réécrit
+                # un contenu identique, l'empreinte aval ne change pas
+                up_to_date = (state["stages"].get(name) == fingerprint and outputs_ok
+                              and not stage["always_run"] and "all" not in force and name not in force)
+                upstream = dry_run and any(d in changed for d in stage["deps"])
+                if upstream:
+                    up_to_date = False
+                if up_to_date or dry_run:
+                    status = "à jour" if up_to_date else "à exécuter" + (" (étape amont)" if upstream else "")
+                    print(f"   {'⏭️ ' if up_to_date else '📝'} {name} : {status}")
+                    done.add(name)
+                    if not up_to_date:
+                        changed.add(name)
+                    continue
+                print(f"   ▶️  {name}...")
+                module_name, func_name = stage["call"]
+                future = pool.submit(execute_stage, module_name, func_name, stage["kwargs"])
+                stage["fingerprint"] = fingerprint
+                submitted[future] = name
+
+            if not submitted:
+                continue
+            finished, _ = wait(list(submitted), return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = submitted.pop(future)
+                elapsed = future.result()  # Une étape en échec arrête le pipeline
+                print(f"   ✅ {name} ({elapsed:.1f} s)")
+                state["stages"][name] = stages[name]["fingerprint"]
+                save_state(state)
+                done.add(name)
+                changed.add(name)
+
+    if dry_run:
+        print(f"🏁 Simulation : {len(changed)} étape(s) à exécuter, {len(done) - len(changed)} à jour.")
+        return changed
+    save_state(state)
+    print(f"🏁 Pipeline terminé : {len(changed)} étape(s) exécutée(s), {len(done) - len(changed)} à jour.")
+    return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exécute le pipeline (étapes en cache si rien n'a changé).")
+    parser.add_argument("--incremental", action="store_true", help="Mise à jour incrémentale (watermarks)")
+    parser.add_argument("--force", nargs="*", default=[], help="Étapes à relancer quoi qu'il arrive ('all' pour tout)")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de process en parallèle")
+    parser.add_argument("--dry-run", action="store_true", help="Affiche ce qui serait exécuté")
+    parser.add_argument("--metrics", default=None,
+                        help="Fichier JSON lines des mesures par étape (temps, mémoire, lignes, octets)")
+    args = parser.parse_args()
+    if args.metrics:
+        # Avant la création du pool : les process enfants héritent de la variable
+        instrumentation.enable(args.metrics)
+    run_pipeline(args.incremental, args.force, args.workers, args.dry_run)
@@ -0,0 +1,306 @@
+import argparse
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from feature_engineering import FEATURE_SPEC, INPUT_FILE
+from feature_kernels import calendar_features, feature_names, history_hours
+from hourly_grid import hour_numbers
+from model_registry import load_model
+from merge_data import LOAD_REGION, read_master
+
+# Service de prévision en ligne : le modèle (registre, dernière version
+# par défaut) est chargé une fois au démarrage, les dernières heures observées (consommation + météo) sont
+# gardées dans un buffer circulaire de taille fixe, et le vecteur de
+# features de create_features est recalculé à la demande pour chaque
+# heure cible. Un lot de requêtes = un seul appel de prédiction.
+#
+#   python pipeline/serve_model.py --port 8000
+#   curl -d '{"rows": [{"datetime_utc": "2024-01-02T00:00"}]}' localhost:8000/predict
+
+# --- CONFIGURATION ---
+HOST = "127.0.0.1"
+PORT = 8000
+BUFFER_HOURS = history_hours(FEATURE_SPEC) + 24  # Plus grand lag/fenêtre + marge
+PREDICT_THREADS = 1  # Les lots sont petits : un thread évite le coût de synchronisation
+
+# Bornes (ms) de l'histogramme de latence exposé sur /metrics
+LATENCY_BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+
+class HistoryBuffer:
+    """
+    Buffer circulaire des dernières heures : une case par heure (indice =
+    heure de la grille modulo la capacité) et, pour chaque case, l'heure qui l'occupe.
+    Une heure absente ou écrasée se lit NaN, comme un trou dans la série.
+    """
+
+    def __init__(self, columns, capacity=BUFFER_HOURS):
+        self.capacity = capacity
+        self.columns = list(columns)
+        self.values = np.full((capacity, len(self.columns)), np.nan)
+        self.hours = np.full(capacity, -1, dtype=np.int64)
+        self.latest = -1
+        self.lock = threading.Lock()
+
+    def update(self, frame):
+        """
+        Ajoute ou corrige des heures observées (DataFrame avec datetime_utc
+        et tout ou partie des colonnes du buffer). Seules les valeurs
+        fournies sont écrites : une colonne absente (ou NaN) garde la
+        valeur déjà connue pour cette heure.
+        """
+        hours = hour_numbers(frame['datetime_utc'])
+        given = [(j, pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64))
+                 for j, column in enumerate(self.columns) if column in frame.columns]
+        with self.lock:
+            # Une heure plus ancienne que la fenêtre ne doit pas écraser une plus récente
+            keep = hours > max(self.latest, int(hours.max())) - self.capacity
+            slots = hours[keep] % self.capacity
+            # Case reprise par une nouvelle heure : on efface l'heure précédente
+            fresh = self.hours[slots] != hours[keep]
+            self.values[slots[fresh]] = np.nan
+            self.hours[slots] = hours[keep]
+            for j, values in given:
+                provided = ~np.isnan(values[keep])
+                self.values[slots[provided], j] = values[keep][provided]
+            self.latest = max(self.latest, int(hours.max()))
+        return int(keep.sum())
+
+    def gather(self, hours, column):
+        """
+        Valeurs de `column` aux heures demandées (tableau d'entiers de forme
+        quelconque), NaN pour les heures absentes du buffer.
+        """
+        j = self.columns.index(column)
+        slots = hours % self.capacity
+        with self.lock:
+            values = self.values[slots, j]
+            present = self.hours[slots] == hours
+        return np.where(present, values, np.nan)
+
+
+class Forecaster:
+    """
+    Modèle + buffer : calcule les features de plusieurs heures cibles d'un
+    coup et les prédit en un seul appel.
+    """
+
+    def __init__(self, version=None, spec=FEATURE_SPEC, capacity=BUFFER_HOURS):
+        if spec.get('ewm'):
+            raise ValueError("Les features ewm dépendent de tout l'historique : non supportées en ligne.")
+        self.spec = spec
+        self.booster, self.metadata = load_model(version, nthread=PREDICT_THREADS)
+        self.features = self.metadata['features']
+        # Colonnes exogènes (météo...) : ni calendaires, ni dérivées de la consommation
+        derived = set(feature_names(spec)) | {'year'}
+        self.exogenous = [f for f in self.features if f not in derived]
+        self.buffer = HistoryBuffer(['demand_mwh'] + self.exogenous, capacity)
+
+    def warm_start(self, path=INPUT_FILE):
+        """
+        Remplit le buffer avec les dernières heures de la table maître.
+        """
+        columns = ['datetime_utc', 'demand_mwh'] + self.exogenous
+        respondent = self.metadata.get('respondent', LOAD_REGION)  # Région sur laquelle le modèle a appris
+        latest = read_master(respondent, columns=['datetime_utc'], path=path)['datetime_utc'].max()
+        tail = read_master(respondent, start=latest - pd.Timedelta(hours=self.buffer.capacity - 1),
+                           columns=columns, path=path)
+        self.buffer.update(tail)
+        return len(tail)
+
+    def feature_matrix(self, rows):
+        """
+        Matrice (heures cibles x features) dans l'ordre attendu par le modèle.
+        Lags et fenêtres [t-fenêtre, t-1] sont lus dans le buffer par
+        indexation vectorisée ; la météo vient de la requête, sinon du buffer.
+        """
+        timestamps = pd.DatetimeIndex(pd.to_datetime(rows['datetime_utc']))
+        hours = hour_numbers(timestamps)
+        columns = calendar_features(timestamps, self.spec)
+        columns['year'] = timestamps.year.to_numpy()
+
+        for k in self.spec.get('lags', []):
+            columns[f"lag_{k}h"] = self.buffer.gather(hours - k, 'demand_mwh')
+        for window, stats in self.spec.get('rolling', {}).items():
+            # (heures cibles x fenêtre) : une ligne par cible, NaN si la fenêtre est incomplète
+            values = self.buffer.gather(hours[:, None] - np.arange(window, 0, -1), 'demand_mwh')
+            for stat in stats:
+                if stat == 'std':
+                    columns[f"rolling_std_{window}h"] = values.std(axis=1, ddof=1)
+                else:
+                    columns[f"rolling_{stat}_{window}h"] = getattr(values, stat)(axis=1)
+        for column in self.exogenous:
+            observed = self.buffer.gather(hours, column)
+            if column in rows.columns:
+                given = pd.to_numeric(rows[column], errors='coerce').to_numpy(dtype=np.float64)
+                observed = np.where(np.isnan(given), observed, given)
+            columns[column] = observed
+
+        X = np.empty((len(rows), len(self.features)), dtype=np.float32)
+        for j, name in enumerate(self.features):
+            X[:, j] = columns[name]
+        return X
+
+    def predict(self, rows):
+        X = self.feature_matrix(rows)
+        return self.booster.inplace_predict(X, validate_features=False) if len(X) else np.empty(0)
+
+
+class LatencyHistogram:
+    """
+    Histogramme cumulatif des latences (ms), par route.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = list(buckets)
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def observe(self, route, elapsed_ms, batch=1):
+        with self.lock:
+            stats = self.counts.setdefault(route, {'count': 0, 'rows': 0, 'sum_ms': 0.0,
+                                                   'buckets': [0] * (len(self.buckets) + 1)})
+            stats['count'] += 1
+            stats['rows'] += batch
+            stats['sum_ms'] += elapsed_ms
+            stats['buckets'][bisect.bisect_left(self.buckets, elapsed_ms)] += 1
+
+    def quantile(self, stats, q):
+        # Borne supérieure du bucket qui contient le quantile
+        target, seen = q * stats['count'], 0
+        for bound, count in zip(self.buckets + [float('inf')], stats['buckets']):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                route: {
+                    'count': stats['count'],
+                    'rows': stats['rows'],
+                    'mean_ms': round(stats['sum_ms'] / stats['count'], 3),
+                    'p50_ms': self.quantile(stats, 0.50),
+                    'p99_ms': self.quantile(stats, 0.99),
+                    'buckets_ms': dict(zip([str(b) for b in self.buckets] + ['+inf'], stats['buckets'])),
+                }
+                for route, stats in self.counts.items()
+            }
+
+
+def _rows_frame(payload):
+    """
+    {"rows": [{"datetime_utc": ..., "temp_index": ...}, ...]} ou
+    {"datetime_utc": [...]} -> DataFrame.
+    """
+    if 'rows' in payload:
+        frame = pd.DataFrame(payload['rows'])
+    else:
+        frame = pd.DataFrame({'datetime_utc': payload.get('datetime_utc', [])})
+    if len(frame) and 'datetime_utc' not in frame.columns:
+        raise ValueError("Champ 'datetime_utc' manquant")
+    return frame
+
+
+def make_handler(forecaster, histogram):
+    class ForecastHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Connexions persistantes
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                latest = forecaster.buffer.latest
+                self._send(200, {
+                    'latency': histogram.snapshot(),
+                    'model_version': forecaster.metadata['version'],
+                    'buffer_latest': str(pd.Timestamp(latest * 3600, unit='s')) if latest >= 0 else None,
+                    'features': forecaster.features,
+                })
+            elif self.path == "/health":
+                self._send(200, {'status': 'ok'})
+            else:
+                self._send(404, {'error': f"Route inconnue : {self.path}"})
+
+        def do_POST(self):
+            start = time.perf_counter()
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                frame = _rows_frame(json.loads(self.rfile.read(length) or b"{}"))
+                if self.path == "/predict":
+                    predictions = forecaster.predict(frame)
+                    body = {'predictions': [
+                        {'datetime_utc': str(t), 'prediction': float(p)}
+                        for t, p in zip(pd.to_datetime(frame['datetime_utc']), predictions)
+                    ]}
+                elif self.path == "/observe":
+                    body = {'stored': forecaster.buffer.update(frame) if len(frame) else 0}
+                else:
+                    self._send(404, {'error': f"Route inconnue : {self.path}"})
+                    return
+            except (ValueError, KeyError, TypeError) as e:
+                self._send(400, {'error': str(e)})
+                return
+            self._send(200, body)
+            histogram.observe(self.path, (time.perf_counter() - start) * 1000, batch=len(frame))
+
+        def log_message(self, format, *args):
+            pass  # Pas de log par requête : il coûterait plus cher que la prédiction
+
+    return ForecastHandler
+
+
+def predict_batch(input_file, output_file, version=None):
+    """
+    Mode batch : prédit les heures d'un CSV (datetime_utc + météo optionnelle)
+    à partir de l'historique de la table maître.
+    """
+    forecaster = Forecaster(version)
+    forecaster.warm_start()
+    rows = pd.read_csv(input_file)
+    rows['prediction'] = forecaster.predict(rows)
+    rows.to_csv(output_file, index=False)
+    print(f"✅ {len(rows)} prévisions sauvegardées : {output_file}")
+
+
+def serve(host=HOST, port=PORT, version=None, warm=True):
+    forecaster = Forecaster(version)
+    print(f"🚀 Modèle chargé : version {forecaster.metadata['version']}")
+    if warm:
+        print(f"   Historique chargé : {forecaster.warm_start()} heures")
+    server = ThreadingHTTPServer((host, port), make_handler(forecaster, LatencyHistogram()))
+    print(f"✅ Service de prévision sur http://{host}:{port} (/predict, /observe, /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Service de prévision (HTTP ou batch).")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--version", default=None, help="Version du registre (défaut : la dernière)")
+    parser.add_argument("--no-warm-start", action="store_true", help="Buffer vide au démarrage")
+    parser.add_argument("--batch", default=None, help="CSV des heures à prédire (mode batch, sans serveur)")
+    parser.add_argument("--output", default="data_processed/forecasts.csv", help="Sortie du mode batch")
+    args = parser.parse_args()
+    if args.batch:
+        predict_batch(args.batch, args.output, args.version)
+    else:
+        serve(args.host, args.port, args.version, warm=not args.no_warm_start)
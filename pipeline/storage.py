@@ -0,0 +1,258 @@
+import glob
+import os
+import re
+import shutil
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Outils partagés pour les datasets Parquet partitionnés year=/month=
+PARTITION_COLS = ['year', 'month']
+PARTITION_RE = re.compile(r"year=(\d+)[/\\]month=(\d+)$")
+# Types explicites : year/month sont relus en int32 (et non en catégories)
+PARTITION_SCHEMA = pa.schema([("year", pa.int32()), ("month", pa.int32())])
+BATCH_ROWS = 65536  # Lecture par lots (iter_batches)
+
+
+def partition_path(dataset_dir, year, month):
+    return os.path.join(dataset_dir, f"year={int(year)}", f"month={int(month)}")
+
+
+def list_partitions(dataset_dir):
+    """
+    Liste les partitions existantes, triées : [((year, month), chemin), ...]
+    """
+    partitions = []
+    for path in glob.glob(os.path.join(dataset_dir, "year=*", "month=*")):
+        match = PARTITION_RE.search(path)
+        if match and os.path.isdir(path):
+            partitions.append(((int(match.group(1)), int(match.group(2))), path))
+    return sorted(partitions)
+
+
+def latest_timestamp(dataset_dir, column='datetime_utc', value_column=None):
+    """
+    Watermark du dataset : le plus grand `column` déjà stocké.
+    Avec value_column, seules les lignes où cette colonne est renseignée
+    comptent (ex. demande réelle, pas les heures de prévision seules).
+    On ne lit que ces colonnes, en partant de la partition la plus récente.
+    Renvoie None si le dataset est vide ou absent.
+    """
+    columns = [column] + ([value_column] if value_column else [])
+    for _, path in reversed(list_partitions(dataset_dir)):
+        files = glob.glob(os.path.join(path, "*.parquet"))
+        if not files:
+            continue
+        rows = pd.concat([pd.read_parquet(f, columns=columns) for f in files])
+        if value_column:
+            rows = rows[rows[value_column].notna()]
+        values = rows[column]
+        if values.notna().any():
+            return values.max()
+    return None
+
+
+def upsert_partitions(df, dataset_dir, keys=('datetime_utc',)):
+    """
+    Écrit `df` (avec colonnes year/month) en ne réécrivant que les
+    partitions touchées : les lignes existantes de ces partitions sont
+    fusionnées avec les nouvelles (les nouvelles gagnent sur les doublons
+    de `keys`), le reste du dataset n'est pas lu.
+    """
+    keys = list(keys)
+    touched = []
+    for (year, month), new_rows in df.groupby(PARTITION_COLS, sort=True, observed=True):
+        path = partition_path(dataset_dir, year, month)
+        old_files = glob.glob(os.path.join(path, "*.parquet"))
+
+        new_rows = new_rows.drop(columns=PARTITION_COLS)
+        if old_files:
+            existing = pd.concat([pd.read_parquet(f) for f in old_files], ignore_index=True)
+            existing = existing.drop(columns=[c for c in PARTITION_COLS if c in existing.columns])
+            new_rows = pd.concat([existing, new_rows], ignore_index=True)
+        new_rows = new_rows.drop_duplicates(subset=keys, keep='last').sort_values(keys)
+
+        # Écriture dans un fichier temporaire puis remplacement (pas de partition à moitié écrite)
+        os.makedirs(path, exist_ok=True)
+        tmp_file = os.path.join(path, "part-0.parquet.tmp")
+        table = pa.Table.from_pandas(new_rows, preserve_index=False)
+        pq.write_table(table, tmp_file, compression='snappy')
+        for f in old_files:
+            os.remove(f)
+        os.replace(tmp_file, os.path.join(path, "part-0.parquet"))
+        touched.append((int(year), int(month)))
+
+    return touched
+
+
+def append_partitions(df, dataset_dir):
+    """
+    Ajoute `df` (avec colonnes year/month) au dataset sans rien relire :
+    un nouveau fichier par partition touchée.
+    """
+    run_id = uuid.uuid4().hex
+    touched = []
+    for (year, month), rows in df.groupby(PARTITION_COLS, sort=True, observed=True):
+        path = partition_path(dataset_dir, year, month)
+        os.makedirs(path, exist_ok=True)
+        table = pa.Table.from_pandas(rows.drop(columns=PARTITION_COLS), preserve_index=False)
+        pq.write_table(table, os.path.join(path, f"part-{run_id}.parquet"), compression='snappy')
+        touched.append((int(year), int(month)))
+    return touched
+
+
+def clear_dataset(dataset_dir):
+    if os.path.exists(dataset_dir):
+        shutil.rmtree(dataset_dir)
+
+
+class PartitionedWriter:
+    """
+    Écrit des record batches Arrow dans un dataset year=/month= au fil de
+    l'eau : un ParquetWriter par partition, un fichier par exécution
+    (append-only, les fichiers déjà présents ne sont pas touchés).
+    Les batches doivent arriver triés par date : dès qu'un batch commence
+    après une partition, son fichier est fermé (peu de fichiers ouverts).
+    """
+
+    def __init__(self, dataset_dir, schema, time_column='datetime_utc', compression='snappy'):
+        self.dataset_dir = dataset_dir
+        self.schema = schema
+        self.time_column = time_column
+        self.compression = compression
+        self.run_id = uuid.uuid4().hex
+        self.writers = {}
+        self.files_opened = 0
+        self.rows_written = 0
+
+    def write_batch(self, batch):
+        if batch.num_rows == 0:
+            return
+        ts = batch.column(self.time_column)
+        keys = pc.add(pc.multiply(pc.year(ts), 100), pc.month(ts))
+        self._close_before(pc.min(keys).as_py())
+
+        for key in pc.unique(keys).to_pylist():
+            part = batch.filter(pc.equal(keys, key))
+            self._writer(key).write_batch(part)
+            self.rows_written += part.num_rows
+
+    def _writer(self, key):
+        if key not in self.writers:
+            path = partition_path(self.dataset_dir, key // 100, key % 100)
+            os.makedirs(path, exist_ok=True)
+            # Compteur dans le nom : une partition rouverte ne doit pas écraser son fichier
+            filename = os.path.join(path, f"part-{self.run_id}-{self.files_opened}.parquet")
+            self.files_opened += 1
+            self.writers[key] = pq.ParquetWriter(filename, self.schema, compression=self.compression)
+        return self.writers[key]
+
+    def _close_before(self, key):
+        for old in [k for k in self.writers if k < key]:
+            self.writers.pop(old).close()
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_dataset(path, partition_schema=PARTITION_SCHEMA):
+    """
+    Dataset Arrow sur un dossier partitionné (hive) ou un fichier unique.
+    """
+    if os.path.isdir(path):
+        partitioning = ds.partitioning(partition_schema, flavor='hive')
+        return ds.dataset(path, format='parquet', partitioning=partitioning)
+    return ds.dataset(path, format='parquet')
+
+
+def month_filter(start=None, end=None):
+    """
+    Filtre sur les colonnes year/month couvrant [start, end) : Arrow
+    l'applique aux chemins des partitions, les dossiers hors plage ne
+    sont même pas ouverts.
+    """
+    year, month = ds.field('year'), ds.field('month')
+    expr = None
+    if start is not None:
+        start = pd.Timestamp(start)
+        expr = (year > start.year) | ((year == start.year) & (month >= start.month))
+    if end is not None:
+        # end est exclu : le 1er du mois à minuit n'a pas besoin de ce mois
+        last = pd.Timestamp(end) - pd.Timedelta(microseconds=1)
+        upper = (year < last.year) | ((year == last.year) & (month <= last.month))
+        expr = upper if expr is None else expr & upper
+    return expr
+
+
+def read_dataset(path, start=None, end=None, columns=None, time_column='datetime_utc',
+                 filter=None, partition_schema=PARTITION_SCHEMA):
+    """
+    Lecture d'une plage [start, end) et d'une liste de colonnes.
+    - year/month -> élagage des partitions (fichiers jamais ouverts)
+    - time_column -> filtre poussé au scan Parquet (row groups écartés
+      grâce à leurs statistiques min/max)
+    - columns -> seules ces colonnes sont décodées
+    """
+    dataset = open_dataset(path, partition_schema)
+    expr = range_filter(dataset, start, end, time_column, filter)
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+
+def range_filter(dataset, start=None, end=None, time_column='datetime_utc', filter=None):
+    """
+    Expression de filtre pour [start, end) : élagage year/month + filtre
+    sur time_column, combinée avec `filter`.
+    """
+    names = dataset.schema.names
+    expr = filter
+    if start is not None or end is not None:
+        if 'year' in names and 'month' in names:
+            months = month_filter(start, end)
+            expr = months if expr is None else expr & months
+        time_type = dataset.schema.field(time_column).type
+        for bound, keep in ((start, lambda f, v: f >= v), (end, lambda f, v: f < v)):
+            if bound is not None:
+                value = pa.scalar(pd.Timestamp(bound).to_pydatetime(), type=time_type)
+                cond = keep(ds.field(time_column), value)
+                expr = cond if expr is None else expr & cond
+    return expr
+
+
+def iter_batches(path, start=None, end=None, columns=None, time_column='datetime_utc',
+                 filter=None, partition_schema=PARTITION_SCHEMA, batch_rows=BATCH_ROWS):
+    """
+    Comme read_dataset, mais par lots d'au plus `batch_rows` lignes
+    (DataFrames) : la mémoire ne dépasse jamais un lot.
+    """
+    dataset = open_dataset(path, partition_schema)
+    expr = range_filter(dataset, start, end, time_column, filter)
+    for batch in dataset.to_batches(columns=columns, filter=expr, batch_size=batch_rows,
+                                    batch_readahead=1, fragment_readahead=1):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def dataset_columns(path, partition_schema=PARTITION_SCHEMA):
+    return open_dataset(path, partition_schema).schema.names
+
+
+def time_bounds(path, time_column='datetime_utc', filter=None, partition_schema=PARTITION_SCHEMA):
+    """
+    (min, max) de la colonne de temps, en ne décodant que cette colonne.
+    """
+    dataset = open_dataset(path, partition_schema)
+    column = dataset.to_table(columns=[time_column], filter=filter).column(time_column)
+    bounds = pc.min_max(column)
+    return pd.Timestamp(bounds['min'].as_py()), pd.Timestamp(bounds['max'].as_py())
@@ -0,0 +1,156 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Générateur de données synthétiques hors-ligne, aux formats exacts des
+# scripts d'ingestion (CSV brut EIA, weather_<ville>.csv, config des stations).
+# Sert aux benchmarks et aux essais sans clé d'API.
+
+# --- CONFIGURATION ---
+END_DATE = "2024-01-01"          # Fin exclue, pour que SPLIT_DATE tombe dans les données
+LOAD_FILE = "data_raw/us_load_2022_2023.csv"  # Lu par process_load_data.py
+WEATHER_DIR = "data_raw/weather"
+STATIONS_FILE = "config/stations.csv"
+
+# Boîte englobante approximative des US48 (lat, lon)
+LAT_RANGE = (26.0, 48.0)
+LON_RANGE = (-122.0, -71.0)
+
+
+def generate_stations(n_stations, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'name': [f"station_{i:04d}" for i in range(n_stations)],
+        'lat': rng.uniform(*LAT_RANGE, n_stations).round(2),
+        'lon': rng.uniform(*LON_RANGE, n_stations).round(2),
+        'weight': rng.lognormal(0.0, 1.0, n_stations).round(3),  # "population"
+        'region': "US48",
+    })
+
+
+def generate_weather(hours, stations, seed=0):
+    """
+    Température (heures x stations) : moyenne selon la latitude, saison
+    annuelle, cycle journalier décalé selon la longitude, bruit AR(1).
+    """
+    rng = np.random.default_rng(seed + 1)
+    n, m = len(hours), len(stations)
+    lat = stations['lat'].to_numpy()
+    lon = stations['lon'].to_numpy()
+
+    day_of_year = hours.dayofyear.to_numpy()[:, None]
+    # Heure solaire locale approximative (UTC + longitude/15)
+    local_hour = (hours.hour.to_numpy()[:, None] + lon[None, :] / 15.0) % 24
+
+    mean = 30.0 - 0.55 * (lat - 25.0)
+    seasonal = (8.0 + 0.3 * (lat - 25.0)) * -np.cos(2 * np.pi * (day_of_year - 15) / 365.25)
+    daily = 5.0 * np.cos(2 * np.pi * (local_hour - 15) / 24)
+
+    # Bruit AR(1), vectorisé sur les stations : e[t] = 0.95 e[t-1] + eps
+    eps = rng.normal(0, 0.6, (n, m))
+    noise = np.empty_like(eps)
+    noise[0] = eps[0]
+    for t in range(1, n):
+        noise[t] = 0.95 * noise[t - 1] + eps[t]
+
+    return (mean[None, :] + seasonal + daily + noise).astype(np.float32)
+
+
+def generate_load(hours, temperature, weights, seed=0, missing_rate=0.001):
+    """
+    Consommation horaire : profil journalier, creux du week-end, et effet
+    en U de la température pondérée (chauffage + climatisation).
+    """
+    rng = np.random.default_rng(seed + 2)
+    weights = np.asarray(weights, dtype=np.float64)
+    temp_index = temperature @ (weights / weights.sum())
+
+    hour = hours.hour.to_numpy()
+    weekend = hours.dayofweek.to_numpy() >= 5
+    daily = 60_000 * np.sin(2 * np.pi * (hour - 10) / 24)
+    heating = 9_000 * np.maximum(16 - temp_index, 0)
+    cooling = 14_000 * np.maximum(temp_index - 20, 0)
+
+    demand = 420_000 + daily - 35_000 * weekend + heating + cooling + rng.normal(0, 6_000, len(hours))
+    demand = demand.round()
+    demand[rng.random(len(hours)) < missing_rate] = np.nan
+    return demand
+
+
+def region_stations(stations, n_regions):
+    """
+    Lignes de config supplémentaires : la station j compte aussi dans la
+    région R<j % (n_regions - 1)> (une région = un respondent synthétique).
+    """
+    if n_regions <= 1:
+        return stations.iloc[:0]
+    extra = stations.copy()
+    extra['region'] = [f"R{j % (n_regions - 1):02d}" for j in range(len(stations))]
+    return extra
+
+
+def write_raw_inputs(root, years=2, n_stations=3, seed=0, end=END_DATE, n_regions=1):
+    """
+    Écrit sous `root` : le CSV brut EIA, un weather_<station>.csv par
+    station et le fichier de config des stations.
+    n_regions > 1 : US48 plus n_regions - 1 respondents régionaux, chacun
+    piloté par la météo de ses propres stations.
+    """
+    end = pd.Timestamp(end)
+    start = end - pd.DateOffset(years=years)
+    hours = pd.date_range(start, end, freq='h', inclusive='left')
+
+    stations = generate_stations(n_stations, seed)
+    temperature = generate_weather(hours, stations, seed)
+    regions = region_stations(stations, n_regions)
+    series = {"US48": generate_load(hours, temperature, stations['weight'], seed)}
+    for i, (region, members) in enumerate(regions.groupby('region', sort=True)):
+        # Demande régionale : même forme, à l'échelle d'une balancing authority
+        scale = 0.02 + 0.2 * np.random.default_rng(seed + 10 + i).random()
+        series[region] = (generate_load(hours, temperature[:, members.index], members['weight'], seed + 10 + i)
+                          * scale).round()
+
+    os.makedirs(os.path.join(root, os.path.dirname(STATIONS_FILE)), exist_ok=True)
+    pd.concat([stations, regions], ignore_index=True).to_csv(os.path.join(root, STATIONS_FILE), index=False)
+
+    # Même colonnes et même ordre que les lignes renvoyées par l'API EIA v2
+    load_path = os.path.join(root, LOAD_FILE)
+    os.makedirs(os.path.dirname(load_path), exist_ok=True)
+    pd.DataFrame({
+        'period': np.tile(hours.strftime("%Y-%m-%dT%H"), len(series)),
+        'respondent': np.repeat(list(series), len(hours)),
+        'respondent-name': np.repeat([f"Synthetic {r}" if r != "US48" else "United States Lower 48"
+                                      for r in series], len(hours)),
+        'type': "D",
+        'type-name': "Demand",
+        'value': pd.array(np.concatenate(list(series.values())), dtype="Int64"),
+        'value-units': "megawatthours",
+    }).to_csv(load_path, index=False)
+
+    weather_dir = os.path.join(root, WEATHER_DIR)
+    os.makedirs(weather_dir, exist_ok=True)
+    times = hours.strftime("%Y-%m-%dT%H:%M")
+    for j, name in enumerate(stations['name']):
+        pd.DataFrame({
+            'time': times,
+            'temperature_c': temperature[:, j].round(1),
+            'city': name,
+        }).to_csv(os.path.join(weather_dir, f"weather_{name}.csv"), index=False)
+
+    print(f"🧪 Données synthétiques : {len(hours)} heures, {n_stations} stations, "
+          f"{len(series)} respondents -> {root}")
+    return {'hours': len(hours), 'stations': n_stations, 'regions': len(series)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère des données brutes synthétiques.")
+    # Pas de valeur par défaut : on ne veut pas écraser config/stations.csv par erreur
+    parser.add_argument("--root", required=True, help="Dossier où écrire data_raw/ et config/")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--stations", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--regions", type=int, default=1, help="Nombre de respondents (US48 compris)")
+    args = parser.parse_args()
+    write_raw_inputs(args.root, args.years, args.stations, args.seed, n_regions=args.regions)
@@ -1,97 +1,509 @@
-import pandas as pd
-import numpy as np
-import xgboost as xgb
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-import matplotlib.pyplot as plt
-import joblib  # Pour sauvegarder le modèle
-
-# --- CONFIGURATION ---
-INPUT_FILE = "data_processed/energy_dataset_features.parquet"
-MODEL_PATH = "pipeline/model_xgboost.pkl"
-
-# Date de coupure : On s'entraîne sur tout avant, on teste sur tout après
-# On garde les 2 derniers mois pour le test (Novembre-Décembre 2023 si tu as des données jusqu'à 2024)
-SPLIT_DATE = "2023-11-01" 
-
-def train_forecasting_model():
-    print("🧠 Chargement des données...")
-    df = pd.read_parquet(INPUT_FILE)
-    
-    # On définit nos variables
-    target = 'demand_mwh' # Ce qu'on veut prédire
-    
-    # On enlève la target et les colonnes de dates (la machine ne comprend pas "2023-01-01")
-    # On garde toutes les features numériques créées
-    features = [col for col in df.columns if col not in ['datetime_utc', 'demand_mwh']]
-    
-    print(f"   Features utilisées ({len(features)}) : {features}")
-    
-    # 1. SPLIT TRAIN / TEST (Chronologique)
-    print(f"✂️  Découpage Train/Test à la date : {SPLIT_DATE}")
-    train = df[df['datetime_utc'] < SPLIT_DATE].copy()
-    test = df[df['datetime_utc'] >= SPLIT_DATE].copy()
-    
-    print(f"   Train set : {train.shape[0]} heures")
-    print(f"   Test set  : {test.shape[0]} heures")
-    
-    X_train, y_train = train[features], train[target]
-    X_test, y_test = test[features], test[target]
-    
-    # 2. ENTRAINEMENT (XGBoost)
-    print("🔥 Entraînement du modèle XGBoost...")
-    model = xgb.XGBRegressor(
-        n_estimators=1000,    # Nombre d'arbres
-        learning_rate=0.05,   # Vitesse d'apprentissage (plus petit = plus précis mais plus lent)
-        max_depth=5,          # Profondeur des arbres
-        early_stopping_rounds=50, # Arrête si ça ne s'améliore plus
-        n_jobs=-1             # Utilise tous les coeurs du processeur
-    )
-    
-    # On lui donne le test set pour qu'il surveille la qualité pendant l'entraînement (eval_set)
-    model.fit(
-        X_train, y_train,
-        eval_set=[(X_train, y_train), (X_test, y_test)],
-        verbose=100 # Affiche le progrès toutes les 100 itérations
-    )
-    
-    # 3. PREDICTION & EVALUATION
-    print("🔮 Prédictions sur le Test Set...")
-    predictions = model.predict(X_test)
-    
-    # Métriques
-    mae = mean_absolute_error(y_test, predictions)
-    mape = np.mean(np.abs((y_test - predictions) / y_test)) * 100
-    
-    print("\n" + "="*30)
-    print("📊 RÉSULTATS DU MODÈLE")
-    print("="*30)
-    print(f"   MAE (Erreur Moyenne Absolue) : {mae:.2f} MWh")
-    print(f"   MAPE (Erreur Pourcentage)    : {mape:.2f} %")
-    print("="*30)
-    
-    if mape < 5:
-        print("✅ EXCELLENT RÉSULTAT (< 5%) !")
-    elif mape < 10:
-        print("✅ Bon résultat (< 10%).")
-    else:
-        print("⚠️ Résultat moyen.")
-
-    # 4. Feature Importance (Qu'est-ce qui a le plus compté ?)
-    importance = pd.DataFrame({
-        'feature': features,
-        'importance': model.feature_importances_
-    }).sort_values('importance', ascending=False)
-    
-    print("\n🏆 Top 5 Features les plus importantes :")
-    print(importance.head(5))
-    
-    # 5. Sauvegarde
-    joblib.dump(model, MODEL_PATH)
-    print(f"\n💾 Modèle sauvegardé sous : {MODEL_PATH}")
-
-    # Petit bonus : Ajout des prédictions dans le DataFrame test pour analyse future
-    test['prediction'] = predictions
-    test.to_csv("data_processed/test_predictions.csv", index=False)
-
-if __name__ == "__main__":
-    train_forecasting_model()
\ No newline at end of file
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+import xgboost as xgb
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+import matplotlib.pyplot as plt
+
+from feature_engineering import FEATURE_SPEC
+from instrumentation import current, instrumented, span
+from metrics_cube import CUBE_DIR, build_cube, save_cube
+from model_registry import data_fingerprint, register_model, update_fingerprint
+from prediction_store import write_predictions
+from process_load_data import OPTIONAL_COLUMNS, respondent_dir
+from storage import dataset_columns, iter_batches, list_partitions, open_dataset, read_dataset
+
+# --- CONFIGURATION ---
+INPUT_FILE = "data_processed/features"
+TARGET = 'demand_mwh'
+TRAIN_RESPONDENT = "US48"  # Région modélisée : seule sa partition respondent= est lue
+# Jamais utilisées comme features : la production nette de l'heure (connue
+# en même temps que la demande, fuite) et la prévision EIA (absente au service)
+EXCLUDED_COLUMNS = ['datetime_utc', TARGET] + OPTIONAL_COLUMNS
+# Les prédictions vont dans le store Parquet (prediction_store.py). Export CSV
+# complet du test set (features + prédiction) seulement pour analyse ad hoc
+EXPORT_TEST_CSV = False
+PREDICTIONS_FILE = "data_processed/test_predictions.csv"
+
+# Date de coupure : On s'entraîne sur tout avant, on teste sur tout après
+# On garde les 2 derniers mois pour le test (Novembre-Décembre 2023 si tu as des données jusqu'à 2024)
+SPLIT_DATE = "2023-11-01" 
+
+# Entraînement hors mémoire (--out-of-core) : les partitions de features
+# sont lues par lots et quantifiées au fil de l'eau, sans DataFrame complet
+OOC_BATCH_ROWS = 65536
+EXTERNAL_MEMORY = False   # True : pages quantifiées sur disque plutôt qu'en RAM
+EXTERNAL_CACHE_DIR = "data_processed/xgb_cache"
+
+# Hyperparamètres partagés par l'entraînement final et le backtest
+XGB_PARAMS = {
+    'n_estimators': 1000,    # Nombre d'arbres
+    'learning_rate': 0.05,   # Vitesse d'apprentissage (plus petit = plus précis mais plus lent)
+    'max_depth': 5,          # Profondeur des arbres
+}
+EARLY_STOPPING_ROUNDS = 50   # Arrête si ça ne s'améliore plus
+
+# Paramètres trouvés par tune_model.py : utilisés à la place de XGB_PARAMS
+# seulement si USE_TUNED_PARAMS est activé (choix explicite, pas implicite)
+TUNED_PARAMS_FILE = "data_processed/best_params.json"
+USE_TUNED_PARAMS = False
+
+# Backtest walk-forward : un fold par mois, sur les derniers mois complets
+BACKTEST_FILE = "data_processed/backtest_results.csv"
+BACKTEST_FOLDS = 12
+BACKTEST_WINDOW = "expanding"   # "expanding" (tout l'historique) ou "sliding"
+SLIDING_TRAIN_MONTHS = 12       # Taille de la fenêtre d'entraînement en mode sliding
+MIN_TRAIN_MONTHS = 3            # Folds sautés si l'historique est plus court
+VALIDATION_DAYS = 14            # Fin de la fenêtre d'entraînement réservée à l'early stopping
+BACKTEST_WORKERS = None         # Nombre de folds en parallèle (défaut : nombre de coeurs)
+
+def load_training_data(respondent=TRAIN_RESPONDENT):
+    df = read_dataset(respondent_dir(INPUT_FILE, respondent)).sort_values('datetime_utc').reset_index(drop=True)
+    # On enlève la target et les colonnes de dates (la machine ne comprend pas "2023-01-01")
+    # On garde toutes les features numériques créées
+    features = [col for col in df.columns if col not in EXCLUDED_COLUMNS]
+    return df, features
+
+def dataset_fingerprint(path, columns):
+    """
+    Empreinte du dataset d'un respondent, mois par mois dans l'ordre des
+    dates : la même que data_fingerprint(df[columns]) sur la table entière
+    triée (load_training_data), sans jamais la charger en entier.
+    """
+    digest = None
+    for (year, month), _ in list_partitions(path):
+        start = pd.Timestamp(year=year, month=month, day=1)
+        part = read_dataset(path, start=start, end=start + pd.DateOffset(months=1), columns=columns)
+        digest = update_fingerprint(digest, part.sort_values('datetime_utc', ignore_index=True))
+    return digest.hexdigest() if digest is not None else None
+
+class FeatureBatches(xgb.DataIter):
+    """
+    Lots Parquet d'une plage [start, end) des features d'un respondent,
+    donnés un par un à XGBoost (qui peut parcourir l'itérateur plusieurs
+    fois). La plage est un filtre de partitions year=/month= : les mois
+    hors plage ne sont jamais ouverts. Chaque passage met aussi à jour le
+    nombre de lignes et les bornes de dates.
+    """
+
+    def __init__(self, path, features, start=None, end=None, batch_rows=OOC_BATCH_ROWS, cache_prefix=None):
+        self.path, self.features = path, features
+        self.start, self.end, self.batch_rows = start, end, batch_rows
+        self.columns = ['datetime_utc', TARGET] + features
+        self._batches = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def batches(self):
+        return iter_batches(self.path, self.start, self.end, columns=self.columns, batch_rows=self.batch_rows)
+
+    def reset(self):
+        self._batches = None
+
+    def next(self, input_data):
+        if self._batches is None:
+            self._batches = self.batches()
+            self.rows, self.first, self.last = 0, None, None
+        batch = next(self._batches, None)
+        if batch is None:
+            return False
+        times = batch['datetime_utc']
+        self.rows += len(batch)
+        self.first = times.min() if self.first is None else min(self.first, times.min())
+        self.last = times.max() if self.last is None else max(self.last, times.max())
+        input_data(data=batch[self.features].to_numpy(dtype=np.float32),
+                   label=batch[TARGET].to_numpy(dtype=np.float32), feature_names=self.features)
+        return True
+
+def feature_importance(booster, features):
+    """
+    Gain de chaque feature, normalisé (comme XGBRegressor.feature_importances_).
+    """
+    scores = booster.get_score(importance_type='gain')
+    gains = np.array([scores.get(f, 0.0) for f in features], dtype=np.float32)
+    return pd.DataFrame({
+        'feature': features,
+        'importance': gains / gains.sum() if gains.sum() > 0 else gains,
+    }).sort_values('importance', ascending=False)
+
+def model_params():
+    """
+    Hyperparamètres du modèle : XGB_PARAMS, remplacés par le résultat de
+    la recherche (tune_model.py) si USE_TUNED_PARAMS est activé et que le
+    fichier existe. La source utilisée est toujours affichée.
+    """
+    params = dict(XGB_PARAMS)
+    if USE_TUNED_PARAMS and os.path.exists(TUNED_PARAMS_FILE):
+        with open(TUNED_PARAMS_FILE) as f:
+            params.update(json.load(f))
+        print(f"   Paramètres issus de la recherche : {TUNED_PARAMS_FILE}")
+    elif USE_TUNED_PARAMS:
+        print(f"   Paramètres par défaut (XGB_PARAMS) : {TUNED_PARAMS_FILE} introuvable")
+    else:
+        print("   Paramètres par défaut (XGB_PARAMS, USE_TUNED_PARAMS désactivé)")
+    return params
+
+@instrumented("train")
+def train_forecasting_model():
+    print("🧠 Chargement des données...")
+    df, features = load_training_data()
+    current().rows(rows_in=len(df))
+    
+    # On définit nos variables
+    target = TARGET # Ce qu'on veut prédire
+    
+    print(f"   Features utilisées ({len(features)}) : {features}")
+    
+    # 1. SPLIT TRAIN / TEST (Chronologique)
+    print(f"✂️  Découpage Train/Test à la date : {SPLIT_DATE}")
+    train = df[df['datetime_utc'] < SPLIT_DATE].copy()
+    test = df[df['datetime_utc'] >= SPLIT_DATE].copy()
+    
+    print(f"   Train set : {train.shape[0]} heures")
+    print(f"   Test set  : {test.shape[0]} heures")
+    
+    X_train, y_train = train[features], train[target]
+    X_test, y_test = test[features], test[target]
+    
+    # 2. ENTRAINEMENT (XGBoost)
+    print("🔥 Entraînement du modèle XGBoost...")
+    params = model_params()
+    model = xgb.XGBRegressor(
+        **params,
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+        n_jobs=-1             # Utilise tous les coeurs du processeur
+    )
+    
+    # On lui donne le test set pour qu'il surveille la qualité pendant l'entraînement (eval_set)
+    with span("train.fit", features=len(features)) as s:
+        model.fit(
+            X_train, y_train,
+            eval_set=[(X_train, y_train), (X_test, y_test)],
+            verbose=100 # Affiche le progrès toutes les 100 itérations
+        )
+        s.rows(rows_in=len(X_train))
+    
+    # 3. PREDICTION & EVALUATION
+    print("🔮 Prédictions sur le Test Set...")
+    with span("train.predict") as s:
+        predictions = model.predict(X_test)
+        s.rows(rows_in=len(X_test), rows_out=len(predictions))
+    
+    mae, mape = print_metrics(y_test, predictions)
+
+    # 4. Feature Importance (Qu'est-ce qui a le plus compté ?)
+    importance = feature_importance(model.get_booster(), features)
+    print("\n🏆 Top 5 Features les plus importantes :")
+    print(importance.head(5))
+    
+    # 5. Sauvegarde : format natif XGBoost + schéma des features dans le registre
+    test['prediction'] = predictions
+    save_training_run(
+        model.get_booster(), X_train, test, params, model.best_iteration,
+        training_range=[str(train['datetime_utc'].min()), str(train['datetime_utc'].max())],
+        test_range=[str(test['datetime_utc'].min()), str(test['datetime_utc'].max())],
+        metrics={'mae': float(mae), 'mape': float(mape)},
+        fingerprint=data_fingerprint(df[['datetime_utc', target] + features]),
+    )
+    if EXPORT_TEST_CSV:
+        test.to_csv(PREDICTIONS_FILE, index=False)
+
+def print_metrics(y_test, predictions):
+    mae = mean_absolute_error(y_test, predictions)
+    mape = np.mean(np.abs((y_test - predictions) / y_test)) * 100
+    
+    print("\n" + "="*30)
+    print("📊 RÉSULTATS DU MODÈLE")
+    print("="*30)
+    print(f"   MAE (Erreur Moyenne Absolue) : {mae:.2f} MWh")
+    print(f"   MAPE (Erreur Pourcentage)    : {mape:.2f} %")
+    print("="*30)
+    
+    if mape < 5:
+        print("✅ EXCELLENT RÉSULTAT (< 5%) !")
+    elif mape < 10:
+        print("✅ Bon résultat (< 10%).")
+    else:
+        print("⚠️ Résultat moyen.")
+    return mae, mape
+
+def save_training_run(booster, X_train, test, params, best_iteration, training_range, test_range,
+                      metrics, fingerprint):
+    """
+    Enregistre le modèle dans le registre (X_train ne sert qu'au schéma des
+    features), puis ses prédictions du test set (datetime_utc, demand_mwh,
+    prediction) dans le store et le cube de métriques.
+    """
+    if best_iteration is not None:
+        # Le modèle enregistré prédit comme model.predict (arbres après l'arrêt exclus)
+        booster = booster[: best_iteration + 1]
+    version = register_model(
+        booster, X_train,
+        target=TARGET,
+        respondent=TRAIN_RESPONDENT,
+        training_range=training_range,
+        test_range=test_range,
+        metrics=metrics,
+        params=params,
+        best_iteration=best_iteration,
+        feature_spec=FEATURE_SPEC,
+        data_fingerprint=fingerprint,
+    )
+    print(f"\n💾 Modèle enregistré : version {version}")
+
+    # Prédictions du test set, ajoutées au store sous la version du modèle
+    write_predictions(pd.DataFrame({'target_time': test['datetime_utc'], 'actual': test[TARGET],
+                                    'prediction': test['prediction']}), version, run="test")
+    # Agrégats journaliers/mensuels pour les KPIs du dashboard
+    save_cube(build_cube(test), os.path.join(CUBE_DIR, version))
+    return version
+
+@instrumented("train")
+def train_out_of_core(external_memory=EXTERNAL_MEMORY, batch_rows=OOC_BATCH_ROWS):
+    """
+    Même modèle que train_forecasting_model, sans jamais charger la table
+    de features : train et test sont des filtres de partitions, lus par
+    lots par un itérateur XGBoost et quantifiés au fil de l'eau. La
+    mémoire reste bornée par un lot + la matrice quantifiée (sur disque
+    avec external_memory).
+    """
+    path = respondent_dir(INPUT_FILE, TRAIN_RESPONDENT)
+    features = [c for c in dataset_columns(path) if c not in EXCLUDED_COLUMNS]
+    print(f"🧠 Entraînement hors mémoire (lots de {batch_rows} lignes"
+          f"{', pages sur disque' if external_memory else ''})...")
+    print(f"   Features utilisées ({len(features)}) : {features}")
+    print(f"✂️  Découpage Train/Test à la date : {SPLIT_DATE} (filtre de partitions)")
+
+    params = model_params()
+    tree_params = {k: v for k, v in params.items() if k != 'n_estimators'}
+    max_bin = params.get('max_bin', 256)
+    if external_memory:
+        os.makedirs(EXTERNAL_CACHE_DIR, exist_ok=True)
+        cache = lambda name: os.path.join(EXTERNAL_CACHE_DIR, name)
+        train_it = FeatureBatches(path, features, end=SPLIT_DATE, batch_rows=batch_rows, cache_prefix=cache("train"))
+        test_it = FeatureBatches(path, features, start=SPLIT_DATE, batch_rows=batch_rows, cache_prefix=cache("test"))
+        matrix = xgb.ExtMemQuantileDMatrix
+    else:
+        train_it = FeatureBatches(path, features, end=SPLIT_DATE, batch_rows=batch_rows)
+        test_it = FeatureBatches(path, features, start=SPLIT_DATE, batch_rows=batch_rows)
+        matrix = xgb.QuantileDMatrix
+
+    with span("train.quantize", external_memory=external_memory) as s:
+        dtrain = matrix(train_it, max_bin=max_bin)
+        dtest = matrix(test_it, max_bin=max_bin, ref=dtrain)
+        s.rows(rows_in=train_it.rows + test_it.rows)
+    print(f"   Train set : {train_it.rows} heures")
+    print(f"   Test set  : {test_it.rows} heures")
+    current().rows(rows_in=train_it.rows + test_it.rows)
+
+    print("🔥 Entraînement du modèle XGBoost...")
+    with span("train.fit", features=len(features)) as s:
+        booster = xgb.train(
+            {**tree_params, 'objective': 'reg:squarederror', 'nthread': os.cpu_count()},
+            dtrain, num_boost_round=params['n_estimators'],
+            evals=[(dtrain, 'validation_0'), (dtest, 'validation_1')],
+            early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=100,
+        )
+        s.rows(rows_in=train_it.rows)
+
+    # Prédictions par lots : seules la date, la cible et la prédiction sont gardées
+    print("🔮 Prédictions sur le Test Set...")
+    with span("train.predict") as s:
+        parts = []
+        for batch in test_it.batches():
+            X = batch[features].to_numpy(dtype=np.float32)
+            parts.append(pd.DataFrame({
+                'datetime_utc': batch['datetime_utc'].to_numpy(),
+                TARGET: batch[TARGET].to_numpy(),
+                'prediction': booster.inplace_predict(X, iteration_range=(0, booster.best_iteration + 1)),
+            }))
+        test = pd.concat(parts, ignore_index=True).sort_values('datetime_utc', ignore_index=True)
+        s.rows(rows_in=len(test), rows_out=len(test))
+    mae, mape = print_metrics(test[TARGET], test['prediction'])
+
+    importance = feature_importance(booster, features)
+    print("\n🏆 Top 5 Features les plus importantes :")
+    print(importance.head(5))
+
+    # Schéma des features (noms, types) sans données, pour le registre
+    schema = open_dataset(path).schema.empty_table().to_pandas()[features]
+    save_training_run(
+        booster, schema, test, params, booster.best_iteration,
+        training_range=[str(train_it.first), str(train_it.last)],
+        test_range=[str(test_it.first), str(test_it.last)],
+        metrics={'mae': float(mae), 'mape': float(mape)},
+        # Mêmes lignes (train + test) et colonnes que train_forecasting_model
+        fingerprint=dataset_fingerprint(path, ['datetime_utc', TARGET] + features),
+    )
+
+# Données partagées avec les process du backtest : remplies avant la
+# création du pool et héritées par fork, sans copie ni sérialisation
+_BACKTEST_DATA = {}
+
+def walk_forward_folds(timestamps, n_folds=BACKTEST_FOLDS, window=BACKTEST_WINDOW,
+                       sliding_months=SLIDING_TRAIN_MONTHS, min_train_months=MIN_TRAIN_MONTHS,
+                       validation_days=VALIDATION_DAYS):
+    """
+    Découpe les `n_folds` derniers mois complets en folds de test d'un mois.
+    Chaque fold est décrit par des bornes de lignes (données triées par
+    date) : [train_start, valid_start) entraînement, [valid_start,
+    test_start) validation pour l'early stopping, [test_start, test_end) test.
+    """
+    timestamps = np.asarray(timestamps, dtype='datetime64[ns]')
+    first = pd.Timestamp(timestamps[0])
+    # Mois complets uniquement : le dernier mois partiel n'est pas testé
+    last = (pd.Timestamp(timestamps[-1]) + pd.Timedelta(hours=1)).to_period('M').to_timestamp()
+    month_starts = pd.date_range(end=last, periods=n_folds + 1, freq='MS')
+
+    folds = []
+    for test_start, test_end in zip(month_starts[:-1], month_starts[1:]):
+        if window == "sliding":
+            train_start = max(first, test_start - pd.DateOffset(months=sliding_months))
+        else:
+            train_start = first
+        if train_start + pd.DateOffset(months=min_train_months) > test_start:
+            continue
+        valid_start = test_start - pd.Timedelta(days=validation_days)
+        bounds = np.searchsorted(timestamps, np.array([train_start, valid_start, test_start, test_end],
+                                                      dtype='datetime64[ns]'))
+        folds.append({
+            'test_month': test_start.strftime("%Y-%m"),
+            'train_start': int(bounds[0]), 'valid_start': int(bounds[1]),
+            'test_start': int(bounds[2]), 'test_end': int(bounds[3]),
+        })
+    return folds
+
+def backtest_reference(X, y, folds, nthread):
+    """
+    Matrice de référence des quantiles : seulement les lignes antérieures
+    au premier mois testé, pour qu'aucun fold ne soit quantifié avec la
+    distribution de mois futurs.
+    """
+    history = slice(0, min(f['test_start'] for f in folds))
+    return xgb.QuantileDMatrix(X[history], y[history], nthread=nthread)
+
+def _init_backtest_worker(X, y, folds, nthread):
+    # Sans fork (Windows, macOS), chaque process reconstruit les données une fois
+    if 'reference' not in _BACKTEST_DATA:
+        _BACKTEST_DATA.update(X=X, y=y, reference=backtest_reference(X, y, folds, nthread))
+
+def run_fold(fold, params, nthread):
+    """
+    Entraîne et évalue un fold. Les matrices du fold sont des tranches du
+    tableau partagé, quantifiées avec les seuils de la matrice de
+    référence (pas de recalcul des quantiles par fold).
+    """
+    X, y, reference = _BACKTEST_DATA['X'], _BACKTEST_DATA['y'], _BACKTEST_DATA['reference']
+    train = slice(fold['train_start'], fold['valid_start'])
+    valid = slice(fold['valid_start'], fold['test_start'])
+    test = slice(fold['test_start'], fold['test_end'])
+
+    with span("backtest.fold", test_month=fold['test_month'], nthread=nthread) as s:
+        start = time.perf_counter()
+        dtrain = xgb.QuantileDMatrix(X[train], y[train], ref=reference, nthread=nthread)
+        dvalid = xgb.QuantileDMatrix(X[valid], y[valid], ref=dtrain, nthread=nthread)
+        tree_params = {k: v for k, v in params.items() if k != 'n_estimators'}
+        booster = xgb.train(
+            {**tree_params, 'objective': 'reg:squarederror', 'nthread': nthread},
+            dtrain, num_boost_round=params['n_estimators'],
+            evals=[(dvalid, 'valid')], early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False,
+        )
+        predictions = booster.inplace_predict(X[test], iteration_range=(0, booster.best_iteration + 1))
+        s.rows(rows_in=train.stop - train.start, rows_out=len(predictions))
+
+    y_test = y[test].astype(np.float64)
+    return {
+        'test_month': fold['test_month'],
+        'train_rows': train.stop - train.start,
+        'test_rows': test.stop - test.start,
+        'best_iteration': booster.best_iteration,
+        'mae': mean_absolute_error(y_test, predictions),
+        'mape': np.mean(np.abs((y_test - predictions) / y_test)) * 100,
+        'fit_s': round(time.perf_counter() - start, 2),
+        'predictions': predictions,
+    }
+
+@instrumented("backtest")
+def backtest_model(window=BACKTEST_WINDOW, n_folds=BACKTEST_FOLDS, workers=BACKTEST_WORKERS):
+    """
+    Backtest walk-forward : les folds mensuels tournent en parallèle, chacun
+    avec une part des coeurs (nthread = coeurs / workers) pour ne pas
+    surcharger la machine comme le ferait n_jobs=-1 dans chaque process.
+    """
+    print(f"🧪 Backtest walk-forward ({window}, {n_folds} mois)...")
+    df, features = load_training_data()
+    folds = walk_forward_folds(df['datetime_utc'], n_folds, window)
+    if not folds:
+        print("⚠️ Historique trop court pour le backtest.")
+        return None
+
+    cpus = os.cpu_count() or 1
+    workers = min(workers or cpus, len(folds))
+    nthread = max(1, cpus // workers)
+    print(f"   {len(folds)} folds, {workers} process x {nthread} thread(s)")
+
+    # Matrice float32 construite une seule fois, quantiles calculés une fois
+    # (sur l'historique d'avant le premier fold testé)
+    X = df[features].to_numpy(dtype=np.float32)
+    y = df[TARGET].to_numpy(dtype=np.float32)
+    current().rows(rows_in=len(df))
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    if context.get_start_method() == "fork":
+        # Un seul thread avant le fork : le pool de threads OpenMP n'est pas
+        # démarré dans le parent (les process fils ne peuvent pas en hériter
+        # sans risque de blocage) ; les folds utilisent leurs nthread ensuite
+        _BACKTEST_DATA.update(X=X, y=y, reference=backtest_reference(X, y, folds, nthread=1))
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_backtest_worker, initargs=(X, y, folds, nthread)) as pool:
+        params = model_params()
+        rows = list(pool.map(run_fold, folds, [params] * len(folds), [nthread] * len(folds)))
+    _BACKTEST_DATA.clear()
+
+    # Prédictions de tous les folds dans le store, sous une version propre au backtest
+    run_version = f"backtest-{window}-{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}"
+    test_rows = np.concatenate([np.arange(f['test_start'], f['test_end']) for f in folds])
+    backtest = pd.DataFrame({
+        'datetime_utc': df['datetime_utc'].to_numpy()[test_rows],
+        'demand_mwh': y[test_rows],
+        'prediction': np.concatenate([row.pop('predictions') for row in rows]),
+    })
+    write_predictions(backtest.rename(columns={'datetime_utc': 'target_time', 'demand_mwh': 'actual'}),
+                      run_version, run="backtest")
+    save_cube(build_cube(backtest), os.path.join(CUBE_DIR, run_version))
+
+    results = pd.DataFrame(rows)
+    results.insert(0, 'window', window)
+    results.insert(1, 'run_version', run_version)
+    results.to_csv(BACKTEST_FILE, index=False)
+
+    print(results[['test_month', 'train_rows', 'best_iteration', 'mae', 'mape']].to_string(index=False))
+    print(f"📊 MAPE moyen : {results['mape'].mean():.2f} % (écart-type {results['mape'].std():.2f}), "
+          f"MAE moyen : {results['mae'].mean():.2f} MWh")
+    print(f"✅ Résultats du backtest sauvegardés : {BACKTEST_FILE}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entraîne le modèle ou lance un backtest walk-forward.")
+    parser.add_argument("--backtest", action="store_true", help="Backtest mensuel au lieu de l'entraînement")
+    parser.add_argument("--window", choices=["expanding", "sliding"], default=BACKTEST_WINDOW)
+    parser.add_argument("--folds", type=int, default=BACKTEST_FOLDS, help="Nombre de mois testés")
+    parser.add_argument("--workers", type=int, default=BACKTEST_WORKERS, help="Folds en parallèle")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="Entraînement par lots Parquet, sans charger la table de features")
+    parser.add_argument("--external-memory", action="store_true",
+                        help="Avec --out-of-core : matrice quantifiée sur disque (EXTERNAL_CACHE_DIR)")
+    parser.add_argument("--batch-rows", type=int, default=OOC_BATCH_ROWS)
+    args = parser.parse_args()
+    if args.backtest:
+        backtest_model(args.window, args.folds, args.workers)
+    elif args.out_of_core or args.external_memory:
+        train_out_of_core(args.external_memory or EXTERNAL_MEMORY, args.batch_rows)
+    else:
+        train_forecasting_model()
\ No newline at end of file
@@ -0,0 +1,283 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import ExitStack
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from instrumentation import instrumented, span
+from model_registry import data_fingerprint
+from train_model import SPLIT_DATE, TARGET, TUNED_PARAMS_FILE, load_training_data
+
+# Recherche d'hyperparamètres par successive halving : beaucoup de
+# configurations tirées au hasard sont entraînées avec peu d'arbres, seul
+# le meilleur tiers passe à l'étape suivante avec 3x plus d'arbres, etc.
+# La validation se fait sur les mois qui précèdent SPLIT_DATE : le test
+# set de train_model.py n'est jamais utilisé pour choisir les paramètres.
+
+# --- CONFIGURATION ---
+TRIALS_FILE = "data_processed/tuning_trials.jsonl"  # Un essai terminé par ligne (reprise)
+N_TRIALS = 27           # Configurations tirées au départ
+ETA = 3                 # Facteur de réduction entre deux étapes
+MIN_ROUNDS = 100        # Arbres à la première étape
+MAX_ROUNDS = 1000       # Arbres au maximum (n_estimators de train_model)
+EARLY_STOPPING_ROUNDS = 50
+VALIDATION_MONTHS = 2   # Mois avant SPLIT_DATE utilisés pour la validation
+TIME_BUDGET_S = 3600    # Budget en temps mur de toute la recherche
+TUNE_WORKERS = None     # Essais en parallèle (défaut : nombre de coeurs)
+SEED = 42
+
+# Espace de recherche : (type, min, max) ; "log" = tirage uniforme en échelle log
+SEARCH_SPACE = {
+    'max_depth': ("int", 3, 10),
+    'learning_rate': ("log", 0.01, 0.3),
+    'subsample': ("float", 0.5, 1.0),
+    'colsample_bytree': ("float", 0.5, 1.0),
+    'min_child_weight': ("log", 1.0, 100.0),
+    'reg_lambda': ("log", 0.1, 100.0),
+    'reg_alpha': ("log", 0.001, 10.0),
+}
+
+# Matrices partagées avec les process : construites avant le pool et
+# héritées par fork (le binning des quantiles n'est fait qu'une fois).
+# Construites sur un seul thread : OpenMP ne doit pas avoir démarré son
+# pool de threads dans le parent avant le fork (blocage possible des fils)
+_TUNING_DATA = {}
+
+
+def sample_params(trial, seed=SEED):
+    """
+    Configuration de l'essai `trial`, reproductible : une reprise retrouve
+    exactement les mêmes configurations.
+    """
+    rng = np.random.default_rng([seed, trial])
+    params = {}
+    for name, (kind, low, high) in SEARCH_SPACE.items():
+        if kind == "int":
+            params[name] = int(rng.integers(low, high + 1))
+        elif kind == "log":
+            params[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        else:
+            params[name] = float(rng.uniform(low, high))
+    return params
+
+
+def rung_rounds(min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS, eta=ETA):
+    """
+    Nombre d'arbres de chaque étape : 100, 300, 900 avec les valeurs par défaut.
+    """
+    rounds = []
+    while min_rounds <= max_rounds:
+        rounds.append(min_rounds)
+        min_rounds *= eta
+    return rounds
+
+
+def search_settings(df, features, validation_months=VALIDATION_MONTHS):
+    """
+    Tout ce dont dépend le score d'un essai, hors paramètres : données,
+    validation et nombre d'arbres. Un essai sauvegardé n'est repris que si
+    ces réglages sont identiques.
+    """
+    return {
+        'data_fingerprint': data_fingerprint(df[['datetime_utc', TARGET] + features]),
+        'split_date': SPLIT_DATE,
+        'validation_months': validation_months,
+        'min_rounds': MIN_ROUNDS,
+        'max_rounds': MAX_ROUNDS,
+        'eta': ETA,
+        'early_stopping_rounds': EARLY_STOPPING_ROUNDS,
+    }
+
+
+def tuning_data():
+    """
+    Historique utilisable par la recherche : tout ce qui précède SPLIT_DATE.
+    """
+    df, features = load_training_data()
+    return df[df['datetime_utc'] < SPLIT_DATE], features
+
+
+def load_trials(path=TRIALS_FILE):
+    trials = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                trials[(record['trial'], record['rung'])] = record
+    return trials
+
+
+def save_trial(record, path=TRIALS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def build_matrices(validation_months=VALIDATION_MONTHS, nthread=None, data=None):
+    """
+    Matrices d'entraînement et de validation (quantifiées une seule fois).
+    `data` : (df, features) déjà chargés par tuning_data().
+    """
+    df, features = data or tuning_data()
+    valid_start = pd.Timestamp(SPLIT_DATE) - pd.DateOffset(months=validation_months)
+    is_train = (df['datetime_utc'] < valid_start).to_numpy()
+
+    X = df[features].to_numpy(dtype=np.float32)
+    y = df[TARGET].to_numpy(dtype=np.float32)
+    dtrain = xgb.QuantileDMatrix(X[is_train], y[is_train], nthread=nthread or -1)
+    dvalid = xgb.QuantileDMatrix(X[~is_train], y[~is_train], ref=dtrain, nthread=nthread or -1)
+    print(f"   Train : {is_train.sum()} heures, validation : {(~is_train).sum()} heures "
+          f"(à partir du {valid_start.date()})")
+    return dtrain, dvalid
+
+
+class _Deadline(xgb.callback.TrainingCallback):
+    """
+    Interrompt l'entraînement quand le budget de temps est épuisé.
+    """
+
+    def __init__(self, deadline):
+        super().__init__()
+        self.deadline = deadline
+        self.expired = False
+
+    def after_iteration(self, model, epoch, evals_log):
+        self.expired = time.time() > self.deadline
+        return self.expired
+
+
+def _init_worker(validation_months, nthread):
+    # Sans fork (Windows, macOS), chaque process construit ses matrices une fois
+    if 'dtrain' not in _TUNING_DATA:
+        _TUNING_DATA['dtrain'], _TUNING_DATA['dvalid'] = build_matrices(validation_months, nthread)
+
+
+def run_trial(trial, rung, rounds, params, nthread, deadline):
+    """
+    Entraîne une configuration avec `rounds` arbres au plus (early stopping
+    sur la validation). Renvoie None si le budget a expiré en cours de route :
+    l'essai sera refait à la reprise.
+    """
+    deadline_cb = _Deadline(deadline)
+    with span("tune.trial", trial=trial, rung=rung, rounds=rounds, nthread=nthread):
+        start = time.perf_counter()
+        booster = xgb.train(
+            {**params, 'objective': 'reg:squarederror', 'eval_metric': 'mae', 'nthread': nthread},
+            _TUNING_DATA['dtrain'], num_boost_round=rounds,
+            evals=[(_TUNING_DATA['dvalid'], 'valid')],
+            early_stopping_rounds=EARLY_STOPPING_ROUNDS, callbacks=[deadline_cb], verbose_eval=False,
+        )
+    if deadline_cb.expired:
+        return None
+    return {
+        'trial': trial,
+        'rung': rung,
+        'rounds': rounds,
+        'params': params,
+        'valid_mae': float(booster.best_score),
+        'best_iteration': booster.best_iteration,
+        'fit_s': round(time.perf_counter() - start, 2),
+    }
+
+
+@instrumented("tune")
+def tune_model(n_trials=N_TRIALS, budget_s=TIME_BUDGET_S, workers=TUNE_WORKERS, seed=SEED,
+               trials_file=TRIALS_FILE, validation_months=VALIDATION_MONTHS):
+    """
+    Successive halving en parallèle, dans la limite de `budget_s` secondes.
+    Les essais terminés sont relus depuis `trials_file` et jamais refaits.
+    Sauvegarde la meilleure configuration dans TUNED_PARAMS_FILE.
+    """
+    deadline = time.time() + budget_s
+    rounds_per_rung = rung_rounds()
+    data = tuning_data()
+    settings = search_settings(*data, validation_months)
+    # Un essai n'est repris que si sa configuration (même seed, même espace)
+    # et ses réglages (mêmes données, mêmes étapes) sont identiques
+    trials = {key: record for key, record in load_trials(trials_file).items()
+              if record['params'] == sample_params(key[0], seed) and record.get('settings') == settings}
+    print(f"🎛️  Recherche d'hyperparamètres : {n_trials} configurations, étapes {rounds_per_rung} arbres, "
+          f"budget {budget_s} s ({len(trials)} essais déjà terminés)")
+
+    cpus = os.cpu_count() or 1
+    workers = min(workers or cpus, n_trials)
+    nthread = max(1, cpus // workers)
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+
+    candidates = list(range(n_trials))
+    completed_rung = -1
+    pool = None
+    with ExitStack() as stack:
+        for rung, rounds in enumerate(rounds_per_rung):
+            todo = [t for t in candidates if (t, rung) not in trials]
+            print(f"   Étape {rung} : {len(candidates)} configurations x {rounds} arbres "
+                  f"({len(todo)} à entraîner, {workers} process x {nthread} thread(s))")
+            if todo and pool is None:
+                # Matrices et process seulement s'il reste des essais à entraîner
+                if context.get_start_method() == "fork":
+                    _TUNING_DATA['dtrain'], _TUNING_DATA['dvalid'] = build_matrices(validation_months, 1, data)
+                pool = stack.enter_context(ProcessPoolExecutor(
+                    max_workers=workers, mp_context=context,
+                    initializer=_init_worker, initargs=(validation_months, nthread)))
+
+            pending = {}
+            for trial in todo:
+                if time.time() > deadline:
+                    break
+                future = pool.submit(run_trial, trial, rung, rounds, sample_params(trial, seed), nthread, deadline)
+                pending[future] = trial
+            while pending:
+                finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pending.pop(future)
+                    record = future.result()
+                    if record is not None:
+                        record['settings'] = settings
+                        trials[(record['trial'], rung)] = record
+                        save_trial(record, trials_file)
+
+            if any((t, rung) not in trials for t in candidates):
+                print("⏰ Budget de temps épuisé : relancer la commande pour reprendre la recherche.")
+                break
+            completed_rung = rung
+            # Seul le meilleur 1/ETA passe à l'étape suivante
+            candidates = sorted(candidates, key=lambda t: trials[(t, rung)]['valid_mae'])
+            candidates = candidates[:max(1, math.ceil(len(candidates) / ETA))]
+
+    _TUNING_DATA.clear()
+    if completed_rung < 0:
+        print("⚠️ Aucune étape terminée dans le budget.")
+        return None
+
+    best = min((r for (t, rung), r in trials.items() if rung == completed_rung and t < n_trials),
+               key=lambda r: r['valid_mae'])
+    best_params = {**best['params'], 'n_estimators': MAX_ROUNDS}
+    os.makedirs(os.path.dirname(TUNED_PARAMS_FILE), exist_ok=True)
+    with open(TUNED_PARAMS_FILE, "w") as f:
+        json.dump(best_params, f, indent=1)
+
+    print(f"🏆 Meilleur essai #{best['trial']} (étape {completed_rung}, {best['rounds']} arbres) : "
+          f"MAE validation {best['valid_mae']:.2f} MWh")
+    for name, value in best['params'].items():
+        print(f"   {name:<18} {value:.4g}")
+    print(f"✅ Paramètres sauvegardés : {TUNED_PARAMS_FILE}")
+    return best_params
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recherche d'hyperparamètres XGBoost (successive halving).")
+    parser.add_argument("--trials", type=int, default=N_TRIALS, help="Configurations tirées au départ")
+    parser.add_argument("--budget", type=float, default=TIME_BUDGET_S, help="Budget en secondes")
+    parser.add_argument("--workers", type=int, default=TUNE_WORKERS, help="Essais en parallèle")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+    tune_model(args.trials, args.budget, args.workers, args.seed)
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+STATIONS_FILE = "config/stations.csv"
+DEFAULT_REGION = "US48"
+HDD_BASE_C = 18.0  # Base des degrés-heures de chauffage (~65°F)
+CDD_BASE_C = 18.0  # Base des degrés-heures de climatisation
+
+
+def load_weights(stations_file=STATIONS_FILE, stations=None):
+    """
+    Poids des stations par région. Sans fichier de config, toutes les
+    stations observées comptent pareil dans la région par défaut.
+    """
+    try:
+        config = pd.read_csv(stations_file)
+    except FileNotFoundError:
+        config = pd.DataFrame({'name': stations, 'weight': 1.0})
+    if 'region' not in config.columns:
+        config['region'] = DEFAULT_REGION
+    return config[['name', 'weight', 'region']]
+
+
+def dense_matrix(df_weather, column, hour_idx, station_idx, shape):
+    """
+    Colonne longue (une ligne par heure x station) -> matrice dense
+    (heures x stations) en float32, NaN là où la mesure manque.
+    """
+    matrix = np.full(shape, np.nan, dtype=np.float32)
+    matrix[hour_idx, station_idx] = df_weather[column].to_numpy(dtype=np.float32)
+    return matrix
+
+
+def weighted_index(matrix, weights):
+    """
+    Moyenne pondérée par région en un seul produit matrice-vecteur.
+    Les stations sans mesure à une heure donnée sont exclues et les poids
+    restants renormalisés (numérateur et dénominateur calculés ensemble).
+    """
+    valid = ~np.isnan(matrix)
+    numerator = np.where(valid, matrix, 0).astype(np.float32) @ weights
+    denominator = valid.astype(np.float32) @ weights
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return numerator / denominator
+
+
+def station_columns(df_weather, column='temperature_c', prefix='temp_'):
+    """
+    Remplace le pivot pandas : une colonne <prefix><ville> par station,
+    remplie par indexation directe dans la matrice dense.
+    """
+    hours, hour_idx = np.unique(df_weather['datetime_utc'].to_numpy(), return_inverse=True)
+    station_codes = pd.Categorical(df_weather['city'])
+    stations = list(station_codes.categories)
+    matrix = dense_matrix(df_weather, column, hour_idx, station_codes.codes, (len(hours), len(stations)))
+    wide = pd.DataFrame(matrix, columns=[f"{prefix}{s}" for s in stations])
+    wide.insert(0, 'datetime_utc', hours)
+    return wide
+
+
+def compute_weather_indices(df_weather, stations_file=STATIONS_FILE,
+                            hdd_base=HDD_BASE_C, cdd_base=CDD_BASE_C):
+    """
+    Agrège la météo longue (datetime_utc, city, temperature_c[, humidity_pct])
+    en quelques indices pondérés par région et par heure :
+    temp_index, hdh (chauffage), cdh (climatisation), humidity_index.
+    Renvoie un DataFrame long (region, datetime_utc, indices en float32).
+    """
+    hours, hour_idx = np.unique(df_weather['datetime_utc'].to_numpy(), return_inverse=True)
+
+    config = load_weights(stations_file, stations=df_weather['city'].unique())
+    stations = config['name'].drop_duplicates().tolist()
+    station_idx = pd.Index(stations).get_indexer(df_weather['city'])  # -1 : station hors config
+    known = station_idx >= 0
+    if not known.all():
+        print(f"   ⚠️ {df_weather.loc[~known, 'city'].nunique()} stations hors config ignorées.")
+        df_weather, hour_idx, station_idx = df_weather[known], hour_idx[known], station_idx[known]
+
+    # Matrice des poids (stations x régions)
+    regions = config['region'].drop_duplicates().tolist()
+    weights = np.zeros((len(stations), len(regions)), dtype=np.float32)
+    weights[config['name'].map(stations.index), config['region'].map(regions.index)] = config['weight']
+
+    shape = (len(hours), len(stations))
+    temperature = dense_matrix(df_weather, 'temperature_c', hour_idx, station_idx, shape)
+    indices = {
+        'temp_index': weighted_index(temperature, weights),
+        'hdh': weighted_index(np.maximum(hdd_base - temperature, 0), weights),
+        'cdh': weighted_index(np.maximum(temperature - cdd_base, 0), weights),
+    }
+    if 'humidity_pct' in df_weather.columns:
+        humidity = dense_matrix(df_weather, 'humidity_pct', hour_idx, station_idx, shape)
+        indices['humidity_index'] = weighted_index(humidity, weights)
+
+    # (heures x régions) -> format long, une ligne par région et par heure
+    result = pd.DataFrame({
+        'region': np.repeat(regions, len(hours)),
+        'datetime_utc': np.tile(hours, len(regions)),
+    })
+    for name, values in indices.items():
+        result[name] = values.T.ravel().astype(np.float32)
+    return result
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Les modules du pipeline s'importent par nom, comme quand les scripts sont lancés
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline"))
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from downsampling import downsample, lttb
+
+
+@pytest.mark.parametrize("n, n_out", [(10_000, 500), (1000, 3), (101, 100), (7, 4)])
+def test_lttb_keeps_endpoints_and_length(n, n_out):
+    y = np.random.default_rng(0).normal(size=n).cumsum()
+    keep = lttb(np.arange(n), y, n_out)
+    assert len(keep) == n_out
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert (np.diff(keep) > 0).all()  # Triés, sans doublon
+
+
+@pytest.mark.parametrize("n, n_out", [(0, 10), (5, 5), (5, 10), (100, 2)])
+def test_lttb_small_inputs_are_returned_whole(n, n_out):
+    np.testing.assert_array_equal(lttb(np.arange(n), np.zeros(n), n_out), np.arange(n))
+
+
+def test_lttb_keeps_peaks_and_accepts_datetimes():
+    times = pd.date_range("2024-01-01", periods=5000, freq="h")
+    y = np.sin(np.arange(5000) / 200)
+    y[1234] = 50.0
+    keep = lttb(times.to_numpy(), y, 100)
+    assert 1234 in keep
+
+
+def test_downsample_skips_missing_values():
+    y = np.arange(1000, dtype=np.float64)
+    y[[0, 500, 999]] = np.nan
+    keep = downsample(np.arange(1000), y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 1 and keep[-1] == 998
+    assert not np.isnan(y[keep]).any()
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_kernels import compute_features, series_features
+
+SPEC = {
+    "lags": [24, 168],
+    "rolling": {24: ["mean", "std", "min", "max"], 168: ["mean"]},
+    "ewm": [24],
+}
+
+
+@pytest.mark.parametrize("n", [0, 1, 23, 100, 168])
+def test_series_shorter_than_history(n):
+    # Petit lot incrémental ou respondent récent : pas d'erreur, NaN là où l'historique manque
+    values = np.arange(n, dtype=np.float64)
+    out = series_features(values, SPEC)
+    for name, column in out.items():
+        assert len(column) == n, name
+    assert np.isnan(out["lag_168h"]).all()
+    assert np.isnan(out["rolling_mean_168h"]).all()
+    if n > 24:
+        np.testing.assert_array_equal(out["lag_24h"][24:], values[:n - 24])
+
+
+def test_short_group_does_not_borrow_from_previous_group():
+    groups = np.repeat([0, 1], [200, 30])
+    values = np.arange(230, dtype=np.float64)
+    out = series_features(values, SPEC, groups)
+    assert np.isnan(out["lag_24h"][200:224]).all()
+    np.testing.assert_array_equal(out["lag_24h"][224:], values[200:206])
+    assert np.isnan(out["lag_168h"][200:]).all()
+
+
+def test_matches_pandas_on_long_series():
+    values = np.random.default_rng(0).normal(100, 10, 500)
+    out = series_features(values, SPEC)
+    s = pd.Series(values)
+    np.testing.assert_allclose(out["lag_168h"], s.shift(168), rtol=1e-6)
+    np.testing.assert_allclose(out["rolling_mean_24h"], s.shift(1).rolling(24).mean(), rtol=1e-5)
+    np.testing.assert_allclose(out["rolling_max_24h"], s.shift(1).rolling(24).max(), rtol=1e-6)
+
+
+def test_all_features_are_float32():
+    spec = {**SPEC, "calendar": ["hour", "day_of_week", "month", "quarter", "is_weekend", "day_of_year"],
+            "cyclic": ["hour"]}
+    times = pd.date_range("2024-01-01", periods=300, freq="h")
+    out = compute_features(times, np.arange(300, dtype=np.float64), spec)
+    assert {name: column.dtype for name, column in out.items()} == {name: np.float32 for name in out}
+    np.testing.assert_array_equal(out["hour"][:3], [0, 1, 2])
+    np.testing.assert_array_equal(out["is_weekend"], times.dayofweek >= 5)  # 6 et 7 janvier 2024 : week-end
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import forecast_horizon
+from feature_engineering import FEATURE_SPEC
+from feature_kernels import feature_names, series_features
+from forecast_horizon import block_features, forecast_horizons
+
+FEATURES = feature_names(FEATURE_SPEC) + ["year", "temp_index"]
+
+
+class SeasonalNaive:
+    """
+    Faux booster : prédit lag_24h (+ temp_index), et garde la taille de chaque appel.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def inplace_predict(self, X, validate_features=False):
+        self.calls.append(len(X))
+        return X[:, FEATURES.index("lag_24h")] + X[:, FEATURES.index("temp_index")]
+
+
+@pytest.fixture
+def booster(monkeypatch):
+    model = SeasonalNaive()
+    metadata = {"version": "test", "features": FEATURES}
+    monkeypatch.setattr(forecast_horizon, "load_model", lambda version=None: (model, metadata))
+    return model
+
+
+@pytest.fixture
+def history():
+    times = pd.date_range("2024-01-01", periods=24 * 20, freq="h")
+    # Profil journalier différent chaque jour : une fuite du futur se verrait
+    demand = 1000 + 10 * times.hour + 100 * (times.dayofyear % 5)
+    return pd.DataFrame({"datetime_utc": times, "demand_mwh": demand.astype(np.float64), "temp_index": 0.0})
+
+
+def test_block_features_match_feature_kernels():
+    Y = np.random.default_rng(0).normal(1000, 50, (3, 400))
+    positions = np.arange(200, 224)
+    out = block_features(Y, positions, FEATURE_SPEC)
+    for row in range(3):
+        offline = series_features(Y[row], FEATURE_SPEC)
+        for name, values in out.items():
+            np.testing.assert_allclose(values[row], offline[name][positions], rtol=1e-5, err_msg=name)
+
+
+def test_recursion_uses_previous_block_predictions(booster, history):
+    issues = pd.to_datetime(["2024-01-12", "2024-01-15"])
+    result = forecast_horizons(issues, horizon=72, history=history)
+
+    assert booster.calls == [2 * 24] * 3  # Un appel par bloc, toutes émissions confondues
+    assert len(result) == 2 * 72
+    assert result["horizon_h"].tolist() == list(range(1, 73)) * 2
+    first = result[result["issue_time"] == issues[0]]
+    assert first["target_time"].iloc[0] == issues[0]
+
+    # Naïf saisonnier récursif : chaque jour prédit répète la veille de l'émission
+    demand = history.set_index("datetime_utc")["demand_mwh"]
+    last_day = demand[issues[0] - pd.Timedelta(hours=24):issues[0] - pd.Timedelta(hours=1)].to_numpy()
+    np.testing.assert_allclose(first["prediction"], np.tile(last_day, 3))
+    np.testing.assert_allclose(first["actual"], demand[first["target_time"]].to_numpy())
+    assert not np.allclose(first["prediction"], first["actual"])  # Le futur n'est pas lu
+
+
+def test_exogenous_values_come_from_the_target_hour(booster, history):
+    history["temp_index"] = np.arange(len(history), dtype=np.float64)
+    issue = pd.Timestamp("2024-01-12")
+    result = forecast_horizons([issue], horizon=24, history=history)
+    expected = history.set_index("datetime_utc").loc[result["target_time"]]
+    lag = history.set_index("datetime_utc")["demand_mwh"].loc[result["target_time"] - pd.Timedelta(hours=24)]
+    np.testing.assert_allclose(result["prediction"], lag.to_numpy() + expected["temp_index"].to_numpy())
+
+
+def test_ewm_and_short_lags_are_rejected(booster, history):
+    with pytest.raises(ValueError):
+        forecast_horizons(["2024-01-12"], history=history, spec={**FEATURE_SPEC, "ewm": [24]})
+    with pytest.raises(ValueError):
+        forecast_horizons(["2024-01-12"], history=history, spec={**FEATURE_SPEC, "lags": [1, 24]})
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from hourly_grid import VALID_COLUMN, to_hourly_grid
+
+
+def load_frame(respondent, start, demand):
+    times = pd.date_range(start, periods=len(demand), freq="h")
+    return pd.DataFrame({"respondent": respondent, "datetime_utc": times, "demand_mwh": demand})
+
+
+def test_trailing_forecast_only_hours_are_not_gaps():
+    # 24 h de demande puis 12 h de prévision DF seule (demand_mwh NaN)
+    df = load_frame("US48", "2024-01-01", [100.0] * 24 + [np.nan] * 12)
+    df["demand_forecast_mwh"] = 90.0
+    grid, report = to_hourly_grid(df, value_columns=["demand_mwh"])
+    assert len(grid) == 24
+    assert grid[VALID_COLUMN].all()
+    assert "gap" not in set(report["kind"])
+    forecast = report[report["kind"] == "forecast_only"]
+    assert forecast["hours"].sum() == 12
+    assert forecast["start"].iloc[0] == pd.Timestamp("2024-01-02 00:00")
+
+
+def test_gap_runs_do_not_cross_respondents():
+    # Trou en fin de CISO et en début de ERCO (même heure de fin/début) : deux trous distincts
+    ciso = load_frame("CISO", "2024-01-01", [1.0] * 10 + [np.nan] * 3 + [1.0])
+    erco = load_frame("ERCO", "2024-01-01", [1.0, np.nan, np.nan, 1.0])
+    grid, report = to_hourly_grid(pd.concat([ciso, erco]), value_columns=["demand_mwh"])
+    gaps = report[report["kind"] == "gap"].set_index("respondent")
+    assert gaps.loc["CISO", "hours"] == 3
+    assert gaps.loc["ERCO", "hours"] == 2
+    assert (~grid[VALID_COLUMN]).sum() == 5
+
+
+def test_gap_in_the_middle_is_filled_and_reported():
+    df = load_frame("US48", "2024-01-01", [1.0] * 5 + [2.0] * 5).drop(index=[3, 4, 5])
+    grid, report = to_hourly_grid(df, value_columns=["demand_mwh"])
+    assert len(grid) == 10
+    assert grid["datetime_utc"].diff().dropna().eq(pd.Timedelta(hours=1)).all()
+    np.testing.assert_array_equal(grid[VALID_COLUMN], [True] * 3 + [False] * 3 + [True] * 4)
+    assert np.isnan(grid["demand_mwh"].iloc[3:6]).all()
+    gap = report[report["kind"] == "gap"].iloc[0]
+    assert (gap["start"], gap["end"], gap["hours"]) == (pd.Timestamp("2024-01-01 03:00"),
+                                                        pd.Timestamp("2024-01-01 05:00"), 3)
+
+
+def test_trailing_invalid_hours_are_trimmed():
+    # Heures finales présentes mais sans demande : pas de lignes invalides en fin de grille
+    grid, report = to_hourly_grid(load_frame("US48", "2024-01-01", [1.0] * 6 + [np.nan] * 4),
+                                  value_columns=["demand_mwh"])
+    assert grid["datetime_utc"].max() == pd.Timestamp("2024-01-01 05:00")
+    assert grid[VALID_COLUMN].all()
+    assert report.loc[report["kind"] == "forecast_only", "hours"].sum() == 4
+
+
+def test_multiple_respondents_keep_their_own_range():
+    ciso = load_frame("CISO", "2024-01-01 00:00", [1.0] * 4)
+    erco = load_frame("ERCO", "2024-01-01 02:00", [2.0] * 6).drop(index=2)
+    shuffled = pd.concat([erco, ciso]).sample(frac=1, random_state=0)
+    grid, report = to_hourly_grid(shuffled, value_columns=["demand_mwh"])
+
+    assert list(grid["respondent"]) == ["CISO"] * 4 + ["ERCO"] * 6  # Trié par (groupe, heure)
+    by_respondent = grid.groupby("respondent")["datetime_utc"].agg(["min", "max"])
+    assert by_respondent.loc["CISO"].tolist() == [pd.Timestamp("2024-01-01 00:00"), pd.Timestamp("2024-01-01 03:00")]
+    assert by_respondent.loc["ERCO"].tolist() == [pd.Timestamp("2024-01-01 02:00"), pd.Timestamp("2024-01-01 07:00")]
+    gaps = report[report["kind"] == "gap"]
+    assert gaps["respondent"].tolist() == ["ERCO"]
+    assert gaps["start"].iloc[0] == pd.Timestamp("2024-01-01 04:00")
+
+
+def test_duplicates_keep_the_last_row():
+    df = load_frame("US48", "2024-01-01", [1.0, 2.0, 3.0])
+    df = pd.concat([df, df.iloc[[1]].assign(demand_mwh=20.0)])
+    grid, report = to_hourly_grid(df, value_columns=["demand_mwh"])
+    assert grid["demand_mwh"].tolist() == [1.0, 20.0, 3.0]
+    assert report["kind"].tolist() == ["duplicate"]
@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from http_client import OfflineCacheMiss, ResponseCache
+
+URL = "https://api.eia.gov/v2/electricity/rto/region-data/data/"
+
+
+def params(end, api_key="secret", offset=0):
+    return {"api_key": api_key, "frequency": "hourly", "data[0]": "value",
+            "facets[respondent][]": "US48", "start": "2022-01-01T00", "end": end,
+            "offset": offset, "length": 5000}
+
+
+def body(value):
+    return json.dumps({"response": {"data": [{"value": value}]}}).encode()
+
+
+def test_key_ignores_api_key_and_param_order():
+    cache = ResponseCache()
+    a = params("2022-02-01T00", api_key="one")
+    b = dict(reversed(list(params("2022-02-01T00", api_key="two").items())))
+    assert cache.key(URL, a) == cache.key(URL, b)
+    assert "secret" not in json.dumps(cache.normalize(URL, params("2022-02-01T00")))
+    assert cache.key(URL, a) != cache.key(URL, params("2022-02-01T00", offset=5000))
+
+
+def test_closed_period_never_expires_open_period_does():
+    cache = ResponseCache(open_ttl=3600)
+    now = time.time()
+    assert cache.expires_at({"end": "2020-01-31T23"}, now) is None
+    assert cache.expires_at({"end_date": "2020-01-31"}, now) is None
+    current = time.strftime("%Y-%m-%dT%H", time.gmtime(now))
+    assert cache.expires_at({"end": current}, now) == now + 3600
+    assert cache.expires_at({}, now) == now + 3600  # Sans fin connue : traitée comme ouverte
+
+
+def test_expired_entry_is_refetched_but_replayed_offline(tmp_path):
+    cache = ResponseCache(tmp_path, open_ttl=-1)  # Toute période ouverte est déjà expirée
+    open_params = params(time.strftime("%Y-%m-%dT%H", time.gmtime()))
+    cache.put(URL, open_params, body(1))
+    assert cache.get(URL, open_params) is None
+    offline = ResponseCache(tmp_path, offline=True)
+    assert json.loads(offline.get(URL, open_params)) == json.loads(body(1))
+
+
+def test_hit_then_miss_counts(tmp_path):
+    cache = ResponseCache(tmp_path)
+    calls = []
+    fetch = lambda: calls.append(1) or body(42)
+    closed = params("2022-02-01T00")
+    assert cache.fetch_json(URL, closed, fetch)["response"]["data"][0]["value"] == 42
+    assert cache.fetch_json(URL, params("2022-02-01T00", api_key="other"), fetch)["response"]["data"][0]["value"] == 42
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_counters_are_thread_safe(tmp_path):
+    cache = ResponseCache(tmp_path)
+    closed = params("2022-02-01T00")
+    cache.put(URL, closed, body(1))
+
+    def read():
+        for _ in range(200):
+            cache.fetch_json(URL, closed, lambda: pytest.fail("réponse attendue en cache"))
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.hits == 8 * 200
+
+
+def test_offline_miss_raises(tmp_path):
+    cache = ResponseCache(tmp_path, offline=True)
+    with pytest.raises(OfflineCacheMiss):
+        cache.fetch_json(URL, params("2022-02-01T00"), lambda: pytest.fail("aucun accès réseau hors-ligne"))
+
+
+def test_lru_eviction_keeps_recently_read_entries(tmp_path):
+    cache = ResponseCache(tmp_path)
+    payload = os.urandom(2000)  # Incompressible : taille d'entrée prévisible
+    requests_ = [params(f"2022-0{m}-01T00") for m in (1, 2, 3)]
+    for i, p in enumerate(requests_):
+        cache.put(URL, p, payload)
+        # Dates de modification espacées : l'ordre LRU ne dépend pas de la résolution du disque
+        os.utime(cache.path(cache.key(URL, p)), (1000 + i, 1000 + i))
+    cache.get(URL, requests_[0])  # La plus ancienne redevient la plus récente
+
+    entry = os.path.getsize(cache.path(cache.key(URL, requests_[0])))
+    cache.max_bytes = int(3.5 * entry)
+    cache.put(URL, params("2022-04-01T00"), payload)
+
+    assert cache.get(URL, requests_[0]) is not None
+    assert cache.get(URL, requests_[1]) is None  # Moins récemment utilisée : évincée
+    assert cache.get(URL, params("2022-04-01T00")) is not None
@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+import requests
+
+import http_client
+import ingest_load_data
+from ingest_load_data import fetch_pages_concurrent, incremental_window, iter_eia_pages, records_to_batch
+from process_load_data import LOAD_SCHEMA, respondent_dir
+from storage import PartitionedWriter, read_dataset
+
+TOTAL = 95
+LENGTH = 10
+
+
+class FakeEIA(BaseHTTPRequestHandler):
+    """
+    API EIA locale : `TOTAL` lignes numérotées, paginées par offset/length.
+    Les premières pages répondent plus lentement (elles finissent donc
+    après les suivantes) ; `failures[offset]` liste les codes d'erreur à
+    renvoyer avant de répondre normalement.
+    """
+    failures = {}
+    calls = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        offset, length = int(query['offset'][0]), int(query['length'][0])
+        type(self).calls.append(offset)
+        plan = type(self).failures.get(offset)
+        if plan:
+            status = plan.pop(0)
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        time.sleep(max(0, 50 - offset) / 1000)
+        rows = [{"period": f"row{i}", "value": i} for i in range(offset, min(offset + length, TOTAL))]
+        body = json.dumps({"response": {"total": TOTAL, "data": rows}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def eia(monkeypatch):
+    monkeypatch.setenv(http_client.CACHE_ENV, "off")
+    # Backoff instantané (seul le module http_client est touché, pas le serveur)
+    monkeypatch.setattr(http_client, "time", SimpleNamespace(sleep=lambda s: None, time=time.time,
+                                                             monotonic=time.monotonic))
+    FakeEIA.failures, FakeEIA.calls = {}, []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeEIA)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(url, workers=4):
+    return fetch_pages_concurrent("key", "2022-01-01T00", "2022-01-05T00", workers=workers, rate=1000,
+                                  base_url=url, length=LENGTH)
+
+
+def test_pages_come_back_in_offset_order(eia):
+    pages = list(iter_eia_pages("key", "2022-01-01T00", "2022-01-05T00", workers=4, rate=1000,
+                                base_url=eia, length=LENGTH))
+    assert [page[0]["value"] for page in pages] == list(range(0, TOTAL, LENGTH))
+    assert [r["value"] for page in pages for r in page] == list(range(TOTAL))
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_transient_errors_are_retried(eia, status):
+    FakeEIA.failures = {0: [status], 30: [status, status]}
+    assert [r["value"] for r in fetch(eia)] == list(range(TOTAL))
+    assert FakeEIA.calls.count(30) == 3
+
+
+def test_fails_after_retries_are_exhausted(eia):
+    FakeEIA.failures = {40: [500] * (http_client.DEFAULT_RETRIES + 1)}
+    with pytest.raises(requests.HTTPError):
+        fetch(eia)
+    assert FakeEIA.calls.count(40) == http_client.DEFAULT_RETRIES + 1
+
+
+def test_client_error_is_not_retried(eia):
+    FakeEIA.failures = {20: [403]}
+    with pytest.raises(requests.HTTPError):
+        fetch(eia)
+    assert FakeEIA.calls.count(20) == 1
+
+
+def eia_records(type_, start, hours):
+    return [{"period": t.strftime("%Y-%m-%dT%H"), "value": 1000.0 + i}
+            for i, t in enumerate(pd.date_range(start, periods=hours, freq="h"))]
+
+
+def test_incremental_window_ignores_forecast_only_hours(tmp_path):
+    # D jusqu'au 2024-01-02T23, DF (J+1) jusqu'au 2024-01-03T23 : le watermark suit la demande
+    with PartitionedWriter(respondent_dir(str(tmp_path), "US48"), LOAD_SCHEMA) as writer:
+        writer.write_batch(records_to_batch(eia_records("D", "2023-12-31", 72), "D"))
+        writer.write_batch(records_to_batch(eia_records("DF", "2024-01-01", 72), "DF"))
+    start, _ = incremental_window(str(tmp_path), respondents=["US48"])
+    assert start == "2024-01-03T00"
+
+
+def test_incremental_window_uses_the_most_behind_respondent(tmp_path):
+    for respondent, hours in (("US48", 48), ("CISO", 30)):
+        with PartitionedWriter(respondent_dir(str(tmp_path), respondent), LOAD_SCHEMA) as writer:
+            writer.write_batch(records_to_batch(eia_records("D", "2024-01-01", hours), "D"))
+    assert incremental_window(str(tmp_path), respondents=["US48", "CISO"])[0] == "2024-01-02T06"
+    assert incremental_window(str(tmp_path), respondents=["US48", "ERCO"]) is None  # Pas encore d'historique
+
+
+def test_failed_stream_keeps_the_old_dataset(tmp_path, monkeypatch):
+    output = str(tmp_path / "load")
+    with PartitionedWriter(respondent_dir(output, "US48"), LOAD_SCHEMA) as writer:
+        writer.write_batch(records_to_batch(eia_records("D", "2023-12-01", 48), "D"))
+
+    def failing_pages(api_key, start, end, *args):
+        yield eia_records("D", start, 24)  # Une page écrite, puis une erreur
+        raise requests.HTTPError("500 Server Error")
+
+    monkeypatch.setattr(ingest_load_data, "iter_eia_pages", failing_pages)
+    with pytest.raises(requests.HTTPError):
+        ingest_load_data.stream_eia_to_parquet("key", "2024-01-01T00", "2024-01-05T00", output,
+                                               respondents=["US48"], types=["D"], series_workers=1)
+    old = read_dataset(respondent_dir(output, "US48"))
+    assert old["datetime_utc"].max() == pd.Timestamp("2023-12-02 23:00")  # Ancien dataset intact
+
+    def pages(api_key, start, end, *args):
+        yield eia_records("D", start, 24)
+
+    monkeypatch.setattr(ingest_load_data, "iter_eia_pages", pages)
+    ingest_load_data.stream_eia_to_parquet("key", "2024-01-01T00", "2024-01-05T00", output,
+                                           respondents=["US48"], types=["D"], series_workers=1)
+    new = read_dataset(respondent_dir(output, "US48"))
+    assert len(new) == 24 and new["datetime_utc"].min() == pd.Timestamp("2024-01-01")  # Remplacé en entier
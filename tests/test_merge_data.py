@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from merge_data import fill_short_gaps
+
+
+def series(values, respondent=None, start="2024-01-01"):
+    df = pd.DataFrame({"datetime_utc": pd.date_range(start, periods=len(values), freq="h"),
+                       "temp_index": np.asarray(values, dtype=np.float32)})
+    if respondent is not None:
+        df.insert(0, "respondent", respondent)
+    return df
+
+
+def test_gap_of_max_length_is_interpolated():
+    df, report = fill_short_gaps(series([0.0, np.nan, np.nan, np.nan, 8.0]), ["temp_index"], max_gap=3)
+    np.testing.assert_allclose(df["temp_index"], [0.0, 2.0, 4.0, 6.0, 8.0])
+    assert df["temp_index"].dtype == np.float32
+    assert report[["column", "hours"]].values.tolist() == [["temp_index", 3]]
+    assert report["gap_start"].iloc[0] == pd.Timestamp("2024-01-01 01:00")
+
+
+def test_long_and_edge_gaps_stay_empty():
+    values = [np.nan, 1.0, np.nan, np.nan, np.nan, np.nan, 6.0, np.nan, 8.0, np.nan]
+    df, report = fill_short_gaps(series(values), ["temp_index"], max_gap=3)
+    filled = df["temp_index"].to_numpy()
+    assert np.isnan(filled[[0, 2, 3, 4, 5, 9]]).all()  # Début, trou de 4 h, fin : intacts
+    assert filled[7] == 7.0
+    assert report["hours"].tolist() == [1]
+
+
+def test_interpolation_follows_time_not_rows():
+    df = series([0.0, np.nan, 9.0])
+    df.loc[2, "datetime_utc"] = pd.Timestamp("2024-01-01 03:00")  # Heure 2 absente de la table
+    df, _ = fill_short_gaps(df, ["temp_index"], max_gap=3)
+    assert df["temp_index"].iloc[1] == 3.0
+
+
+def test_gaps_do_not_cross_groups():
+    # Fin de CISO et début de ERCO manquants : bordés par l'autre groupe, non remplis
+    df = pd.concat([series([1.0, 2.0, np.nan], "CISO"), series([np.nan, 5.0, np.nan, 7.0], "ERCO")],
+                   ignore_index=True)
+    df, report = fill_short_gaps(df, ["temp_index"], max_gap=3, group_col="respondent")
+    filled = df["temp_index"].to_numpy()
+    assert np.isnan(filled[2]) and np.isnan(filled[3])
+    assert filled[5] == 6.0
+    assert report[["respondent", "hours"]].values.tolist() == [["ERCO", 1]]
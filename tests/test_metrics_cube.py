@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from metrics_cube import build_cube, hourly_rows, hourly_summary, range_summary
+
+
+@pytest.fixture(scope="module")
+def predictions():
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2023-01-01", "2023-06-30 23:00", freq="h")
+    df = pd.DataFrame({"datetime_utc": times, "demand_mwh": rng.uniform(100, 200, len(times))})
+    df["prediction"] = df["demand_mwh"] + rng.normal(0, 5, len(times))
+    return df
+
+
+@pytest.mark.parametrize("start, end", [
+    ("2023-01-15", "2023-04-10"),  # Mois complets + jours en bordure
+    ("2023-02-01", "2023-03-31"),  # Mois complets seulement
+    ("2023-02-03", "2023-02-20"),  # Aucun mois complet
+])
+def test_cube_matches_hourly_data(predictions, start, end):
+    cube = build_cube(predictions)
+    t = predictions["datetime_utc"]
+    hours = predictions[(t >= start) & (t < pd.Timestamp(end) + pd.Timedelta(days=1))]
+    error = hours["demand_mwh"] - hours["prediction"]
+
+    summary = range_summary(cube, start, end)
+    assert summary["n"] == len(hours)
+    assert summary["mae"] == pytest.approx(error.abs().mean())
+
+    by_hour = hourly_summary(hourly_rows(cube, start, end, hours))
+    assert by_hour["n"].sum() == len(hours)
+    np.testing.assert_allclose(by_hour["mae"], error.abs().groupby(hours["datetime_utc"].dt.hour).mean())
+    np.testing.assert_allclose(by_hour["bias"], error.groupby(hours["datetime_utc"].dt.hour).mean())
@@ -0,0 +1,70 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xgboost as xgb
+
+from model_registry import (METADATA_FILE, MODEL_FILE, feature_matrix, latest_version, list_versions,
+                            load_model, read_metadata, register_model)
+
+
+@pytest.fixture(scope="module")
+def training():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({"hour": rng.integers(0, 24, 500).astype(np.int32),
+                      "lag_24h": rng.normal(1000, 50, 500).astype(np.float32)})
+    y = X["lag_24h"] + 10 * X["hour"]
+    booster = xgb.train({"max_depth": 3, "nthread": 1}, xgb.DMatrix(X, y), num_boost_round=20)
+    return booster, X
+
+
+def test_round_trip(tmp_path, training):
+    booster, X = training
+    registry = str(tmp_path)
+    version = register_model(booster, X, registry_dir=registry, respondent="US48", metrics={"mae": 1.5})
+
+    assert latest_version(registry) == version
+    assert list_versions(registry) == [version]
+    assert sorted(os.listdir(os.path.join(registry, version))) == sorted([MODEL_FILE, METADATA_FILE])
+    assert not [d for d in os.listdir(registry) if d.endswith(".tmp")]
+
+    loaded, metadata = load_model(registry_dir=registry, nthread=1)
+    assert metadata == read_metadata(version, registry)
+    assert metadata["features"] == ["hour", "lag_24h"]
+    assert metadata["dtypes"] == {"hour": "int32", "lag_24h": "float32"}
+    assert metadata["respondent"] == "US48" and metadata["metrics"] == {"mae": 1.5}
+    assert version.endswith(metadata["data_fingerprint"][:8])
+
+    # Mêmes prédictions, colonnes données dans un autre ordre
+    X_shuffled = X[["lag_24h", "hour"]]
+    np.testing.assert_array_equal(loaded.inplace_predict(feature_matrix(metadata, X_shuffled)),
+                                  booster.inplace_predict(X.to_numpy(dtype=np.float32)))
+
+
+def test_missing_feature_is_rejected(tmp_path, training):
+    booster, X = training
+    register_model(booster, X, registry_dir=str(tmp_path))
+    _, metadata = load_model(registry_dir=str(tmp_path))
+    with pytest.raises(ValueError, match="lag_24h"):
+        feature_matrix(metadata, X[["hour"]])
+
+
+def test_feature_order_mismatch_is_rejected(tmp_path, training):
+    booster, X = training
+    version = register_model(booster, X, registry_dir=str(tmp_path))
+    path = os.path.join(str(tmp_path), version, METADATA_FILE)
+    with open(path) as f:
+        metadata = json.load(f)
+    metadata["features"] = metadata["features"][::-1]
+    with open(path, "w") as f:
+        json.dump(metadata, f)
+    with pytest.raises(ValueError, match="ordre des features"):
+        load_model(registry_dir=str(tmp_path))
+
+
+def test_empty_registry(tmp_path):
+    assert list_versions(str(tmp_path / "none")) == []
+    with pytest.raises(FileNotFoundError):
+        latest_version(str(tmp_path))
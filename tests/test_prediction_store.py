@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from prediction_store import list_versions, prediction_bounds, read_predictions, write_predictions
+
+
+def predictions(start, hours, prediction=1.0):
+    target = pd.date_range(start, periods=hours, freq="h")
+    return pd.DataFrame({"target_time": target, "actual": np.arange(hours, dtype=np.float64),
+                         "prediction": prediction})
+
+
+def test_append_and_read_back(tmp_path):
+    store = str(tmp_path)
+    assert write_predictions(predictions("2024-01-31 12:00", 24), "v1", run="test", store_dir=store) == 24
+    assert write_predictions(predictions("2024-01-01", 48), "v2", run="backtest", store_dir=store) == 48
+    assert list_versions(store) == ["v1", "v2"]
+
+    v1 = read_predictions(["v1"], store_dir=store).sort_values("target_time", ignore_index=True)
+    assert len(v1) == 24 and set(v1["month"]) == {1, 2}  # Partitionné par mois de l'heure prédite
+    assert (v1["horizon_h"] == 1).all()
+    assert (v1["issue_time"] == v1["target_time"] - pd.Timedelta(hours=1)).all()
+    np.testing.assert_array_equal(v1["actual"], np.arange(24))
+
+    window = read_predictions(start="2024-01-01 10:00", end="2024-01-01 20:00", store_dir=store)
+    assert len(window) == 10 and set(window["model_version"]) == {"v2"}
+    assert len(read_predictions(run="test", store_dir=store)) == 24
+    assert prediction_bounds("v1", store_dir=store) == (pd.Timestamp("2024-01-31 12:00"),
+                                                         pd.Timestamp("2024-02-01 11:00"))
+
+
+def test_rewritten_predictions_are_deduplicated(tmp_path):
+    store = str(tmp_path)
+    write_predictions(predictions("2024-01-01", 24), "v1", run="test", store_dir=store)
+    # Même run relancé, en partie chevauchant : seules les 12 nouvelles heures sont ajoutées
+    assert write_predictions(predictions("2024-01-01 12:00", 24, prediction=2.0), "v1", run="test",
+                             store_dir=store) == 12
+    assert write_predictions(predictions("2024-01-01", 24), "v1", run="test", store_dir=store) == 0
+
+    stored = read_predictions(["v1"], store_dir=store).sort_values("target_time", ignore_index=True)
+    assert len(stored) == 36 and stored["target_time"].is_unique
+    assert (stored["prediction"].iloc[:24] == 1.0).all()  # La première écriture gagne
+
+    # Autre run ou autre version : pas un doublon
+    assert write_predictions(predictions("2024-01-01", 24), "v1", run="backtest", store_dir=store) == 24
+    assert write_predictions(predictions("2024-01-01", 24), "v2", run="test", store_dir=store) == 24
+
+
+def test_duplicates_within_one_write(tmp_path):
+    df = pd.concat([predictions("2024-01-01", 4), predictions("2024-01-01", 4)])
+    assert write_predictions(df, "v1", run="test", store_dir=str(tmp_path)) == 4
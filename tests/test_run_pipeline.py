@@ -0,0 +1,91 @@
+import os
+import textwrap
+
+import pytest
+
+import run_pipeline
+
+TOY_STAGES = textwrap.dedent('''
+    def _copy(src, dst, name):
+        with open(src) as f:
+            text = f.read()
+        with open(dst, "w") as f:
+            f.write(text.upper())
+        with open("runs.log", "a") as f:
+            f.write(name + "\\n")
+
+    def stage_a():
+        _copy("raw.txt", "a.txt", "a")
+
+    def stage_b():
+        _copy("a.txt", "b.txt", "b")
+''')
+
+
+def toy_stages(incremental=False):
+    common = {"kwargs": {}, "always_run": False, "code": ["toy_stages"]}
+    return {
+        "a": {**common, "call": ("toy_stages", "stage_a"), "deps": [], "inputs": ["raw.txt"], "outputs": ["a.txt"]},
+        "b": {**common, "call": ("toy_stages", "stage_b"), "deps": ["a"], "inputs": ["a.txt"], "outputs": ["b.txt"]},
+    }
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    # DAG jouet a -> b : les process du pool (fork) héritent du sys.path
+    (tmp_path / "pipeline").mkdir()
+    (tmp_path / "pipeline" / "toy_stages.py").write_text(TOY_STAGES)
+    (tmp_path / "raw.txt").write_text("hello")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path / "pipeline"))
+    monkeypatch.setattr(run_pipeline, "build_stages", toy_stages)
+    monkeypatch.setattr(run_pipeline, "STATE_FILE", str(tmp_path / "state.json"))
+    monkeypatch.setattr(run_pipeline, "PIPELINE_DIR", str(tmp_path / "pipeline"))
+
+    def run(**kwargs):
+        open("runs.log", "w").close()
+        changed = run_pipeline.run_pipeline(workers=1, **kwargs)
+        with open("runs.log") as f:
+            assert set(f.read().split()) == (set() if kwargs.get("dry_run") else changed)
+        return changed
+
+    return run
+
+
+def test_unchanged_stages_are_skipped(pipeline):
+    assert pipeline() == {"a", "b"}
+    assert pipeline() == set()
+    assert pipeline(force=["b"]) == {"b"}
+
+
+def test_changed_input_or_code_invalidates(pipeline):
+    pipeline()
+    with open("raw.txt", "w") as f:
+        f.write("world")
+    assert pipeline() == {"a", "b"}
+
+    # Même sortie pour a ("WORLD") : b n'est pas relancée
+    with open("raw.txt", "w") as f:
+        f.write("World")
+    assert pipeline() == {"a"}
+
+    with open(os.path.join("pipeline", "toy_stages.py"), "a") as f:
+        f.write("\n# commentaire\n")
+    assert pipeline() == {"a", "b"}  # Le code de l'étape fait partie de l'empreinte
+
+
+def test_missing_output_reruns_the_stage(pipeline):
+    pipeline()
+    os.remove("b.txt")
+    assert pipeline() == {"b"}
+
+
+def test_dry_run_propagates_downstream(pipeline, capsys):
+    pipeline()
+    with open("raw.txt", "w") as f:
+        f.write("changed")
+    capsys.readouterr()
+    assert pipeline(dry_run=True) == {"a", "b"}  # b serait relancée après a
+    assert "b : à exécuter (étape amont)" in capsys.readouterr().out
+    assert pipeline(dry_run=True) == {"a", "b"}  # La simulation n'a rien enregistré
+    assert pipeline() == {"a", "b"}
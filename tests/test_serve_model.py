@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_engineering import FEATURE_SPEC
+from feature_kernels import compute_features, feature_names
+from hourly_grid import hour_numbers
+from serve_model import Forecaster, HistoryBuffer
+
+
+@pytest.fixture
+def history():
+    rng = np.random.default_rng(0)
+    times = pd.date_range("2024-01-01", periods=400, freq="h")
+    return pd.DataFrame({"datetime_utc": times,
+                         "demand_mwh": rng.normal(1000, 50, len(times)),
+                         "temp_index": rng.normal(10, 3, len(times))})
+
+
+def offline_forecaster(capacity):
+    # Forecaster sans modèle : seul le calcul des features est testé
+    forecaster = Forecaster.__new__(Forecaster)
+    forecaster.spec = FEATURE_SPEC
+    forecaster.exogenous = ["temp_index"]
+    forecaster.features = feature_names(FEATURE_SPEC) + ["year", "temp_index"]
+    forecaster.buffer = HistoryBuffer(["demand_mwh", "temp_index"], capacity)
+    return forecaster
+
+
+def test_partial_update_keeps_other_columns(history):
+    buffer = HistoryBuffer(["demand_mwh", "temp_index"], capacity=48)
+    buffer.update(history.iloc[:24])
+    hours = hour_numbers(history["datetime_utc"].iloc[:24])
+
+    # Correction de la demande seule : la météo déjà connue reste en place
+    buffer.update(history.iloc[:24][["datetime_utc", "demand_mwh"]].assign(demand_mwh=1.0))
+    np.testing.assert_array_equal(buffer.gather(hours, "demand_mwh"), 1.0)
+    np.testing.assert_allclose(buffer.gather(hours, "temp_index"), history["temp_index"].iloc[:24])
+
+    # Lignes JSON hétérogènes : NaN = valeur non fournie
+    buffer.update(pd.DataFrame({"datetime_utc": history["datetime_utc"].iloc[:2],
+                                "demand_mwh": [2.0, np.nan], "temp_index": [np.nan, 3.0]}))
+    np.testing.assert_array_equal(buffer.gather(hours[:2], "demand_mwh"), [2.0, 1.0])
+    np.testing.assert_allclose(buffer.gather(hours[:2], "temp_index"), [history["temp_index"].iloc[0], 3.0])
+
+
+def test_reused_slot_forgets_previous_hour(history):
+    buffer = HistoryBuffer(["demand_mwh", "temp_index"], capacity=24)
+    buffer.update(history.iloc[:24])
+    buffer.update(history.iloc[24:48][["datetime_utc", "demand_mwh"]])
+    hours = hour_numbers(history["datetime_utc"].iloc[24:48])
+    assert np.isnan(buffer.gather(hours, "temp_index")).all()  # Pas la météo de l'heure écrasée
+
+
+def test_serving_features_match_offline(history):
+    forecaster = offline_forecaster(capacity=300)
+    forecaster.buffer.update(history)
+    targets = history.iloc[-50:]
+
+    X = forecaster.feature_matrix(targets[["datetime_utc"]])
+    offline = compute_features(history["datetime_utc"], history["demand_mwh"].to_numpy(), FEATURE_SPEC)
+    offline["year"] = history["datetime_utc"].dt.year.to_numpy()
+    offline["temp_index"] = history["temp_index"].to_numpy()
+    expected = np.column_stack([np.asarray(offline[name], dtype=np.float32)[-50:] for name in forecaster.features])
+    np.testing.assert_allclose(X, expected, rtol=1e-5)
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from storage import PartitionedWriter, latest_timestamp, list_partitions, read_dataset, upsert_partitions
+
+SCHEMA = pa.schema([("datetime_utc", pa.timestamp("us")), ("demand_mwh", pa.float64())])
+
+
+def hourly(start, hours, value=1.0):
+    times = pd.date_range(start, periods=hours, freq="h")
+    df = pd.DataFrame({"datetime_utc": times, "demand_mwh": value})
+    df["year"], df["month"] = times.year, times.month
+    return df
+
+
+def partition_files(dataset_dir):
+    return {key: sorted(os.listdir(path)) for key, path in list_partitions(dataset_dir)}
+
+
+def test_latest_timestamp(tmp_path):
+    dataset = str(tmp_path / "load")
+    assert latest_timestamp(dataset) is None  # Dataset absent
+    upsert_partitions(hourly("2024-01-31 20:00", 8), dataset)  # Janvier et février
+    assert latest_timestamp(dataset) == pd.Timestamp("2024-02-01 03:00")
+
+    os.makedirs(os.path.join(dataset, "year=2024", "month=3"))  # Partition vide : ignorée
+    assert latest_timestamp(dataset) == pd.Timestamp("2024-02-01 03:00")
+
+    # Heures sans valeur (prévision seule) : exclues avec value_column
+    upsert_partitions(hourly("2024-02-01 04:00", 3, value=np.nan), dataset)
+    assert latest_timestamp(dataset) == pd.Timestamp("2024-02-01 06:00")
+    assert latest_timestamp(dataset, value_column="demand_mwh") == pd.Timestamp("2024-02-01 03:00")
+
+
+def test_upsert_rewrites_only_touched_partitions(tmp_path):
+    dataset = str(tmp_path / "features")
+    upsert_partitions(hourly("2024-01-01", 24 * 60), dataset)  # Janvier, février
+    january = os.path.join(dataset, "year=2024", "month=1", "part-0.parquet")
+    os.utime(january, (1000, 1000))
+
+    # Fin février corrigée + début mars : janvier n'est ni relu ni réécrit
+    touched = upsert_partitions(hourly("2024-02-29 00:00", 48, value=2.0), dataset)
+    assert touched == [(2024, 2), (2024, 3)]
+    assert os.path.getmtime(january) == 1000
+    assert partition_files(dataset) == {key: ["part-0.parquet"] for key in [(2024, 1), (2024, 2), (2024, 3)]}
+
+    df = read_dataset(dataset).sort_values("datetime_utc", ignore_index=True)
+    assert df["datetime_utc"].is_unique
+    assert len(df) == 24 * 60 + 24  # Seules les 24 h de mars sont nouvelles
+    assert (df.loc[df["datetime_utc"] >= "2024-02-29", "demand_mwh"] == 2.0).all()  # Les nouvelles lignes gagnent
+    assert (df.loc[df["datetime_utc"] < "2024-02-29", "demand_mwh"] == 1.0).all()
+
+
+def test_upsert_with_composite_key(tmp_path):
+    # Comme process_weather : une ligne par (heure, ville)
+    dataset = str(tmp_path / "weather")
+    keys = ["datetime_utc", "city"]
+    boston, denver = hourly("2024-01-01", 4).assign(city="Boston"), hourly("2024-01-01", 4).assign(city="Denver")
+    upsert_partitions(pd.concat([boston, denver]), dataset, keys=keys)
+    upsert_partitions(denver.assign(demand_mwh=5.0), dataset, keys=keys)
+    df = read_dataset(dataset)
+    assert len(df) == 8
+    assert df.groupby("city")["demand_mwh"].max().to_dict() == {"Boston": 1.0, "Denver": 5.0}
+
+
+def batch(start, hours, value=1.0):
+    df = hourly(start, hours, value).drop(columns=["year", "month"])
+    return pa.RecordBatch.from_pandas(df, schema=SCHEMA, preserve_index=False)
+
+
+def test_partitioned_writer_splits_batches_by_month(tmp_path):
+    dataset = str(tmp_path / "load")
+    with PartitionedWriter(dataset, SCHEMA) as writer:
+        writer.write_batch(batch("2024-01-31 22:00", 4))  # À cheval sur janvier et février
+        writer.write_batch(batch("2024-02-01 02:00", 24 * 30))  # Jusqu'en mars : janvier est fermé
+        writer.write_batch(batch("2024-03-02 02:00", 0))  # Lot vide : ignoré
+        assert sorted(writer.writers) == [202402, 202403]
+    assert writer.rows_written == 4 + 24 * 30
+    assert writer.writers == {}
+
+    df = read_dataset(dataset)
+    assert len(df) == writer.rows_written
+    assert df.groupby("month").size().to_dict() == {1: 2, 2: 24 * 29, 3: 24 + 2}
+    assert all(len(files) == 1 for files in partition_files(dataset).values())
+
+
+def test_partitioned_writer_never_overwrites(tmp_path):
+    dataset = str(tmp_path / "load")
+    with PartitionedWriter(dataset, SCHEMA) as writer:
+        writer.write_batch(batch("2024-01-01", 24))
+        writer.write_batch(batch("2024-02-01", 24))
+        writer.write_batch(batch("2024-01-02", 24))  # Janvier rouvert : nouveau fichier
+    with PartitionedWriter(dataset, SCHEMA) as writer:  # Deuxième exécution : append-only
+        writer.write_batch(batch("2024-01-03", 24))
+
+    assert [len(files) for files in partition_files(dataset).values()] == [3, 1]
+    assert len(read_dataset(dataset)) == 24 * 4
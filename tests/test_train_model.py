@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from model_registry import data_fingerprint
+from storage import append_partitions, read_dataset
+from train_model import TARGET, dataset_fingerprint
+
+
+def test_out_of_core_fingerprint_matches_in_memory(tmp_path):
+    # Mois 2 et 10 : l'ordre de scan des dossiers (month=10 avant month=2) n'est pas l'ordre des dates
+    times = pd.date_range("2023-02-01", "2023-10-31 23:00", freq="h")
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"datetime_utc": times, TARGET: rng.normal(1000, 50, len(times)),
+                       "lag_24h": rng.normal(1000, 50, len(times)).astype(np.float32)})
+    df["year"], df["month"] = times.year, times.month
+    append_partitions(df.iloc[::-1], str(tmp_path))  # Lignes dans le désordre dans chaque fichier
+
+    columns = ["datetime_utc", TARGET, "lag_24h", "month"]
+    in_memory = read_dataset(str(tmp_path)).sort_values("datetime_utc").reset_index(drop=True)
+    assert dataset_fingerprint(str(tmp_path), columns) == data_fingerprint(in_memory[columns])
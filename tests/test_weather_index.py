@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from weather_index import compute_weather_indices, weighted_index
+
+# 3 stations, 2 régions : A et B dans EAST (poids 3 et 1), C seule dans WEST
+WEIGHTS = np.array([[3.0, 0.0], [1.0, 0.0], [0.0, 2.0]], dtype=np.float32)
+
+
+def test_weights_are_normalised():
+    matrix = np.array([[10.0, 20.0, 5.0]], dtype=np.float32)
+    np.testing.assert_allclose(weighted_index(matrix, WEIGHTS), [[12.5, 5.0]])
+    # Poids multipliés par une constante : même indice
+    np.testing.assert_allclose(weighted_index(matrix, WEIGHTS * 7), [[12.5, 5.0]])
+
+
+def test_missing_stations_are_excluded_and_weights_renormalised():
+    matrix = np.array([
+        [10.0, np.nan, 5.0],    # B manquante : A seule compte pour EAST
+        [np.nan, 20.0, np.nan],  # WEST sans aucune station : NaN
+        [np.nan, np.nan, np.nan],
+    ], dtype=np.float32)
+    index = weighted_index(matrix, WEIGHTS)
+    np.testing.assert_allclose(index[0], [10.0, 5.0])
+    assert index[1, 0] == pytest.approx(20.0)
+    assert np.isnan(index[1, 1])
+    assert np.isnan(index[2]).all()
+
+
+def test_compute_weather_indices_by_region(tmp_path):
+    config = tmp_path / "stations.csv"
+    pd.DataFrame({"name": ["A", "B", "C"], "weight": [3.0, 1.0, 2.0],
+                  "region": ["EAST", "EAST", "WEST"]}).to_csv(config, index=False)
+    times = pd.to_datetime(["2024-01-01 00:00", "2024-01-01 01:00"])
+    df = pd.DataFrame({
+        "datetime_utc": np.repeat(times, 4),
+        "city": ["A", "B", "C", "Z"] * 2,  # Z : hors config, ignorée
+        "temperature_c": [10.0, 20.0, 30.0, -50.0, 14.0, np.nan, 30.0, -50.0],
+    })
+    out = compute_weather_indices(df, stations_file=str(config))
+    east = out[out["region"] == "EAST"].set_index("datetime_utc")
+    np.testing.assert_allclose(east["temp_index"], [12.5, 14.0])
+    np.testing.assert_allclose(east["hdh"], [(3 * 8 + 0) / 4, 4.0])
+    np.testing.assert_allclose(out.loc[out["region"] == "WEST", "cdh"], [12.0, 12.0])
+    assert "humidity_index" not in out.columns